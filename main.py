@@ -1,20 +1,101 @@
+import os
+# Started before the heavy imports below, which it times
+from warehouse import startup_trace
+from warehouse.utils import get_base_path, get_logs_dir
+startup_trace.start(log_file=os.path.join(get_logs_dir(), "startup.log"))
 import sys
+import time
 import asyncio
-from PyQt6.QtWidgets import QApplication
+from PyQt6.QtWidgets import QApplication, QMessageBox
+from PyQt6.QtCore import QSettings
 from qasync import QEventLoop
-from warehouse.database import init_db, engine
+startup_trace.mark("PyQt6 importato")
+# models is imported for its side effect: it registers the tables init_db
+# creates, and building them here gets its own mark in the startup trace
+from warehouse import database, models  # noqa: F401
+from warehouse.database import init_db, enable_working_copy
+from warehouse.working_copy import WorkingCopyInUse
+startup_trace.mark("modelli SQLModel costruiti")
+from warehouse.backup import BackupScheduler, BACKUPS_DIRNAME, adopt_legacy_reset_backups
+from warehouse.maintenance import MaintenanceScheduler
+from warehouse.instrumentation import instrumentation
+from warehouse import watchdog, profiling
 from warehouse.ui.main_window import MainWindow
+startup_trace.mark("moduli applicazione importati")
+
+def create_backup_scheduler():
+    settings = QSettings("WarehouseApp", "WarehouseGUI")
+    backups_dir = os.path.join(get_base_path(), BACKUPS_DIRNAME)
+    adopt_legacy_reset_backups(get_base_path(), backups_dir)
+    return BackupScheduler(
+        database.db_path,
+        backups_dir,
+        interval_hours=settings.value("backup/interval_hours", 4, type=int),
+        write_threshold=settings.value("backup/write_threshold", 200, type=int),
+        on_close=settings.value("backup/on_close", True, type=bool),
+    )
+
+def create_maintenance_scheduler():
+    settings = QSettings("WarehouseApp", "WarehouseGUI")
+    
+    def save_last_run(report):
+        QSettings("WarehouseApp", "WarehouseGUI").setValue("maintenance/last_run", time.time())
+    
+    return MaintenanceScheduler(
+        database.db_path,
+        last_run=settings.value("maintenance/last_run", None, type=float) or None,
+        on_report=save_last_run,
+    )
+
+def working_copy_requested():
+    if "WAREHOUSE_LOCAL_COPY" in os.environ:
+        return os.environ["WAREHOUSE_LOCAL_COPY"] == "1"
+    return QSettings("WarehouseApp", "WarehouseGUI").value("storage/local_copy", False, type=bool)
+
+def start_loop_watchdog():
+    settings = QSettings("WarehouseApp", "WarehouseGUI")
+    return watchdog.start_watchdog(
+        threshold_ms=settings.value("diagnostics/stall_threshold_ms", 250, type=int),
+        log_file=os.path.join(get_logs_dir(), "stalls.log"),
+        debug=os.environ.get("WAREHOUSE_LOOP_DEBUG") == "1",
+    )
 
 async def run_app():
-    # print("Inizializzazione DB...")
-    await init_db()
-    # print("DB Inizializzato.")
+    start_loop_watchdog()
     
+    # Show the window shell first: tabs are built once the database is ready
     stop_event = asyncio.Event()
-    # print("Creazione MainWindow...")
     window = MainWindow(stop_event)
-    # print("MainWindow creata. Mostra finestra...")
     window.show()
+    startup_trace.mark("finestra costruita")
+    
+    if working_copy_requested():
+        sync_interval = QSettings("WarehouseApp", "WarehouseGUI").value("storage/sync_interval", 120, type=int)
+        try:
+            await enable_working_copy(sync_interval)
+        except WorkingCopyInUse as e:
+            # Working on the stick now would be overwritten by the owner's next sync
+            QMessageBox.critical(window, "Database in uso", f"Impossibile avviare l'applicazione: {e}")
+            await shutdown()
+            return
+        except Exception as e:
+            # Fall back to working directly on the stick
+            print(f"Copia di lavoro locale non disponibile: {e}")
+    
+    # print("Inizializzazione DB...")
+    await init_db()
+    startup_trace.mark("database inizializzato")
+    # print("DB Inizializzato.")
+    
+    backup_scheduler = create_backup_scheduler()
+    backup_scheduler.start()
+    maintenance_scheduler = create_maintenance_scheduler()
+    maintenance_scheduler.start()
+    
+    window.backup_scheduler = backup_scheduler
+    window.maintenance_scheduler = maintenance_scheduler
+    window.activate_tabs()
+    profiling.checkpoint("finestra aperta")
     # print("Finestra mostrata. In attesa di chiusura...")
     
     try:
@@ -22,15 +103,43 @@ async def run_app():
         await stop_event.wait()
     finally:
         # Cleanup
-        await shutdown()
+        await shutdown(backup_scheduler, maintenance_scheduler)
 
-async def shutdown():
+async def shutdown(backup_scheduler=None, maintenance_scheduler=None):
     print("Cleaning up resources...")
-    await engine.dispose()
+    # Closed before the first data was shown: keep what was measured
+    startup_trace.finish()
+    if watchdog.loop_watchdog is not None:
+        await watchdog.loop_watchdog.stop()
+    if maintenance_scheduler is not None:
+        await maintenance_scheduler.stop()
+    if backup_scheduler is not None:
+        try:
+            await backup_scheduler.stop()
+        except Exception as e:
+            print(f"Backup alla chiusura fallito: {e}")
+    await database.engine.dispose()
+    report_path = os.environ.get("WAREHOUSE_QUERY_REPORT")
+    if report_path:
+        try:
+            instrumentation.dump_report(report_path)
+            print(instrumentation.report())
+        except Exception as e:
+            print(f"Scrittura report query fallita: {e}")
+    if database.working_copy is not None:
+        await database.working_copy.stop()
+        try:
+            await asyncio.to_thread(database.working_copy.close)
+        except Exception as e:
+            print(f"Sincronizzazione finale con la chiavetta fallita: {e}")
     print("Shutdown complete.")
     QApplication.instance().quit() # Force Qt to quit
 
 def main():
+    profiling.start_profiling(
+        os.environ.get("WAREHOUSE_PROFILE"),
+        os.path.join(get_base_path(), profiling.PROFILES_DIRNAME),
+    )
     app = QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)  # Prevent implicit quit, let run_app handle it
     loop = QEventLoop(app)
@@ -50,6 +159,10 @@ def main():
             loop.stop()
         if not loop.is_closed():
             loop.close()
+        try:
+            profiling.stop_profiling()
+        except Exception as e:
+            print(f"Scrittura profilo fallita: {e}")
         sys.exit(0)
 
 if __name__ == "__main__":
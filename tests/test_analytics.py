@@ -0,0 +1,103 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from warehouse import database
+from warehouse.analytics import get_forecast, _fefo_waste
+from warehouse.datagen import generate_database
+
+
+class TestForecast(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.test_dir, "warehouse.db")
+        self.original_db = database.db_path
+        generate_database(self.db, users=5, materials=6, batches_per_material=2, withdrawals=0, years=1)
+
+        # One consumable used once a day: 10 units expiring in 5 days, 20 in 100 days
+        today = date.today()
+        self.execute("DELETE FROM batch")
+        self.material_id = self.execute("SELECT MIN(id) FROM material WHERE material_type = 'CONSUMABLE'")[0]
+        user_id = self.execute("SELECT MIN(id) FROM user")[0]
+        self.execute(
+            "INSERT INTO batch (material_id, expiration, amount) VALUES (?, ?, 10), (?, ?, 20)",
+            (self.material_id, today + timedelta(days=5), self.material_id, today + timedelta(days=100)),
+        )
+        self.first_batch = self.execute("SELECT MIN(id) FROM batch")[0]
+        now = datetime.now()
+        self.insert_withdrawals([(user_id, self.material_id, 1, now - timedelta(days=d)) for d in range(90)])
+        self.user_id = user_id
+
+        self.run_async(database.set_database_path(self.db))
+        self.run_async(database.init_db())
+
+    def tearDown(self):
+        asyncio.run(database.set_database_path(self.original_db))
+        shutil.rmtree(self.test_dir)
+
+    def run_async(self, coro):
+        async def go():
+            try:
+                return await coro
+            finally:
+                await database.engine.dispose()
+        return asyncio.run(go())
+
+    def execute(self, sql, params=()):
+        conn = sqlite3.connect(self.db)
+        try:
+            row = conn.execute(sql, params).fetchone()
+            conn.commit()
+            return row
+        finally:
+            conn.close()
+
+    def insert_withdrawals(self, rows):
+        conn = sqlite3.connect(self.db)
+        try:
+            conn.executemany(
+                "INSERT INTO withdrawal (user_id, material_id, amount, withdrawal_date) VALUES (?, ?, ?, ?)",
+                [(u, m, a, d.isoformat(" ")) for u, m, a, d in rows],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def test_stockout_and_waste_forecast(self):
+        report = self.run_async(get_forecast())
+
+        forecast = {f.material_id: f for f in report.stockouts}[self.material_id]
+        self.assertAlmostEqual(forecast.daily_rate, 1.0)
+        self.assertAlmostEqual(forecast.days_left, 30.0)
+        # The first batch expires after 5 of its 10 units; the second is used up in time
+        self.assertEqual([(r.batch_id, r.expected_waste) for r in report.waste_risks if r.material_id == self.material_id],
+                         [(self.first_batch, 5)])
+
+    def test_only_new_withdrawals_are_read(self):
+        self.assertEqual(self.run_async(get_forecast()).withdrawals_read, 90)
+        self.assertEqual(self.run_async(get_forecast()).withdrawals_read, 0)
+
+        self.insert_withdrawals([(self.user_id, self.material_id, 9, datetime.now())])
+        report = self.run_async(get_forecast())
+        self.assertEqual(report.withdrawals_read, 1)
+        forecast = {f.material_id: f for f in report.stockouts}[self.material_id]
+        self.assertAlmostEqual(forecast.daily_rate, 99 / 90)
+
+        # A deleted withdrawal makes the next run rebuild the bins
+        self.execute("DELETE FROM withdrawal WHERE id = (SELECT MIN(id) FROM withdrawal)")
+        self.assertEqual(self.run_async(get_forecast()).withdrawals_read, 90)
+
+    def test_fefo_waste_skips_units_wasted_by_earlier_batches(self):
+        # 2 a day: batch 1 (10 units, expires in 2 days) wastes 6; batch 2 still gets 16 of its 20
+        waste = _fefo_waste(np.array([10.0, 20.0]), np.array([2.0, 10.0]), 2.0)
+        self.assertEqual(waste.tolist(), [6.0, 4.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from warehouse import database
+from warehouse.datagen import generate_database
+from warehouse.controllers import (
+    get_all_users, get_archived_users, archive_user, restore_user, create_withdrawal,
+)
+from warehouse.controllers_material import (
+    get_materials, get_material_stocks, get_stock_report, get_archived_materials,
+    archive_material, restore_material,
+)
+from warehouse.models import MaterialType
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.test_dir, "warehouse.db")
+        self.original_db = database.db_path
+        generate_database(self.db, users=10, materials=8, batches_per_material=3, withdrawals=300, years=1)
+        self.run_async(database.set_database_path(self.db))
+        self.run_async(database.init_db())
+
+    def tearDown(self):
+        asyncio.run(database.set_database_path(self.original_db))
+        shutil.rmtree(self.test_dir)
+
+    def run_async(self, coro):
+        async def go():
+            try:
+                return await coro
+            finally:
+                await database.engine.dispose()
+        return asyncio.run(go())
+
+    def count(self, sql):
+        conn = sqlite3.connect(self.db)
+        try:
+            return conn.execute(sql).fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_archived_material_leaves_hot_queries_but_keeps_history(self):
+        material = self.run_async(get_materials(MaterialType.CONSUMABLE))[0]
+        withdrawals = self.count(f"SELECT COUNT(*) FROM withdrawal WHERE material_id = {material.id}")
+        self.run_async(archive_material(material.id))
+
+        self.assertNotIn(material.id, [m.id for m in self.run_async(get_materials(MaterialType.CONSUMABLE))])
+        self.assertNotIn(material.id, self.run_async(get_material_stocks()))
+        self.assertNotIn(material.id, [m.id for m, _ in self.run_async(get_stock_report())])
+        self.assertEqual([m.id for m in self.run_async(get_archived_materials())], [material.id])
+        self.assertEqual(self.count(f"SELECT COUNT(*) FROM withdrawal WHERE material_id = {material.id}"), withdrawals)
+        user = self.run_async(get_all_users())[0]
+        with self.assertRaises(ValueError):
+            self.run_async(create_withdrawal(user.id, material.id, 1))
+
+        self.run_async(restore_material(material.id))
+        self.assertIn(material.id, [m.id for m in self.run_async(get_materials(MaterialType.CONSUMABLE))])
+        with self.assertRaises(ValueError):
+            self.run_async(restore_material(material.id))
+
+    def test_archive_user(self):
+        users = self.run_async(get_all_users())
+        self.run_async(archive_user(users[0].id))
+        self.assertEqual(len(self.run_async(get_all_users())), len(users) - 1)
+        self.assertEqual([u.id for u in self.run_async(get_archived_users())], [users[0].id])
+        self.run_async(restore_user(users[0].id))
+        self.assertEqual(self.run_async(get_archived_users()), [])
+
+    def test_partial_indexes_created(self):
+        conn = sqlite3.connect(self.db)
+        try:
+            sql = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index'").fetchall())
+        finally:
+            conn.close()
+        for name in ("ix_user_active", "ix_material_active"):
+            self.assertTrue(sql[name].endswith("WHERE archived_at IS NULL"), sql[name])
+
+
+if __name__ == '__main__':
+    unittest.main()
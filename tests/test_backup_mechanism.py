@@ -1,98 +1,169 @@
 import os
 import shutil
+import sqlite3
 import zipfile
 import tempfile
 import unittest
 
+from datetime import datetime, timedelta
+
+from warehouse.backup import (
+    export_backup, import_backup, create_snapshot, list_snapshots,
+    rotate_snapshots, select_snapshots_to_keep, RetentionPolicy
+)
+from warehouse.database import SCHEMA_VERSION
+
+
+def create_dummy_db(path, marker):
+    conn = sqlite3.connect(path)
+    for table in ("user", "material", "batch", "withdrawal", "eventlog"):
+        conn.execute(f'CREATE TABLE "{table}" (id INTEGER PRIMARY KEY)')
+    conn.execute("CREATE TABLE marker (value TEXT)")
+    conn.execute("INSERT INTO marker VALUES (?)", (marker,))
+    conn.commit()
+    conn.close()
+
+
+def read_marker(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT value FROM marker").fetchone()[0]
+    finally:
+        conn.close()
+
+
 class TestBackupMechanism(unittest.TestCase):
     def setUp(self):
         # Create a test environment
         self.test_dir = tempfile.mkdtemp()
         self.base_path = os.path.join(self.test_dir, "app_base")
         os.makedirs(self.base_path)
-        
+
         # Create dummy DB
         self.db_file = os.path.join(self.base_path, "warehouse.db")
-        with open(self.db_file, "w") as f:
-            f.write("DUMMY DB CONTENT")
-            
+        create_dummy_db(self.db_file, "BACKUP")
+
         # Create dummy Images
         self.images_dir = os.path.join(self.base_path, "images")
         os.makedirs(self.images_dir)
         self.img_file = os.path.join(self.images_dir, "test.png")
         with open(self.img_file, "w") as f:
             f.write("DUMMY IMAGE CONTENT")
-            
+
     def tearDown(self):
         shutil.rmtree(self.test_dir)
 
-    def test_export_logic(self):
+    def make_backup(self):
         backup_zip = os.path.join(self.test_dir, "backup.zip")
-        
-        # LOGIC FROM export_db
-        with zipfile.ZipFile(backup_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Add DB
-            if os.path.exists(self.db_file):
-                zipf.write(self.db_file, "warehouse.db")
-            
-            # Add Images
-            if os.path.exists(self.images_dir):
-                for root, dirs, files in os.walk(self.images_dir):
-                    for file in files:
-                        abs_path = os.path.join(root, file)
-                        rel_path = os.path.relpath(abs_path, self.base_path)
-                        zipf.write(abs_path, rel_path)
-        
+        export_backup(backup_zip, self.base_path)
+        return backup_zip
+
+    def replace_current_state(self):
+        os.remove(self.db_file)
+        create_dummy_db(self.db_file, "CURRENT")
+        shutil.rmtree(self.images_dir)
+        os.makedirs(self.images_dir)
+        with open(os.path.join(self.images_dir, "current.png"), "w") as f:
+            f.write("CURRENT IMAGE")
+
+    def test_export_logic(self):
+        backup_zip = self.make_backup()
+
         # VERIFY
         self.assertTrue(os.path.exists(backup_zip))
         with zipfile.ZipFile(backup_zip, 'r') as zipf:
             names = zipf.namelist()
-            print(f"Zip contents: {names}")
             self.assertIn("warehouse.db", names)
-            self.assertIn(os.path.join("images", "test.png"), names)
+            self.assertIn("images/test.png", names)
 
     def test_import_logic(self):
-        # 1. Prepare Backup
-        backup_zip = os.path.join(self.test_dir, "backup.zip")
-        with zipfile.ZipFile(backup_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(self.db_file, "warehouse.db")
-            zipf.write(self.img_file, os.path.join("images", "test.png"))
-            
-        # 2. Corrupt/Clear Current State
-        os.remove(self.db_file)
-        shutil.rmtree(self.images_dir)
-        self.assertFalse(os.path.exists(self.db_file))
-        self.assertFalse(os.path.exists(self.images_dir))
-        
-        # 3. LOGIC FROM import_db
-        with tempfile.TemporaryDirectory() as temp_dir:
-            with zipfile.ZipFile(backup_zip, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-            
-            # Check for DB file in extracted root
-            extracted_db = os.path.join(temp_dir, "warehouse.db")
-            self.assertTrue(os.path.exists(extracted_db))
-            
-            # Replace DB
-            shutil.copy2(extracted_db, self.db_file)
-            
-            # Replace Images
-            extracted_images = os.path.join(temp_dir, "images")
-            if os.path.exists(extracted_images):
-                # Ensure parent dir exists (app base) - in real app it exists
-                # shutil.rmtree(self.images_dir) # It's already gone in this test
-                if os.path.exists(self.images_dir):
-                    shutil.rmtree(self.images_dir)
-                shutil.copytree(extracted_images, self.images_dir)
-        
-        # 4. VERIFY RESTORATION
-        self.assertTrue(os.path.exists(self.db_file))
-        with open(self.db_file, "r") as f:
-            self.assertEqual(f.read(), "DUMMY DB CONTENT")
-            
+        backup_zip = self.make_backup()
+        self.replace_current_state()
+
+        import_backup(backup_zip, self.base_path)
+
+        # VERIFY RESTORATION
+        self.assertEqual(read_marker(self.db_file), "BACKUP")
         self.assertTrue(os.path.exists(self.img_file))
+        self.assertFalse(os.path.exists(os.path.join(self.images_dir, "current.png")))
         with open(self.img_file, "r") as f:
             self.assertEqual(f.read(), "DUMMY IMAGE CONTENT")
 
+        # No staging leftovers next to the target
+        self.assertEqual(sorted(os.listdir(self.base_path)), ["images", "warehouse.db"])
+
+    def test_import_rejects_corrupt_db(self):
+        backup_zip = os.path.join(self.test_dir, "backup.zip")
+        with zipfile.ZipFile(backup_zip, 'w') as zipf:
+            zipf.writestr("warehouse.db", "NOT A DATABASE")
+            zipf.writestr("images/other.png", "OTHER")
+        self.replace_current_state()
+
+        with self.assertRaises(ValueError):
+            import_backup(backup_zip, self.base_path)
+
+        # Current installation untouched
+        self.assertEqual(read_marker(self.db_file), "CURRENT")
+        self.assertTrue(os.path.exists(os.path.join(self.images_dir, "current.png")))
+        self.assertEqual(sorted(os.listdir(self.base_path)), ["images", "warehouse.db"])
+
+    def test_import_rejects_newer_schema(self):
+        conn = sqlite3.connect(self.db_file)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+        conn.close()
+        backup_zip = self.make_backup()
+        self.replace_current_state()
+
+        with self.assertRaises(ValueError):
+            import_backup(backup_zip, self.base_path)
+        self.assertEqual(read_marker(self.db_file), "CURRENT")
+
+    def test_import_legacy_db_keeps_images(self):
+        legacy_db = os.path.join(self.test_dir, "legacy.db")
+        shutil.copy2(self.db_file, legacy_db)
+        self.replace_current_state()
+
+        import_backup(legacy_db, self.base_path)
+
+        self.assertEqual(read_marker(self.db_file), "BACKUP")
+        self.assertTrue(os.path.exists(os.path.join(self.images_dir, "current.png")))
+
+    def test_snapshot_is_compact_copy(self):
+        backups_dir = os.path.join(self.base_path, "backups")
+        path = create_snapshot(self.db_file, backups_dir, label="auto")
+
+        self.assertEqual(read_marker(path), "BACKUP")
+        self.assertEqual([p for p, _ in list_snapshots(backups_dir, "auto")], [path])
+        self.assertFalse([f for f in os.listdir(backups_dir) if f.endswith(".partial")])
+
+    def test_retention_thinning(self):
+        now = datetime(2026, 3, 15, 12, 0, 0)
+        # One snapshot every 30 minutes for 30 days
+        snapshots = [
+            (f"snap_{i}", now - timedelta(minutes=30 * i))
+            for i in range(30 * 48)
+        ]
+        keep = select_snapshots_to_keep(snapshots, RetentionPolicy(hourly=24, daily=7, weekly=4))
+
+        self.assertIn("snap_0", keep)
+        # 24 hourly points, plus daily/weekly points older than the last 24h
+        self.assertLess(len(keep), 24 + 7 + 4)
+        self.assertGreaterEqual(len(keep), 24)
+        kept_times = sorted(ts for path, ts in snapshots if path in keep)
+        self.assertLess(kept_times[0], now - timedelta(days=14))
+
+    def test_rotation_spares_reset_snapshots(self):
+        backups_dir = os.path.join(self.base_path, "backups")
+        start = datetime(2026, 3, 15, 12, 0, 0)
+        for i in range(5):
+            create_snapshot(self.db_file, backups_dir, label="auto", now=start + timedelta(minutes=i))
+        reset_path = create_snapshot(self.db_file, backups_dir, label="reset", now=start)
+
+        removed = rotate_snapshots(backups_dir, RetentionPolicy(hourly=1, daily=1, weekly=1))
+
+        self.assertEqual(len(removed), 4)
+        self.assertEqual(len(list_snapshots(backups_dir, "auto")), 1)
+        self.assertTrue(os.path.exists(reset_path))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,103 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from warehouse import benchmarks
+from warehouse.benchmarks import build_parser, compare_to_baseline, finish_report, prepare_database
+
+
+def make_report(median_ms, queries):
+    return {"results": {"small": {"get_material_stocks": {"median_ms": median_ms, "min_ms": median_ms, "queries": queries}}}}
+
+
+class TestBaselineGate(unittest.TestCase):
+    def test_within_threshold_passes(self):
+        baseline = make_report(100.0, 1)
+        self.assertEqual(compare_to_baseline(make_report(120.0, 1), baseline, 0.25), [])
+
+    def test_slower_run_fails(self):
+        baseline = make_report(100.0, 1)
+        self.assertEqual(len(compare_to_baseline(make_report(140.0, 1), baseline, 0.25)), 1)
+
+    def test_noise_on_fast_cases_is_ignored(self):
+        baseline = make_report(1.0, 1)
+        self.assertEqual(compare_to_baseline(make_report(2.5, 1), baseline, 0.25), [])
+
+    def test_extra_queries_fail(self):
+        baseline = make_report(10.0, 1)
+        self.assertEqual(len(compare_to_baseline(make_report(10.0, 5), baseline, 0.25)), 1)
+
+    def test_cases_missing_from_baseline_are_skipped(self):
+        self.assertEqual(compare_to_baseline(make_report(500.0, 9), {"results": {}}, 0.25), [])
+
+
+class TestFinishReport(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.parser = build_parser("test", "tiny", 3, os.path.join(self.test_dir, "baseline.json"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def finish(self, report, *argv):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = finish_report(report, self.parser.parse_args(list(argv)))
+        return status, output.getvalue()
+
+    def test_saves_baseline_then_gates_on_it(self):
+        baseline_path = os.path.join(self.test_dir, "baseline.json")
+        report = make_report(100.0, 1)
+        report["memory"] = {"small": {"peak_rss_mb": 80.0}}
+
+        status, printed = self.finish(report, "--save-baseline")
+        self.assertEqual(status, 0)
+        self.assertIn("picco memoria: 80.0 MB", printed)
+        with open(baseline_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), report)
+
+        self.assertEqual(self.finish(make_report(110.0, 1), "--baseline", baseline_path)[0], 0)
+        status, printed = self.finish(make_report(200.0, 1), "--baseline", baseline_path)
+        self.assertEqual(status, 1)
+        self.assertIn("small/get_material_stocks", printed)
+
+    def test_writes_output_file(self):
+        output_path = os.path.join(self.test_dir, "out", "bench.json")
+        self.assertEqual(self.finish(make_report(5.0, 2), "--output", output_path)[0], 0)
+        with open(output_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["results"]["small"]["get_material_stocks"]["queries"], 2)
+
+
+class TestPrepareDatabase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        presets = {"micro": dict(users=5, materials=4, batches_per_material=1, withdrawals=20, years=1)}
+        patcher = patch.object(benchmarks, "PRESETS", presets)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def test_cache_is_reused_within_a_schema_version(self):
+        path = prepare_database("micro", self.data_dir, 1)
+        mtime = os.stat(path).st_mtime_ns
+        self.assertEqual(prepare_database("micro", self.data_dir, 1), path)
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+    def test_new_schema_version_regenerates(self):
+        old_path = prepare_database("micro", self.data_dir, 1)
+        with patch.object(benchmarks, "SCHEMA_VERSION", benchmarks.SCHEMA_VERSION + 1):
+            new_path = prepare_database("micro", self.data_dir, 1)
+
+        self.assertNotEqual(new_path, old_path)
+        self.assertTrue(os.path.exists(new_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from warehouse import database
+from warehouse.datagen import generate_database
+from warehouse.controllers import get_user_dependencies, delete_user
+from warehouse.controllers_material import get_material_dependencies, delete_material
+
+
+class TestCascadingDeletes(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.test_dir, "warehouse.db")
+        self.original_db = database.db_path
+        generate_database(self.db, users=10, materials=8, batches_per_material=3, withdrawals=500, years=1)
+        self.run_async(database.set_database_path(self.db))
+        self.run_async(database.init_db())
+
+    def tearDown(self):
+        asyncio.run(database.set_database_path(self.original_db))
+        shutil.rmtree(self.test_dir)
+
+    def run_async(self, coro):
+        async def go():
+            try:
+                return await coro
+            finally:
+                await database.engine.dispose()
+        return asyncio.run(go())
+
+    def count(self, sql):
+        conn = sqlite3.connect(self.db)
+        try:
+            return conn.execute(sql).fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_material_counts_and_delete(self):
+        batches = self.count("SELECT COUNT(*) FROM batch WHERE material_id = 1")
+        withdrawals = self.count("SELECT COUNT(*) FROM withdrawal WHERE material_id = 1")
+        self.assertEqual(self.run_async(get_material_dependencies(1)), (batches, withdrawals))
+
+        total = self.count("SELECT COUNT(*) FROM withdrawal")
+        self.run_async(delete_material(1))
+        self.assertEqual(self.run_async(get_material_dependencies(1)), (0, 0))
+        self.assertEqual(self.count("SELECT COUNT(*) FROM material WHERE id = 1"), 0)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM withdrawal"), total - withdrawals)
+
+    def test_user_counts_and_delete(self):
+        withdrawals = self.count("SELECT COUNT(*) FROM withdrawal WHERE user_id = 2")
+        self.assertEqual(self.run_async(get_user_dependencies(2)), withdrawals)
+        self.run_async(delete_user(2))
+        self.assertEqual(self.count("SELECT COUNT(*) FROM user WHERE id = 2"), 0)
+        self.assertEqual(self.run_async(get_user_dependencies(2)), 0)
+        with self.assertRaises(ValueError):
+            self.run_async(delete_user(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from warehouse.datagen import generate_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_cli(*args):
+    return subprocess.run(
+        [sys.executable, "-c", "import sys; from warehouse.cli import main; code = main(sys.argv[1:]); "
+         "assert 'PyQt6' not in sys.modules, 'Qt importato'; sys.exit(code)", *args],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+    )
+
+
+class TestCli(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp()
+        cls.db = os.path.join(cls.test_dir, "warehouse.db")
+        generate_database(cls.db, users=20, materials=15, batches_per_material=2, withdrawals=100, years=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.test_dir)
+
+    def test_stock_report_without_qt(self):
+        result = run_cli("--db", self.db, "stock", "--csv")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        lines = result.stdout.strip().splitlines()
+        self.assertTrue(lines[0].startswith("id,tipo,denominazione"))
+        self.assertEqual(len(lines), 16)
+
+    def test_backup_snapshot_and_export(self):
+        result = run_cli("--db", self.db, "backup")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertTrue(os.listdir(os.path.join(self.test_dir, "backups")))
+
+        archive = os.path.join(self.test_dir, "export.zip")
+        result = run_cli("--db", self.db, "backup", archive)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertTrue(os.path.exists(archive))
+
+    def test_export_withdrawals(self):
+        output = os.path.join(self.test_dir, "prelievi.jsonl")
+        result = run_cli("--db", self.db, "export", "withdrawals", output, "--from", "2000-01-01")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        with open(output, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 100)
+
+    def test_forecast(self):
+        result = run_cli("--db", self.db, "forecast", "--days", "365")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Consumi degli ultimi 365 giorni", result.stdout)
+
+    def test_db_after_the_command(self):
+        result = run_cli("stock", "--db", self.db, "--csv")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(len(result.stdout.strip().splitlines()), 16)
+
+    def test_read_commands_upgrade_an_old_schema(self):
+        old = os.path.join(self.test_dir, "old.db")
+        shutil.copyfile(self.db, old)
+        conn = sqlite3.connect(old)
+        # As left by a build from before the daily usage rollup (schema 4)
+        conn.execute("DROP TABLE usagedaily")
+        conn.execute("PRAGMA user_version = 3")
+        conn.commit()
+        conn.close()
+
+        result = run_cli("usage", "--db", old, "--period", "year", "--csv")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertGreater(len(result.stdout.strip().splitlines()), 1)
+
+    def test_errors_exit_with_status_1(self):
+        other = os.path.join(self.test_dir, "other.db")
+        shutil.copyfile(self.db, other)
+        result = run_cli("--db", other, "restore", os.path.join(self.test_dir, "missing.zip"))
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("Errore", result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
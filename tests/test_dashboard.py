@@ -0,0 +1,164 @@
+import asyncio
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+import shutil
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from warehouse import database
+from warehouse.datagen import generate_database
+from warehouse.controllers import get_active_item_withdrawals, get_all_users, create_withdrawal
+from warehouse.controllers_dashboard import get_dashboard_snapshot, invalidate_dashboard_snapshot, CACHE_NAME
+from warehouse.controllers_material import (
+    get_expiring_batches, get_inefficient_materials, get_low_stock_materials, get_material_stocks,
+    get_materials, create_batch, update_material,
+)
+from warehouse.instrumentation import instrumentation
+from warehouse.models import MaterialType
+from PyQt6.QtWidgets import QApplication, QLabel, QListWidget
+from warehouse.ui.tabs import dashboard_tab
+from warehouse.ui.tabs.dashboard_tab import DashboardTab, sync_list_widget
+
+
+class TestDashboardSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.test_dir, "warehouse.db")
+        self.original_db = database.db_path
+        generate_database(self.db, users=10, materials=30, batches_per_material=3, withdrawals=300, years=1)
+        self.run_async(database.set_database_path(self.db))
+        self.run_async(database.init_db())
+
+    def tearDown(self):
+        asyncio.run(database.set_database_path(self.original_db))
+        shutil.rmtree(self.test_dir)
+
+    def run_async(self, coro):
+        async def go():
+            try:
+                return await coro
+            finally:
+                await database.engine.dispose()
+        return asyncio.run(go())
+
+    def test_snapshot_matches_the_panel_queries(self):
+        # One damaged item on loan, one damaged item in stock
+        items = self.run_async(get_materials(MaterialType.ITEM))[:2]
+        for item in items:
+            self.run_async(update_material(item.id, is_efficient=False))
+        user = self.run_async(get_all_users())[0]
+        self.run_async(create_withdrawal(user.id, items[0].id, 1))
+
+        snapshot = self.run_async(get_dashboard_snapshot())
+
+        low_stock = self.run_async(get_low_stock_materials())
+        self.assertEqual(
+            sorted((e.material_id, e.stock) for e in snapshot.low_stock),
+            sorted((m.id, stock) for m, stock in low_stock),
+        )
+
+        stocks = self.run_async(get_material_stocks())
+        expiring = self.run_async(get_expiring_batches(limit=50))
+        self.assertEqual(
+            sorted((e.batch_id, e.available) for e in snapshot.expiring),
+            sorted((b.id, stocks.get(m.id, 0)) for b, m in expiring),
+        )
+
+        self.assertEqual(len(snapshot.inefficient), 2)
+        loans = self.run_async(get_active_item_withdrawals())
+        inefficient = self.run_async(get_inefficient_materials())
+        self.assertEqual(
+            sorted((e.material_id, sorted(e.borrowers)) for e in snapshot.inefficient),
+            sorted(
+                (m.id, sorted(f"{u.first_name} {u.last_name}" for _, u in loans.get(m.id, [])))
+                for m in inefficient
+            ),
+        )
+
+    def test_snapshot_is_cached_until_the_next_write_or_ttl(self):
+        stats = instrumentation.cache(CACHE_NAME)
+        first = self.run_async(get_dashboard_snapshot())
+        hits = stats.hits
+        self.assertIs(self.run_async(get_dashboard_snapshot()), first)
+        self.assertEqual(stats.hits, hits + 1)
+
+        # Expired: reloaded even without local writes
+        second = self.run_async(get_dashboard_snapshot(max_age=0))
+        self.assertIsNot(second, first)
+
+        commits = []
+        on_commit = lambda: commits.append(database.write_activity.count)
+        database.write_activity.add_listener(on_commit)
+        try:
+            material = self.run_async(get_materials(MaterialType.CONSUMABLE))[0]
+            self.run_async(create_batch(material.id, date.today(), 5, "X"))
+        finally:
+            database.write_activity.remove_listener(on_commit)
+        self.assertTrue(commits)
+        third = self.run_async(get_dashboard_snapshot())
+        self.assertIsNot(third, second)
+
+        invalidate_dashboard_snapshot()
+        self.assertIsNot(self.run_async(get_dashboard_snapshot()), third)
+
+
+
+class TestSyncListWidget(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def sync(self, entries):
+        return sync_list_widget(self.list_widget, self.shown, entries, lambda e: e[0], lambda e: QLabel(e[1]))
+
+    def labels(self):
+        return [self.list_widget.itemWidget(self.list_widget.item(row)).text() for row in range(self.list_widget.count())]
+
+    def setUp(self):
+        self.list_widget = QListWidget()
+        self.shown = []
+        self.assertEqual(self.sync([(1, "a"), (2, "b"), (3, "c"), (4, "d")]), 4)
+
+    def test_unchanged_rows_keep_their_widget(self):
+        kept = self.list_widget.itemWidget(self.list_widget.item(0))
+        self.assertEqual(self.sync([(1, "a"), (2, "b"), (3, "c"), (4, "d")]), 0)
+        self.assertIs(self.list_widget.itemWidget(self.list_widget.item(0)), kept)
+
+    def test_only_new_changed_and_moved_rows_are_rebuilt(self):
+        # 2 removed, 3 changed, 4 moved before 1, 5 added
+        created = self.sync([(4, "d"), (1, "a"), (3, "C"), (5, "e")])
+        self.assertEqual(created, 3)
+        self.assertEqual(self.labels(), ["d", "a", "C", "e"])
+        self.assertEqual([e[0] for e in self.shown], [4, 1, 3, 5])
+
+
+class TestDashboardRefreshErrors(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.tab = DashboardTab()
+        self.tab.refresh_timer.stop()
+        self.addCleanup(database.write_activity.remove_listener, self.tab.on_write)
+        failing = patch.object(dashboard_tab, "get_dashboard_snapshot", side_effect=OSError("disco rimosso"))
+        failing.start()
+        self.addCleanup(failing.stop)
+
+    def test_background_refresh_reports_in_the_label(self):
+        with patch.object(dashboard_tab.QMessageBox, "critical") as critical:
+            for _ in range(3):
+                asyncio.run(self.tab.load_snapshot(background=True))
+        critical.assert_not_called()
+        self.assertIn("disco rimosso", self.tab.updated_label.text())
+
+    def test_user_refresh_shows_a_dialog(self):
+        with patch.object(dashboard_tab.QMessageBox, "critical") as critical:
+            asyncio.run(self.tab.load_snapshot(background=False))
+        critical.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from warehouse.diagnostics import collect_diagnostics, export_diagnostics, format_diagnostics, process_memory
+
+
+class TestDiagnostics(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_report_sections(self):
+        text = format_diagnostics(collect_diagnostics())
+        for section in ("DATABASE", "MEMORIA", "AVVIO", "CACHE", "LATENZA DEL LOOP", "QUERY RECENTI"):
+            self.assertIn(section, text)
+
+    def test_export_formats(self):
+        json_path = os.path.join(self.test_dir, "report.json")
+        export_diagnostics(json_path)
+        with open(json_path, encoding="utf-8") as f:
+            self.assertIn("memory", json.load(f))
+
+        text_path = os.path.join(self.test_dir, "report.txt")
+        export_diagnostics(text_path)
+        with open(text_path, encoding="utf-8") as f:
+            self.assertTrue(f.read().startswith("Report generato"))
+
+    def test_peak_memory_is_reported(self):
+        memory = process_memory()
+        self.assertGreater(memory["peak_rss"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+
+from warehouse import database
+from warehouse.datagen import generate_database
+from warehouse.exporter import export_withdrawals, export_logs, WITHDRAWAL_COLUMNS
+
+
+class TestStreamingExport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp()
+        cls.db = os.path.join(cls.test_dir, "warehouse.db")
+        cls.original_db = database.db_path
+        generate_database(cls.db, users=30, materials=20, batches_per_material=2, withdrawals=2500, years=2)
+        asyncio.run(database.set_database_path(cls.db))
+
+    @classmethod
+    def tearDownClass(cls):
+        asyncio.run(database.set_database_path(cls.original_db))
+        shutil.rmtree(cls.test_dir)
+
+    def run_export(self, export, *args, **kwargs):
+        async def go():
+            try:
+                return await export(*args, **kwargs)
+            finally:
+                await database.engine.dispose()
+        return asyncio.run(go())
+
+    def query(self, sql, params=()):
+        conn = sqlite3.connect(self.db)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def test_all_withdrawals_csv_in_small_partitions(self):
+        path = os.path.join(self.test_dir, "prelievi.csv")
+        report = self.run_export(export_withdrawals, path, partition_size=100)
+        self.assertEqual(report.rows, 2500)
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], list(WITHDRAWAL_COLUMNS))
+        self.assertEqual(len(rows), 2501)
+        dates = [row[1] for row in rows[1:]]
+        self.assertEqual(dates, sorted(dates))
+        self.assertFalse(os.path.exists(path + ".partial"))
+
+    def test_filters_and_jsonl(self):
+        custom_id, workplace = self.query("SELECT custom_id, workplace FROM user WHERE workplace IS NOT NULL LIMIT 1")[0]
+        day_from, day_to = date(date.today().year - 1, 1, 1), date(date.today().year - 1, 6, 30)
+        expected = self.query(
+            "SELECT COUNT(*) FROM withdrawal w JOIN user u ON u.id = w.user_id "
+            "WHERE u.custom_id = ? AND w.withdrawal_date >= ? AND w.withdrawal_date < ?",
+            (custom_id, day_from.isoformat(), "%d-07-01" % day_from.year),
+        )[0][0]
+
+        path = os.path.join(self.test_dir, "prelievi.jsonl")
+        report = self.run_export(export_withdrawals, path, day_from, day_to, user=custom_id)
+        self.assertEqual(report.rows, expected)
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), expected)
+        self.assertTrue(all(r["utente_id"] == custom_id for r in records))
+
+        by_workplace = self.run_export(export_withdrawals, os.path.join(self.test_dir, "sede.csv"), workplace=workplace)
+        self.assertEqual(by_workplace.rows, self.query(
+            "SELECT COUNT(*) FROM withdrawal w JOIN user u ON u.id = w.user_id WHERE u.workplace = ?", (workplace,)
+        )[0][0])
+
+    def test_logs(self):
+        path = os.path.join(self.test_dir, "log.csv")
+        report = self.run_export(export_logs, path)
+        self.assertEqual(report.rows, self.query("SELECT COUNT(*) FROM eventlog")[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from warehouse import database
+from warehouse.importer import import_csv, resolve_columns, USER_FIELDS
+
+
+class TestCsvImport(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.test_dir, "warehouse.db")
+        self.original_db = database.db_path
+
+        async def init():
+            await database.set_database_path(self.db)
+            await database.init_db()
+        asyncio.run(init())
+
+        conn = sqlite3.connect(self.db)
+        conn.execute("INSERT INTO user (custom_id, first_name, last_name, code) VALUES ('MR3', 'Mario', 'Rossi', 'MR3')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        asyncio.run(database.set_database_path(self.original_db))
+        shutil.rmtree(self.test_dir)
+
+    def write_csv(self, name, text):
+        path = os.path.join(self.test_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def run_import(self, *args, **kwargs):
+        async def go():
+            try:
+                return await import_csv(*args, **kwargs)
+            finally:
+                await database.engine.dispose()
+        return asyncio.run(go())
+
+    def query(self, sql):
+        conn = sqlite3.connect(self.db)
+        try:
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+
+    def test_users_with_form_headers_and_errors(self):
+        path = self.write_csv("utenti.csv", (
+            "Nome *:;Cognome *:;Luogo di lavoro:;Codice (barcode):\n"
+            "Marco;Rossi;Magazzino;\n"
+            "Maria;Russo;;\n"
+            ";Bianchi;;\n"
+            "Luca;Verdi;;MR3\n"
+        ))
+        report = self.run_import(path, "users")
+
+        self.assertEqual((report.rows, report.imported, report.error_count), (4, 2, 2))
+        self.assertEqual([e.row for e in report.errors], [4, 5])
+        # Counters continue after the existing MR3
+        self.assertEqual(
+            self.query("SELECT custom_id, code, workplace FROM user WHERE first_name != 'Mario' ORDER BY id"),
+            [("MR4", "MR4", "Magazzino"), ("MR5", "MR5", None)],
+        )
+        self.assertEqual(len(self.query("SELECT id FROM eventlog")), 1)
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write_csv("utenti.csv", "nome,cognome\nAnna,Neri\n")
+        report = self.run_import(path, "users", dry_run=True)
+        self.assertEqual(report.imported, 1)
+        self.assertEqual(len(self.query("SELECT id FROM user")), 1)
+
+    def test_materials_then_batches_by_code(self):
+        materials = self.write_csv("materiali.csv", "tipo,denominazione,codice,scorta minima\nconsumabile,Guanti,G1,10\nattrezzatura,Trapano,T1,\n")
+        self.assertEqual(self.run_import(materials, "materials").imported, 2)
+
+        batches = self.write_csv("lotti.csv", "codice,scadenza,quantità\nG1,31/12/2030,50\nXX,2030-01-01,5\nG1,domani,5\n")
+        report = self.run_import(batches, "batches")
+        self.assertEqual((report.imported, report.error_count), (1, 2))
+        self.assertEqual(self.query("SELECT amount, expiration FROM batch"), [(50, "2030-12-31")])
+
+    def test_missing_required_column(self):
+        with self.assertRaises(ValueError):
+            resolve_columns(["nome", "email"], USER_FIELDS)
+        self.assertEqual(resolve_columns(["N", "C"], USER_FIELDS, {"first_name": "N", "last_name": "C"}),
+                         {"first_name": "N", "last_name": "C"})
+
+    def test_ten_thousand_rows(self):
+        lines = ["nome,cognome,email"] + [f"Nome{i},Cognome{i},u{i}@example.com" for i in range(10_000)]
+        path = self.write_csv("molti.csv", "\n".join(lines) + "\n")
+        start = time.perf_counter()
+        report = self.run_import(path, "users")
+        self.assertEqual(report.imported, 10_000)
+        self.assertLess(time.perf_counter() - start, 20)
+        self.assertEqual(self.query("SELECT COUNT(DISTINCT custom_id) FROM user"), [(10_001,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from warehouse.instrumentation import QueryInstrumentation, normalize_statement
+
+
+class TestQueryInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(self.test_dir, 'test.db')}")
+        self.instrumentation = QueryInstrumentation()
+        self.instrumentation.attach(self.engine)
+
+    def tearDown(self):
+        asyncio.run(self.engine.dispose())
+        shutil.rmtree(self.test_dir)
+
+    def run_action(self, lookups):
+        track = self.instrumentation.track_action
+
+        @track("carica")
+        async def load():
+            async with self.engine.begin() as conn:
+                await conn.execute(text("CREATE TABLE IF NOT EXISTS t (id INTEGER PRIMARY KEY)"))
+                await conn.execute(text("INSERT INTO t (id) VALUES (1), (2), (3)"))
+                rows = (await conn.execute(text("SELECT id FROM t"))).all()
+                for _ in range(lookups):
+                    await conn.execute(text("SELECT id FROM t WHERE id = :id"), {"id": 1})
+                return rows
+
+        async def go():
+            rows = await load()
+            await self.engine.dispose()
+            return rows
+
+        return asyncio.run(go())
+
+    def test_counts_queries_and_rows_per_action(self):
+        self.run_action(lookups=2)
+
+        stats = self.instrumentation.actions["carica"]
+        self.assertEqual(stats.count, 1)
+        self.assertEqual(stats.max_queries, 5)
+        self.assertEqual(stats.n_plus_one, 0)
+        insert = self.instrumentation.statements["INSERT INTO t (id) VALUES (1), (2), (3)"]
+        self.assertEqual(insert.rows, 3)
+
+    def test_failed_statement_does_not_skew_later_timings(self):
+        async def go():
+            async with self.engine.connect() as conn:
+                await conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY)"))
+                await conn.execute(text("INSERT INTO t (id) VALUES (1)"))
+                for _ in range(3):
+                    with self.assertRaises(IntegrityError):
+                        await conn.execute(text("INSERT INTO t (id) VALUES (1)"))
+                await conn.execute(text("SELECT id FROM t"))
+                # No start time may outlive its statement on the pooled connection
+                self.assertFalse(any(conn.sync_connection.info.values()))
+            await self.engine.dispose()
+
+        asyncio.run(go())
+
+        self.assertEqual(self.instrumentation.statements["SELECT id FROM t"].count, 1)
+
+    def test_flags_repeated_statements(self):
+        self.run_action(lookups=10)
+
+        self.assertEqual(self.instrumentation.actions["carica"].n_plus_one, 1)
+        trace = self.instrumentation.n_plus_one_traces()[0]
+        self.assertEqual(list(trace.repeated().values()), [10])
+        self.assertIn("carica", self.instrumentation.report())
+
+    def test_expanded_in_lists_share_one_shape(self):
+        self.assertEqual(
+            normalize_statement("SELECT * FROM t WHERE id IN (?, ?, ?)"),
+            normalize_statement("SELECT * FROM t\n WHERE id IN (?, ?)"),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
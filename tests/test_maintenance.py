@@ -0,0 +1,56 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from warehouse.maintenance import run_maintenance, AUTO_VACUUM_INCREMENTAL
+
+
+class TestMaintenance(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.test_dir, "warehouse.db")
+        conn = sqlite3.connect(self.db_file)
+        conn.execute("CREATE TABLE eventlog (id INTEGER PRIMARY KEY, description TEXT)")
+        conn.executemany("INSERT INTO eventlog (description) VALUES (?)", [("x" * 500,)] * 4000)
+        conn.commit()
+        # Free most of the pages, as years of deletions would
+        conn.execute("DELETE FROM eventlog WHERE id > 500")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_full_run_compacts_fragmented_db(self):
+        report = run_maintenance(self.db_file)
+
+        self.assertEqual(report.quick_check, "ok")
+        self.assertTrue(report.compacted)
+        self.assertGreater(report.before.freelist_count, 0)
+        self.assertEqual(report.after.freelist_count, 0)
+        self.assertLess(report.after.file_size, report.before.file_size)
+        self.assertEqual(report.after.auto_vacuum, AUTO_VACUUM_INCREMENTAL)
+        self.assertEqual(os.listdir(self.test_dir), ["warehouse.db"])
+
+        conn = sqlite3.connect(self.db_file)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM eventlog").fetchone()[0], 500)
+        conn.close()
+
+    def test_light_run_reclaims_incrementally(self):
+        run_maintenance(self.db_file)
+        conn = sqlite3.connect(self.db_file)
+        conn.execute("DELETE FROM eventlog WHERE id > 100")
+        conn.commit()
+        conn.close()
+
+        report = run_maintenance(self.db_file, full=False)
+
+        self.assertFalse(report.compacted)
+        self.assertIsNone(report.quick_check)
+        self.assertIn("incremental_vacuum", report.timings)
+        self.assertEqual(report.after.freelist_count, 0)
+
+if __name__ == '__main__':
+    unittest.main()
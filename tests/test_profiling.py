@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from warehouse import database
+from warehouse.profiling import SessionProfiler
+
+
+class TestSessionProfiler(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_modes_from_env(self):
+        self.assertIsNone(SessionProfiler.from_env(None, self.test_dir))
+        self.assertIsNone(SessionProfiler.from_env("nothing", self.test_dir))
+        profiler = SessionProfiler.from_env("CPU, mem,unknown", self.test_dir)
+        self.assertEqual(profiler.modes, ["cpu", "mem"])
+
+    def test_cpu_and_mem_artefacts(self):
+        profiler = SessionProfiler(["cpu", "mem"], self.test_dir)
+        profiler.start()
+        profiler.checkpoint("inizio")
+        data = [str(i) * 10 for i in range(20000)]
+        written = profiler.stop()
+
+        self.assertEqual(len(data), 20000)
+        self.assertEqual(sorted(os.path.basename(p).split("_", 3)[-1] for p in written),
+                         ["cpu.prof", "cpu.txt", "mem.tracemalloc", "mem.txt"])
+        with open([p for p in written if p.endswith("mem.txt")][0], encoding="utf-8") as f:
+            self.assertIn("Crescita da 'inizio'", f.read())
+
+    def test_sql_trace_survives_failed_statements(self):
+        original_path = database.db_path
+
+        async def go():
+            await database.set_database_path(os.path.join(self.test_dir, "trace.db"))
+            try:
+                async with database.engine.connect() as conn:
+                    await conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY)"))
+                    await conn.execute(text("INSERT INTO t (id) VALUES (1)"))
+                    with self.assertRaises(IntegrityError):
+                        await conn.execute(text("INSERT INTO t (id) VALUES (1)"))
+                    await conn.execute(text("SELECT id FROM t"))
+            finally:
+                await database.set_database_path(original_path)
+
+        profiler = SessionProfiler(["sql"], self.test_dir)
+        profiler.start()
+        try:
+            asyncio.run(go())
+        finally:
+            written = profiler.stop()
+
+        with open([p for p in written if p.endswith("sql.jsonl")][0], encoding="utf-8") as f:
+            statements = [json.loads(line)["statement"] for line in f]
+        # The failed INSERT is not traced, the statements around it are
+        self.assertEqual(statements[-3:], [
+            "CREATE TABLE t (id INTEGER PRIMARY KEY)", "INSERT INTO t (id) VALUES (1)", "SELECT id FROM t",
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
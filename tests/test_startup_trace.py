@@ -0,0 +1,49 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from warehouse import startup_trace
+
+
+class TestStartupTrace(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        sys.path.insert(0, self.test_dir)
+
+    def tearDown(self):
+        startup_trace.finish()
+        startup_trace.current_trace = None
+        sys.path.remove(self.test_dir)
+        sys.modules.pop("startup_probe", None)
+        shutil.rmtree(self.test_dir)
+
+    def test_checkpoints_and_imports_are_logged(self):
+        with open(os.path.join(self.test_dir, "startup_probe.py"), "w", encoding="utf-8") as f:
+            f.write("import time\ntime.sleep(0.02)\n")
+        log_file = os.path.join(self.test_dir, "logs", "startup.log")
+
+        trace = startup_trace.start(log_file=log_file)
+        import startup_probe  # noqa: F401
+        first = startup_trace.mark(startup_trace.FIRST_PAINT)
+        self.assertIsNone(startup_trace.mark(startup_trace.FIRST_PAINT))
+        startup_trace.finish()
+
+        self.assertIsNotNone(first)
+        labels = [label for label, _ in trace.checkpoints]
+        self.assertEqual(labels.count(startup_trace.FIRST_PAINT), 1)
+        probe = next(i for i in trace.imports if i.module == "startup_probe")
+        self.assertGreaterEqual(probe.self_ms, 15)
+        # The module keeps its real loader once imported
+        self.assertEqual(type(startup_probe.__loader__).__name__, "SourceFileLoader")
+        self.assertFalse(any(isinstance(f, startup_trace._ImportTimer) for f in sys.meta_path))
+
+        with open(log_file, encoding="utf-8") as f:
+            text = f.read()
+        self.assertIn(startup_trace.FIRST_PAINT, text)
+        self.assertIn("startup_probe", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import zipfile
+
+from warehouse import database, tiering
+from warehouse.backup import export_backup, import_backup
+from warehouse.datagen import generate_database
+from warehouse.controllers import get_user_withdrawals, get_all_withdrawals
+from warehouse.controllers_log import get_logs
+from warehouse.controllers_material import get_material_dependencies, delete_material
+from warehouse.exporter import export_withdrawals
+
+
+class TestHistoryArchive(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.test_dir, "warehouse.db")
+        self.archive = os.path.join(self.test_dir, tiering.ARCHIVE_FILENAME)
+        self.original_db = database.db_path
+        generate_database(self.db, users=20, materials=15, batches_per_material=2, withdrawals=3000, years=3)
+        self.run_async(database.set_database_path(self.db))
+        self.run_async(database.init_db())
+        self.total = self.count("SELECT COUNT(*) FROM withdrawal")
+        self.open_loans = self.count("SELECT COUNT(*) FROM withdrawal WHERE return_date IS NULL AND material_id IN "
+                                     "(SELECT id FROM material WHERE material_type = 'ITEM')")
+
+    def tearDown(self):
+        asyncio.run(database.set_database_path(self.original_db))
+        shutil.rmtree(self.test_dir)
+
+    def run_async(self, coro):
+        async def go():
+            try:
+                return await coro
+            finally:
+                await database.engine.dispose()
+        return asyncio.run(go())
+
+    def count(self, sql, db=None):
+        conn = sqlite3.connect(db or self.db)
+        try:
+            return conn.execute(sql).fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_move_keeps_history_visible(self):
+        self.assertFalse(tiering.is_active())
+        user_history = len(self.run_async(get_user_withdrawals(1)))
+        report = self.run_async(tiering.move_to_archive(365))
+
+        self.assertTrue(os.path.exists(self.archive))
+        self.assertGreater(report.withdrawals, 0)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM withdrawal"), self.total - report.withdrawals)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM withdrawal", self.archive), report.withdrawals)
+        # Open loans and the newest row stay hot
+        self.assertEqual(self.count("SELECT COUNT(*) FROM withdrawal WHERE return_date IS NULL AND material_id IN "
+                                    "(SELECT id FROM material WHERE material_type = 'ITEM')"), self.open_loans)
+        self.assertLess(self.count("SELECT MAX(id) FROM withdrawal", self.archive), self.count("SELECT MAX(id) FROM withdrawal"))
+
+        self.assertEqual(len(self.run_async(get_all_withdrawals())), self.total)
+        self.assertEqual(len(self.run_async(get_user_withdrawals(1))), user_history)
+        self.assertEqual(len(self.run_async(get_logs(limit=100_000))), self.count("SELECT COUNT(*) FROM eventlog") + report.logs)
+        exported = self.run_async(export_withdrawals(os.path.join(self.test_dir, "tutti.csv")))
+        self.assertEqual(exported.rows, self.total)
+
+        # Nothing left to move
+        self.assertEqual(self.run_async(tiering.move_to_archive(365)).withdrawals, 0)
+
+    def test_permanent_delete_covers_archive(self):
+        self.run_async(tiering.move_to_archive(365))
+        batches, withdrawals = self.run_async(get_material_dependencies(1))
+        self.assertEqual(withdrawals, self.count("SELECT COUNT(*) FROM withdrawal WHERE material_id = 1")
+                         + self.count("SELECT COUNT(*) FROM withdrawal WHERE material_id = 1", self.archive))
+        self.run_async(delete_material(1))
+        self.assertEqual(self.count("SELECT COUNT(*) FROM withdrawal WHERE material_id = 1", self.archive), 0)
+
+    def test_backup_round_trip_includes_archive(self):
+        self.run_async(tiering.move_to_archive(365))
+        archived = self.count("SELECT COUNT(*) FROM withdrawal", self.archive)
+        backup_zip = os.path.join(self.test_dir, "backup.zip")
+        export_backup(backup_zip, self.test_dir)
+        with zipfile.ZipFile(backup_zip) as zipf:
+            self.assertIn(tiering.ARCHIVE_FILENAME, zipf.namelist())
+
+        os.remove(self.archive)
+        import_backup(backup_zip, self.test_dir)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM withdrawal", self.archive), archived)
+
+
+if __name__ == '__main__':
+    unittest.main()
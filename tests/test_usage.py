@@ -0,0 +1,82 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from warehouse import database
+from warehouse.datagen import generate_database
+from warehouse.controllers import create_withdrawal, get_active_item_withdrawals, return_withdrawal_item, get_all_users
+from warehouse.controllers_material import get_materials, get_material_stocks
+from warehouse.controllers_usage import get_usage_report, rebuild_usage_rollup
+from warehouse.models import MaterialType
+
+
+class TestUsageRollup(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.test_dir, "warehouse.db")
+        self.original_db = database.db_path
+        generate_database(self.db, users=10, materials=12, batches_per_material=3, withdrawals=2000, years=2)
+        self.run_async(database.set_database_path(self.db))
+        self.run_async(database.init_db())
+
+    def tearDown(self):
+        asyncio.run(database.set_database_path(self.original_db))
+        shutil.rmtree(self.test_dir)
+
+    def run_async(self, coro):
+        async def go():
+            try:
+                return await coro
+            finally:
+                await database.engine.dispose()
+        return asyncio.run(go())
+
+    def rollup(self):
+        conn = sqlite3.connect(self.db)
+        try:
+            return conn.execute("SELECT * FROM usagedaily ORDER BY day, material_id, user_id").fetchall()
+        finally:
+            conn.close()
+
+    def test_reports_match_the_raw_withdrawals(self):
+        conn = sqlite3.connect(self.db)
+        try:
+            expected = conn.execute(
+                "SELECT strftime('%Y-%m', withdrawal_date), material_id, SUM(amount), COUNT(*) FROM withdrawal "
+                "GROUP BY 1, 2"
+            ).fetchall()
+            workplaces = conn.execute(
+                "SELECT strftime('%Y', w.withdrawal_date), u.workplace, SUM(w.amount) FROM withdrawal w "
+                "JOIN user u ON u.id = w.user_id GROUP BY 1, 2"
+            ).fetchall()
+        finally:
+            conn.close()
+
+        rows = self.run_async(get_usage_report("material", "month"))
+        self.assertEqual(sorted((r.period, r.key, r.amount, r.count) for r in rows), sorted(expected))
+        rows = self.run_async(get_usage_report("workplace", "year"))
+        self.assertEqual(sorted((r.period, r.key, r.amount) for r in rows), sorted(workplaces))
+
+        with self.assertRaises(ValueError):
+            self.run_async(get_usage_report("week"))
+
+    def test_withdrawals_and_returns_keep_the_rollup_current(self):
+        user = self.run_async(get_all_users())[0]
+        stocks = self.run_async(get_material_stocks())
+        consumable = next(m for m in self.run_async(get_materials(MaterialType.CONSUMABLE)) if stocks.get(m.id, 0) > 2)
+        self.run_async(create_withdrawal(user.id, consumable.id, 2))
+        self.run_async(create_withdrawal(user.id, consumable.id, 1))
+        loans = self.run_async(get_active_item_withdrawals())
+        withdrawal, _ = next(iter(loans.values()))[0]
+        self.run_async(return_withdrawal_item(withdrawal.id, True))
+
+        incremental = self.rollup()
+        self.run_async(rebuild_usage_rollup())
+        self.assertEqual(self.rollup(), incremental)
+
+
+if __name__ == "__main__":
+    unittest.main()
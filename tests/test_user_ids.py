@@ -0,0 +1,72 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from warehouse import database
+from warehouse.controllers import create_user, allocate_custom_ids
+
+
+class TestCustomIdCounters(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.test_dir, "warehouse.db")
+        self.original_db = database.db_path
+        self.run_async(database.set_database_path(self.db))
+        self.run_async(database.init_db())
+
+    def tearDown(self):
+        asyncio.run(database.set_database_path(self.original_db))
+        shutil.rmtree(self.test_dir)
+
+    def run_async(self, coro):
+        async def go():
+            try:
+                return await coro
+            finally:
+                await database.engine.dispose()
+        return asyncio.run(go())
+
+    def query(self, sql):
+        conn = sqlite3.connect(self.db)
+        try:
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+
+    def insert_users(self, *custom_ids):
+        conn = sqlite3.connect(self.db)
+        conn.executemany("INSERT INTO user (custom_id, first_name, last_name) VALUES (?, 'x', 'y')",
+                         [(c,) for c in custom_ids])
+        conn.commit()
+        conn.close()
+
+    def test_backfill_on_init(self):
+        # Users written without the counters, e.g. by an older build
+        self.insert_users("MR1", "MR7", "AB2", "strano")
+        self.run_async(database.init_db())
+        self.assertEqual(self.query("SELECT prefix, last_number FROM useridcounter ORDER BY prefix"),
+                         [("AB", 2), ("MR", 7)])
+        self.assertEqual(self.query("PRAGMA user_version"), [(database.SCHEMA_VERSION,)])
+
+    def test_create_user_increments(self):
+        self.insert_users("MR4")
+        ids = [self.run_async(create_user("Mario", "Rossi")).custom_id for _ in range(3)]
+        # No counter row yet: seeded from the existing MR4
+        self.assertEqual(ids, ["MR5", "MR6", "MR7"])
+        self.assertEqual(self.run_async(create_user("anna", "neri")).custom_id, "AN1")
+
+    def test_rolled_back_allocation_is_returned(self):
+        async def allocate_and_rollback():
+            async with database.get_session() as session:
+                first = await allocate_custom_ids(session, "LV", 50)
+                await session.rollback()
+                return first
+        self.assertEqual(self.run_async(allocate_and_rollback()), 1)
+        self.assertEqual(self.run_async(create_user("Luca", "Verdi")).custom_id, "LV1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from warehouse.watchdog import LoopWatchdog
+
+
+def blocking_work():
+    time.sleep(0.4)
+
+
+class TestLoopWatchdog(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.test_dir, "logs", "stalls.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def run_with_watchdog(self, body):
+        watchdog = LoopWatchdog(threshold_ms=100, interval=0.02, log_file=self.log_file)
+
+        async def go():
+            watchdog.start()
+            await asyncio.sleep(0.1)
+            await body()
+            await asyncio.sleep(0.1)
+            await watchdog.stop()
+
+        asyncio.run(go())
+        return watchdog
+
+    def test_stall_is_logged_with_stack(self):
+        async def body():
+            blocking_work()
+
+        watchdog = self.run_with_watchdog(body)
+
+        self.assertEqual(len(watchdog.stalls), 1)
+        stall = watchdog.stalls[0]
+        self.assertGreaterEqual(stall.duration_ms, 300)
+        self.assertIn("blocking_work", "".join(stall.stack))
+        with open(self.log_file, encoding="utf-8") as f:
+            self.assertIn("blocking_work", f.read())
+        self.assertGreater(sum(count for _, count in watchdog.histogram_rows()[4:]), 0)
+
+    def test_responsive_loop_has_no_stalls(self):
+        async def body():
+            await asyncio.sleep(0.3)
+
+        watchdog = self.run_with_watchdog(body)
+
+        self.assertEqual(len(watchdog.stalls), 0)
+        self.assertGreater(watchdog.beats, 5)
+        self.assertFalse(os.path.exists(self.log_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
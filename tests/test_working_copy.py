@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from warehouse.working_copy import WorkingCopy, WorkingCopyInUse
+
+
+def write_value(path, value):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS marker (value TEXT)")
+    conn.execute("DELETE FROM marker")
+    conn.execute("INSERT INTO marker VALUES (?)", (value,))
+    conn.commit()
+    conn.close()
+
+
+def read_value(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT value FROM marker").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def simulate_crash(copy):
+    """Hands the marker to a process that has exited, as a crash would leave it."""
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    with open(copy.lock_file, "r", encoding="utf-8") as f:
+        marker = json.load(f)
+    marker["pid"] = proc.pid
+    with open(copy.lock_file, "w", encoding="utf-8") as f:
+        json.dump(marker, f)
+
+
+class TestWorkingCopy(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.stick_dir = os.path.join(self.test_dir, "stick")
+        self.cache_dir = os.path.join(self.test_dir, "cache")
+        os.makedirs(self.stick_dir)
+        self.stick_db = os.path.join(self.stick_dir, "warehouse.db")
+        write_value(self.stick_db, "ORIGINAL")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_open_sync_close(self):
+        copy = WorkingCopy(self.stick_db, cache_dir=self.cache_dir)
+        local_db = copy.open()
+
+        self.assertNotEqual(os.path.dirname(local_db), self.stick_dir)
+        self.assertTrue(os.path.exists(copy.lock_file))
+
+        write_value(local_db, "CHANGED")
+        self.assertEqual(read_value(self.stick_db), "ORIGINAL")
+        copy.sync()
+        self.assertEqual(read_value(self.stick_db), "CHANGED")
+
+        write_value(local_db, "FINAL")
+        copy.close()
+        self.assertEqual(read_value(self.stick_db), "FINAL")
+        self.assertFalse(os.path.exists(copy.lock_file))
+        self.assertFalse(os.path.exists(local_db))
+        self.assertEqual(os.listdir(self.stick_dir), ["warehouse.db"])
+
+    def test_recovers_unsynced_changes_after_crash(self):
+        crashed = WorkingCopy(self.stick_db, cache_dir=self.cache_dir)
+        local_db = crashed.open()
+        write_value(local_db, "UNSYNCED")
+        # No close(): the process died or the stick was unplugged
+        simulate_crash(crashed)
+
+        copy = WorkingCopy(self.stick_db, cache_dir=self.cache_dir)
+        local_db = copy.open()
+
+        self.assertTrue(copy.recovered)
+        self.assertEqual(read_value(self.stick_db), "UNSYNCED")
+        self.assertEqual(read_value(local_db), "UNSYNCED")
+        copy.close()
+
+    def test_skips_recovery_when_stick_changed_elsewhere(self):
+        crashed = WorkingCopy(self.stick_db, cache_dir=self.cache_dir)
+        local_db = crashed.open()
+        write_value(local_db, "STALE")
+        # The stick was then used directly on another PC
+        write_value(self.stick_db, "NEWER ON STICK")
+        simulate_crash(crashed)
+
+        copy = WorkingCopy(self.stick_db, cache_dir=self.cache_dir)
+        local_db = copy.open()
+
+        self.assertFalse(copy.recovered)
+        self.assertEqual(read_value(local_db), "NEWER ON STICK")
+        copy.close()
+
+    def test_refuses_second_open_while_first_in_use(self):
+        first = WorkingCopy(self.stick_db, cache_dir=self.cache_dir)
+        local_db = first.open()
+        write_value(local_db, "UNSYNCED")
+
+        second = WorkingCopy(self.stick_db, cache_dir=self.cache_dir)
+        with self.assertRaises(WorkingCopyInUse):
+            second.open()
+
+        self.assertFalse(second.recovered)
+        self.assertEqual(read_value(local_db), "UNSYNCED")
+        self.assertEqual(read_value(self.stick_db), "ORIGINAL")
+        first.close()
+        self.assertEqual(read_value(self.stick_db), "UNSYNCED")
+
+    def test_refuses_marker_from_another_host(self):
+        crashed = WorkingCopy(self.stick_db, cache_dir=self.cache_dir)
+        crashed.open()
+        with open(crashed.lock_file, "r", encoding="utf-8") as f:
+            marker = json.load(f)
+        marker["host"] = socket.gethostname() + "-altro"
+        with open(crashed.lock_file, "w", encoding="utf-8") as f:
+            json.dump(marker, f)
+
+        copy = WorkingCopy(self.stick_db, cache_dir=self.cache_dir)
+        with self.assertRaises(WorkingCopyInUse):
+            copy.open()
+        self.assertTrue(os.path.exists(copy.lock_file))
+
+    def test_sync_refuses_to_overwrite_stick_changed_elsewhere(self):
+        copy = WorkingCopy(self.stick_db, cache_dir=self.cache_dir)
+        local_db = copy.open()
+        write_value(local_db, "LOCAL")
+        # Someone wrote to the stick DB directly while the copy was open
+        write_value(self.stick_db, "DIRECT")
+
+        self.assertFalse(copy.sync())
+        self.assertTrue(copy.conflict)
+        self.assertEqual(read_value(self.stick_db), "DIRECT")
+
+        copy.close()
+        self.assertEqual(read_value(self.stick_db), "DIRECT")
+        kept = [name for name in os.listdir(copy.local_dir) if "non_sincronizzato" in name]
+        self.assertEqual(len(kept), 1)
+        self.assertEqual(read_value(os.path.join(copy.local_dir, kept[0])), "LOCAL")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,4 @@
+import sys
+from warehouse.cli import main
+
+sys.exit(main())
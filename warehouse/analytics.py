@@ -0,0 +1,239 @@
+"""
+Consumption rates and stock-out / expiry-waste forecasts for consumables.
+
+Withdrawn quantities are binned per material and per day in a NumPy matrix
+(one row per material, one column per day); the daily rate of a material is
+the mean of its last RATE_WINDOW_DAYS columns. The matrix is kept in memory
+between runs and only the withdrawals added since the previous run are read
+and binned, so refreshing the forecast costs a COUNT and a few rows instead of
+a pass over the whole history. Deleted withdrawals (permanent deletes of users
+or materials) change that COUNT (or the units total, should SQLite hand the
+deleted id out again) and make the next run rebuild the matrix.
+
+From the rates:
+- days until stock-out: current stock / daily rate;
+- expiry waste: batches are consumed first-expiring-first (as create_withdrawal
+  does) at the daily rate; what a batch still holds when it expires is waste.
+"""
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlmodel import select, func, col
+from warehouse import database, tiering
+from warehouse.database import get_session
+from warehouse.models import Material, MaterialType, Batch, Withdrawal
+
+# Days of history the consumption rate is averaged over
+RATE_WINDOW_DAYS = 90
+
+# Stock-outs expected within this many days are reported
+STOCKOUT_HORIZON_DAYS = 30
+
+# Batches expiring within this many days are checked for waste
+WASTE_HORIZON_DAYS = 180
+
+
+@dataclass(frozen=True)
+class StockOutForecast:
+    material_id: int
+    denomination: str
+    stock: int
+    daily_rate: float
+    days_left: float
+
+
+@dataclass(frozen=True)
+class WasteRisk:
+    batch_id: int
+    material_id: int
+    denomination: str
+    expiration: date
+    amount: int
+    # Units expected to be left in the batch when it expires
+    expected_waste: int
+
+
+@dataclass
+class ForecastReport:
+    window_days: int
+    stockouts: list[StockOutForecast] = field(default_factory=list)
+    waste_risks: list[WasteRisk] = field(default_factory=list)
+    # Withdrawals binned by this run (all of them when the matrix was rebuilt)
+    withdrawals_read: int = 0
+    seconds: float = 0.0
+    computed_at: datetime = field(default_factory=datetime.now)
+
+    def summary(self) -> str:
+        return (
+            f"Consumi degli ultimi {self.window_days} giorni: {len(self.stockouts)} materiali in esaurimento "
+            f"entro {STOCKOUT_HORIZON_DAYS} giorni, {len(self.waste_risks)} lotti a rischio scadenza "
+            f"({self.withdrawals_read} prelievi letti, {self.seconds:.2f}s)"
+        )
+
+
+class ConsumptionBins:
+    """Units of each consumable withdrawn per day, from origin onwards."""
+
+    def __init__(self, db_path: str, origin: date):
+        self.db_path = db_path
+        self.origin = origin
+        self.rows: dict[int, int] = {}  # material id -> matrix row
+        self.matrix = np.zeros((0, 0))
+        self.last_id = 0
+        # Withdrawals and units binned so far: compared with the DB to detect deletions
+        self.binned = 0
+        self.binned_units = 0
+
+    def add(self, material_ids, days, amounts):
+        """Adds withdrawals given as parallel sequences (days counted from origin)."""
+        if len(days) == 0:
+            return
+        for material_id in material_ids:
+            if material_id not in self.rows:
+                self.rows[material_id] = len(self.rows)
+        row_index = np.fromiter((self.rows[m] for m in material_ids), dtype=np.int64, count=len(material_ids))
+        day_index = np.asarray(days, dtype=np.int64)
+        self.grow(len(self.rows), int(day_index.max()) + 1)
+        units = np.asarray(amounts, dtype=np.float64)
+        np.add.at(self.matrix, (row_index, day_index), units)
+        self.binned += len(days)
+        self.binned_units += int(units.sum())
+
+    def grow(self, rows: int, columns: int):
+        """Widens the matrix (zero-filled) to at least rows x columns."""
+        old_rows, old_columns = self.matrix.shape
+        if rows > old_rows or columns > old_columns:
+            matrix = np.zeros((max(rows, old_rows), max(columns, old_columns)))
+            matrix[:old_rows, :old_columns] = self.matrix
+            self.matrix = matrix
+
+    def daily_rates(self, today: date, window_days: int) -> dict[int, float]:
+        """Mean units per day over the window_days ending today, per material."""
+        end = (today - self.origin).days + 1
+        self.grow(len(self.rows), end)
+        rates = self.matrix[:, max(0, end - window_days):end].sum(axis=1) / window_days
+        return {material_id: float(rates[row]) for material_id, row in self.rows.items()}
+
+
+# Kept between runs; rebuilt for another DB file or when rows were deleted
+_bins: ConsumptionBins | None = None
+
+
+def _consumable_withdrawals(since: datetime):
+    """history(Withdrawal) rows of consumables withdrawn since the given time."""
+    W = tiering.history(Withdrawal)
+    consumables = select(Material.id).where(Material.material_type == MaterialType.CONSUMABLE)
+    return W, (W.withdrawal_date >= since, col(W.material_id).in_(consumables))
+
+
+async def _update_bins(session, today: date, window_days: int) -> tuple[ConsumptionBins, int]:
+    """Brings the cached bins up to date; returns them and the number of withdrawals read."""
+    global _bins
+    bins = _bins
+    if bins is not None:
+        if bins.db_path != database.db_path or (today - bins.origin).days + 1 < window_days:
+            bins = None
+        else:
+            W, conditions = _consumable_withdrawals(datetime.combine(bins.origin, datetime.min.time()))
+            seen = (await session.execute(
+                select(func.count(), func.coalesce(func.sum(W.amount), 0)).select_from(W)
+                .where(*conditions, W.id <= bins.last_id)
+            )).one()
+            if tuple(seen) != (bins.binned, bins.binned_units):
+                bins = None
+    if bins is None:
+        bins = ConsumptionBins(database.db_path, today - timedelta(days=window_days - 1))
+
+    W, conditions = _consumable_withdrawals(datetime.combine(bins.origin, datetime.min.time()))
+    result = await session.execute(
+        select(W.id, W.material_id, W.withdrawal_date, W.amount).where(*conditions, W.id > bins.last_id)
+    )
+    material_ids, days, amounts = [], [], []
+    for withdrawal_id, material_id, withdrawal_date, amount in result:
+        material_ids.append(material_id)
+        # Dates in the future (clock changes) count as today
+        days.append(min((withdrawal_date.date() - bins.origin).days, (today - bins.origin).days))
+        amounts.append(amount)
+        bins.last_id = max(bins.last_id, withdrawal_id)
+    bins.add(material_ids, days, amounts)
+
+    _bins = bins
+    return bins, len(days)
+
+
+def _fefo_waste(amounts: np.ndarray, days_to_expiry: np.ndarray, daily_rate: float) -> np.ndarray:
+    """
+    Units left in each batch (sorted by expiration) when it expires, consuming
+    daily_rate units a day from the first-expiring batch with stock.
+    """
+    capacity = daily_rate * np.maximum(days_to_expiry, 0)
+    waste = np.empty_like(amounts)
+    consumed = 0.0
+    for i, amount in enumerate(amounts):
+        # Whatever was consumed by this expiry, minus the earlier batches' share
+        used = min(amount, max(capacity[i] - consumed, 0.0))
+        waste[i] = amount - used
+        consumed += used
+    return waste
+
+
+async def get_forecast(window_days: int = RATE_WINDOW_DAYS) -> ForecastReport:
+    """Stock-outs within STOCKOUT_HORIZON_DAYS and batches at risk of expiring unused."""
+    start = time.perf_counter()
+    today = date.today()
+    report = ForecastReport(window_days=window_days)
+
+    async with get_session() as session:
+        bins, report.withdrawals_read = await _update_bins(session, today, window_days)
+        rates = bins.daily_rates(today, window_days)
+
+        stock_stmt = (
+            select(Material.id, Material.denomination, func.coalesce(func.sum(Batch.amount), 0))
+            .outerjoin(Batch, Batch.material_id == Material.id)
+            .where(Material.material_type == MaterialType.CONSUMABLE, col(Material.archived_at).is_(None))
+            .group_by(Material.id)
+        )
+        stocks = (await session.execute(stock_stmt)).all()
+
+        batch_stmt = (
+            select(Batch.id, Batch.material_id, Material.denomination, Batch.expiration, Batch.amount)
+            .join(Material, Batch.material_id == Material.id)
+            .where(Material.material_type == MaterialType.CONSUMABLE, col(Material.archived_at).is_(None))
+            .where(Batch.amount > 0, Batch.expiration >= today)
+            .where(Batch.expiration <= today + timedelta(days=WASTE_HORIZON_DAYS))
+            .order_by(Batch.material_id, Batch.expiration, Batch.id)
+        )
+        batches = (await session.execute(batch_stmt)).all()
+
+    # Stock-out: all materials at once
+    if stocks:
+        ids = np.array([row[0] for row in stocks])
+        stock = np.array([row[2] for row in stocks], dtype=np.float64)
+        rate = np.array([rates.get(material_id, 0.0) for material_id in ids])
+        days_left = np.divide(stock, rate, out=np.full_like(stock, np.inf), where=rate > 0)
+        for i in np.flatnonzero(days_left <= STOCKOUT_HORIZON_DAYS):
+            report.stockouts.append(StockOutForecast(
+                int(ids[i]), stocks[i][1], int(stock[i]), float(rate[i]), float(days_left[i])
+            ))
+        report.stockouts.sort(key=lambda f: (f.days_left, f.denomination))
+
+    # Expiry waste: per material, over its batches in FEFO order
+    start_row = 0
+    while start_row < len(batches):
+        material_id = batches[start_row][1]
+        end_row = start_row
+        while end_row < len(batches) and batches[end_row][1] == material_id:
+            end_row += 1
+        group = batches[start_row:end_row]
+        amounts = np.array([row[4] for row in group], dtype=np.float64)
+        days_to_expiry = np.array([(row[3] - today).days for row in group], dtype=np.float64)
+        waste = np.ceil(_fefo_waste(amounts, days_to_expiry, rates.get(material_id, 0.0)))
+        for row, units in zip(group, waste):
+            if units > 0:
+                report.waste_risks.append(WasteRisk(row[0], row[1], row[2], row[3], row[4], int(units)))
+        start_row = end_row
+    report.waste_risks.sort(key=lambda r: (r.expiration, r.batch_id))
+
+    report.seconds = time.perf_counter() - start
+    return report
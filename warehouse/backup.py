@@ -0,0 +1,437 @@
+import asyncio
+import glob
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from warehouse.database import SCHEMA_VERSION, write_activity
+from warehouse.tiering import ARCHIVE_FILENAME
+
+DB_FILENAME = "warehouse.db"
+IMAGES_DIRNAME = "images"
+BACKUPS_DIRNAME = "backups"
+
+SNAPSHOT_TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+_SNAPSHOT_RE = re.compile(r"^warehouse_(?P<label>[a-z]+)_(?P<ts>\d{8}_\d{6})\.db$")
+_LEGACY_RESET_RE = re.compile(r"^warehouse_backup_RESET_(?P<ts>\d{8}_\d{6})\.db$")
+
+# Snapshots taken before a reset are never thinned by time buckets, only capped
+RESET_SNAPSHOTS_TO_KEEP = 10
+
+# Tables a backup must contain to be considered a warehouse database
+REQUIRED_TABLES = {"user", "material", "batch", "withdrawal", "eventlog"}
+
+# SQLite side files that belong to the live DB and must never survive a swap,
+# otherwise a stale hot journal would be replayed on top of the restored file.
+_DB_SIDE_SUFFIXES = ("-journal", "-wal", "-shm")
+
+
+def export_backup(file_path: str, base_path: str):
+    """
+    Writes a full backup (DB, history archive if any, images folder) as a ZIP archive.
+    If file_path does not end with .zip only the DB file is copied.
+    """
+    db_file = os.path.join(base_path, DB_FILENAME)
+    archive_file = os.path.join(base_path, ARCHIVE_FILENAME)
+    images_dir = os.path.join(base_path, IMAGES_DIRNAME)
+
+    if not file_path.endswith('.zip'):
+        # Legacy DB only export
+        shutil.copy2(db_file, file_path)
+        return
+
+    with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        if os.path.exists(db_file):
+            zipf.write(db_file, DB_FILENAME)
+
+        if os.path.exists(archive_file):
+            zipf.write(archive_file, ARCHIVE_FILENAME)
+
+        if os.path.exists(images_dir):
+            for root, dirs, files in os.walk(images_dir):
+                for file in files:
+                    abs_path = os.path.join(root, file)
+                    rel_path = os.path.relpath(abs_path, base_path)
+                    zipf.write(abs_path, rel_path)
+
+
+def validate_database(db_file: str):
+    """
+    Checks that db_file is a healthy warehouse database this build can open.
+    Raises ValueError describing the first problem found.
+    """
+    try:
+        conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        raise ValueError(f"Impossibile aprire il database: {e}")
+
+    try:
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"Il file non è un database valido: {e}")
+    finally:
+        conn.close()
+
+    if not result or result[0] != "ok":
+        raise ValueError(f"Controllo di integrità fallito: {result[0] if result else 'nessun risultato'}")
+
+    missing = REQUIRED_TABLES - tables
+    if missing:
+        raise ValueError(f"Tabelle mancanti nel database: {', '.join(sorted(missing))}")
+
+    if version > SCHEMA_VERSION:
+        raise ValueError(
+            f"Il backup proviene da una versione più recente dell'applicazione "
+            f"(schema {version}, supportato fino a {SCHEMA_VERSION})."
+        )
+
+
+def _safe_member_path(name: str) -> str | None:
+    """Normalizes a ZIP entry name, returning None for entries escaping the archive root."""
+    normalized = name.replace("\\", "/")
+    if normalized.startswith("/") or ":" in normalized.split("/")[0]:
+        return None
+    parts = [p for p in normalized.split("/") if p not in ("", ".")]
+    if not parts or ".." in parts:
+        return None
+    return "/".join(parts)
+
+
+def _stream_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, target: str):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with zip_ref.open(info) as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def _stage_zip(file_path: str, staging_dir: str) -> tuple[str, str | None, str | None]:
+    """
+    Streams the archive entries straight into staging_dir.
+    The DB is extracted and validated first so a bad archive is rejected
+    before any image is written.
+    Returns (staged_db, staged_images or None, staged history archive or None).
+    """
+    staged_db = os.path.join(staging_dir, DB_FILENAME)
+    staged_images = os.path.join(staging_dir, IMAGES_DIRNAME)
+    staged_archive = None
+
+    with zipfile.ZipFile(file_path, 'r') as zip_ref:
+        db_info = None
+        archive_info = None
+        image_infos = []
+        for info in zip_ref.infolist():
+            name = _safe_member_path(info.filename)
+            if name is None or info.is_dir():
+                continue
+            if name == DB_FILENAME:
+                db_info = info
+            elif name == ARCHIVE_FILENAME:
+                archive_info = info
+            elif name.startswith(IMAGES_DIRNAME + "/"):
+                image_infos.append((name, info))
+
+        if db_info is None:
+            raise FileNotFoundError(f"Il file '{DB_FILENAME}' non è presente nell'archivio.")
+
+        _stream_member(zip_ref, db_info, staged_db)
+        validate_database(staged_db)
+
+        if archive_info is not None:
+            staged_archive = os.path.join(staging_dir, ARCHIVE_FILENAME)
+            _stream_member(zip_ref, archive_info, staged_archive)
+
+        if not image_infos:
+            return staged_db, None, staged_archive
+
+        os.makedirs(staged_images, exist_ok=True)
+        for name, info in image_infos:
+            _stream_member(zip_ref, info, os.path.join(staging_dir, *name.split("/")))
+
+    return staged_db, staged_images, staged_archive
+
+
+def _swap_into_place(
+    staged_db: str, staged_images: str | None, base_path: str, staging_dir: str, replace_images: bool,
+    staged_archive: str | None = None,
+):
+    """
+    Moves the staged files over the live ones using renames only.
+    On failure the previous DB, history archive and images folder are put back.
+    """
+    db_file = os.path.join(base_path, DB_FILENAME)
+    archive_file = os.path.join(base_path, ARCHIVE_FILENAME)
+    images_dir = os.path.join(base_path, IMAGES_DIRNAME)
+    previous_dir = os.path.join(staging_dir, "previous")
+    os.makedirs(previous_dir)
+
+    moved = []  # (original, parked) pairs, in order, for rollback
+    images_swapped = False
+    archive_swapped = False
+    try:
+        for suffix in _DB_SIDE_SUFFIXES:
+            side_file = db_file + suffix
+            if os.path.exists(side_file):
+                parked = os.path.join(previous_dir, DB_FILENAME + suffix)
+                os.replace(side_file, parked)
+                moved.append((side_file, parked))
+
+        if os.path.exists(db_file):
+            # Hard link keeps the old DB reachable for rollback without copying it
+            parked = os.path.join(previous_dir, DB_FILENAME)
+            try:
+                os.link(db_file, parked)
+            except OSError:
+                shutil.copy2(db_file, parked)
+            moved.append((db_file, parked))
+
+        if staged_archive and os.path.exists(archive_file):
+            parked = os.path.join(previous_dir, ARCHIVE_FILENAME)
+            os.replace(archive_file, parked)
+            moved.append((archive_file, parked))
+
+        if replace_images and os.path.exists(images_dir):
+            parked = os.path.join(previous_dir, IMAGES_DIRNAME)
+            os.replace(images_dir, parked)
+            moved.append((images_dir, parked))
+
+        if replace_images and staged_images:
+            os.replace(staged_images, images_dir)
+            images_swapped = True
+
+        if staged_archive:
+            os.replace(staged_archive, archive_file)
+            archive_swapped = True
+
+        os.replace(staged_db, db_file)
+    except Exception:
+        if archive_swapped:
+            os.remove(archive_file)
+        if images_swapped:
+            shutil.rmtree(images_dir, ignore_errors=True)
+        for original, parked in reversed(moved):
+            os.replace(parked, original)
+        raise
+
+
+def import_backup(file_path: str, base_path: str):
+    """
+    Restores a backup created by export_backup into base_path.
+
+    ZIP entries are streamed into a staging folder next to the target, the DB
+    is validated (integrity_check, required tables, schema version) and only
+    then DB and images are swapped in with renames, so a failed import never
+    leaves a half-restored installation behind.
+    A plain .db/.sqlite file replaces the DB only and keeps the images.
+
+    The caller must have released every connection to the live DB.
+    """
+    staging_dir = tempfile.mkdtemp(prefix=".import-", dir=base_path)
+    try:
+        if file_path.endswith('.zip'):
+            staged_db, staged_images, staged_archive = _stage_zip(file_path, staging_dir)
+            # An archive without images restores an installation without images
+            replace_images = True
+        else:
+            staged_db = os.path.join(staging_dir, DB_FILENAME)
+            shutil.copyfile(file_path, staged_db)
+            validate_database(staged_db)
+            staged_images = None
+            staged_archive = None
+            replace_images = False
+
+        _swap_into_place(staged_db, staged_images, base_path, staging_dir, replace_images, staged_archive)
+
+        archive_file = os.path.join(base_path, ARCHIVE_FILENAME)
+        if replace_images and staged_archive is None and os.path.exists(archive_file):
+            # The restored DB predates the history archive: set the archive
+            # aside so its rows are not listed twice, without deleting them
+            backups_dir = os.path.join(base_path, BACKUPS_DIRNAME)
+            os.makedirs(backups_dir, exist_ok=True)
+            stamp = datetime.now().strftime(SNAPSHOT_TIMESTAMP_FORMAT)
+            os.replace(archive_file, os.path.join(backups_dir, f"{ARCHIVE_FILENAME[:-3]}_previous_{stamp}.db"))
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+@dataclass
+class RetentionPolicy:
+    """How many hourly, daily and weekly recovery points to keep."""
+    hourly: int = 24
+    daily: int = 7
+    weekly: int = 8
+
+
+def create_snapshot(db_file: str, backups_dir: str, label: str = "auto", now: datetime | None = None) -> str:
+    """
+    Writes a compact copy of db_file into backups_dir using VACUUM INTO.
+    The copy is built under a temporary name and renamed when complete,
+    so a half-written snapshot is never visible.
+    Returns the snapshot path.
+    """
+    os.makedirs(backups_dir, exist_ok=True)
+    timestamp = (now or datetime.now()).strftime(SNAPSHOT_TIMESTAMP_FORMAT)
+    target = os.path.join(backups_dir, f"warehouse_{label}_{timestamp}.db")
+    partial = target + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        conn.execute("VACUUM INTO ?", (partial,))
+    finally:
+        conn.close()
+    os.replace(partial, target)
+    return target
+
+
+def list_snapshots(backups_dir: str, label: str) -> list[tuple[str, datetime]]:
+    """Returns (path, timestamp) for the snapshots with the given label, newest first."""
+    snapshots = []
+    for path in glob.glob(os.path.join(backups_dir, f"warehouse_{label}_*.db")):
+        match = _SNAPSHOT_RE.match(os.path.basename(path))
+        if match and match.group("label") == label:
+            snapshots.append((path, datetime.strptime(match.group("ts"), SNAPSHOT_TIMESTAMP_FORMAT)))
+    snapshots.sort(key=lambda s: s[1], reverse=True)
+    return snapshots
+
+
+def select_snapshots_to_keep(snapshots: list[tuple[str, datetime]], policy: RetentionPolicy) -> set[str]:
+    """
+    Grandfather-father-son thinning: keeps the newest snapshot of each of the
+    last `policy.hourly` hours, `policy.daily` days and `policy.weekly` ISO weeks
+    that have a snapshot. The newest snapshot overall is always kept.
+    """
+    ordered = sorted(snapshots, key=lambda s: s[1], reverse=True)
+    keep = {ordered[0][0]} if ordered else set()
+
+    bucket_rules = (
+        (policy.hourly, lambda ts: (ts.date(), ts.hour)),
+        (policy.daily, lambda ts: ts.date()),
+        (policy.weekly, lambda ts: ts.isocalendar()[:2]),
+    )
+    for limit, bucket_of in bucket_rules:
+        seen = set()
+        for path, ts in ordered:
+            if len(seen) >= limit:
+                break
+            bucket = bucket_of(ts)
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(path)
+    return keep
+
+
+def rotate_snapshots(backups_dir: str, policy: RetentionPolicy) -> list[str]:
+    """Deletes snapshots outside the retention policy. Returns the removed paths."""
+    removed = []
+
+    auto_snapshots = list_snapshots(backups_dir, "auto")
+    keep = select_snapshots_to_keep(auto_snapshots, policy)
+    removed += [path for path, _ in auto_snapshots if path not in keep]
+
+    reset_snapshots = list_snapshots(backups_dir, "reset")
+    removed += [path for path, _ in reset_snapshots[RESET_SNAPSHOTS_TO_KEEP:]]
+
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def adopt_legacy_reset_backups(base_path: str, backups_dir: str):
+    """Moves the warehouse_backup_RESET_*.db files of older versions into backups_dir."""
+    for path in glob.glob(os.path.join(base_path, "warehouse_backup_RESET_*.db")):
+        match = _LEGACY_RESET_RE.match(os.path.basename(path))
+        if not match:
+            continue
+        os.makedirs(backups_dir, exist_ok=True)
+        os.replace(path, os.path.join(backups_dir, f"warehouse_reset_{match.group('ts')}.db"))
+
+
+class BackupScheduler:
+    """
+    Takes automatic snapshots of the DB on the asyncio loop.
+    A snapshot is due every `interval_hours` or after `write_threshold` committed
+    write transactions (either can be 0 to disable it), and optionally when the
+    application closes. Snapshot and rotation run in a worker thread.
+    """
+    CHECK_INTERVAL_SECONDS = 60
+
+    def __init__(
+        self,
+        db_file: str,
+        backups_dir: str,
+        interval_hours: float = 4,
+        write_threshold: int = 200,
+        on_close: bool = True,
+        policy: RetentionPolicy | None = None,
+    ):
+        self.db_file = db_file
+        self.backups_dir = backups_dir
+        self.interval_hours = interval_hours
+        self.write_threshold = write_threshold
+        self.on_close = on_close
+        self.policy = policy or RetentionPolicy()
+
+        self.last_snapshot_path = None
+        self._last_snapshot_time = time.monotonic()
+        self._last_snapshot_writes = write_activity.count
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.on_close and self.pending_writes() > 0:
+            await self.backup_now()
+
+    def pending_writes(self) -> int:
+        return write_activity.count - self._last_snapshot_writes
+
+    def is_due(self) -> bool:
+        if self.write_threshold > 0 and self.pending_writes() >= self.write_threshold:
+            return True
+        if self.interval_hours > 0 and self.pending_writes() > 0:
+            elapsed = time.monotonic() - self._last_snapshot_time
+            return elapsed >= self.interval_hours * 3600
+        return False
+
+    async def backup_now(self) -> str | None:
+        async with self._lock:
+            if not os.path.exists(self.db_file):
+                return None
+            writes = write_activity.count
+            path = await asyncio.to_thread(self._snapshot_and_rotate)
+            self.last_snapshot_path = path
+            self._last_snapshot_time = time.monotonic()
+            self._last_snapshot_writes = writes
+            return path
+
+    def _snapshot_and_rotate(self) -> str:
+        path = create_snapshot(self.db_file, self.backups_dir, label="auto")
+        rotate_snapshots(self.backups_dir, self.policy)
+        return path
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.CHECK_INTERVAL_SECONDS)
+            if self.is_due():
+                try:
+                    await self.backup_now()
+                except Exception as e:
+                    print(f"Backup automatico fallito: {e}")
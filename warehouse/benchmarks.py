@@ -0,0 +1,219 @@
+"""
+Controller benchmarks against generated databases.
+
+    python -m warehouse.benchmarks --sizes small,medium --output bench.json
+    python -m warehouse.benchmarks --save-baseline            # record benchmarks/baseline.json
+    python -m warehouse.benchmarks --baseline benchmarks/baseline.json --threshold 0.25
+
+Each size is generated once with warehouse.datagen (cached in --data-dir per
+schema version) and copied before the run, so write benchmarks never alter the cached data.
+The process exits with status 1 when a case is slower than the baseline by
+more than the threshold, or issues more queries than it used to.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import text
+from warehouse import database
+from warehouse.controllers import create_withdrawal, get_all_users, filter_users, get_all_withdrawals
+from warehouse.controllers_material import get_material_stocks, get_low_stock_materials
+from warehouse.controllers_log import get_logs
+from warehouse.controllers_usage import get_usage_report
+from warehouse.database import SCHEMA_VERSION
+from warehouse.datagen import PRESETS, generate_database
+from warehouse.instrumentation import instrumentation
+
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+
+# Differences below this are noise on any machine, whatever the ratio
+MIN_REGRESSION_MS = 2.0
+
+
+async def measure(fn, repeat: int) -> dict:
+    """Calls fn repeat times, awaiting its result when needed."""
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        before = instrumentation.query_count
+        start = time.perf_counter()
+        result = fn()
+        if inspect.isawaitable(result):
+            await result
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(instrumentation.query_count - before)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "max_ms": round(max(timings), 3),
+        "queries": max(queries),
+    }
+
+
+async def _benchmark_cases(repeat: int) -> dict:
+    async with database.engine.connect() as conn:
+        row = (await conn.execute(text(
+            "SELECT b.material_id, SUM(b.amount) AS stock FROM batch b "
+            "JOIN material m ON m.id = b.material_id WHERE m.material_type = 'CONSUMABLE' "
+            "GROUP BY b.material_id ORDER BY stock DESC LIMIT 1"
+        ))).first()
+        material_id = row[0]
+        user_id = (await conn.execute(text("SELECT MIN(id) FROM user"))).scalar()
+        log_count = (await conn.execute(text("SELECT COUNT(*) FROM eventlog"))).scalar()
+
+    users = await get_all_users()
+    deep_offset = max(0, log_count - 100)
+
+    cases = {
+        "create_withdrawal": lambda: create_withdrawal(user_id, material_id, 1),
+        "get_material_stocks": get_material_stocks,
+        "get_low_stock_materials": get_low_stock_materials,
+        "get_all_users": get_all_users,
+        "filter_users": lambda: filter_users("Mario Rossi", users),
+        "get_all_withdrawals": get_all_withdrawals,
+        "get_logs_first_page": lambda: get_logs(limit=100, offset=0),
+        "get_logs_deep_page": lambda: get_logs(limit=100, offset=deep_offset),
+        "get_usage_report_monthly": lambda: get_usage_report("material", "month"),
+    }
+
+    results = {}
+    for name, fn in cases.items():
+        # The full history listing is too slow to repeat on big databases
+        runs = 1 if name == "get_all_withdrawals" else repeat
+        results[name] = await measure(fn, runs)
+    return results
+
+
+def prepare_database(size: str, data_dir: str, seed: int) -> str:
+    os.makedirs(data_dir, exist_ok=True)
+    # A DB cached before a migration lacks its tables, so each schema gets its own file
+    path = os.path.join(data_dir, f"bench_{size}_{seed}_v{SCHEMA_VERSION}.db")
+    if not os.path.exists(path):
+        print(f"Generazione database '{size}'...")
+        generate_database(path, seed=seed, **PRESETS[size])
+    return path
+
+
+async def run_benchmarks(sizes: list[str], data_dir: str, repeat: int = 5, seed: int = 42) -> dict:
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": {},
+    }
+    original_path = database.db_path
+    with tempfile.TemporaryDirectory() as work_dir:
+        try:
+            for size in sizes:
+                source = prepare_database(size, data_dir, seed)
+                work_db = os.path.join(work_dir, f"{size}.db")
+                shutil.copyfile(source, work_db)
+                await database.set_database_path(work_db)
+                print(f"Benchmark '{size}'...")
+                report["results"][size] = await _benchmark_cases(repeat)
+        finally:
+            await database.set_database_path(original_path)
+            await database.engine.dispose()
+    return report
+
+
+def compare_to_baseline(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Returns a description of every case that regressed against the baseline."""
+    regressions = []
+    for size, cases in report["results"].items():
+        for name, current in cases.items():
+            previous = baseline.get("results", {}).get(size, {}).get(name)
+            if previous is None:
+                continue
+            slower_by = current["median_ms"] - previous["median_ms"]
+            if slower_by > MIN_REGRESSION_MS and current["median_ms"] > previous["median_ms"] * (1 + threshold):
+                regressions.append(
+                    f"{size}/{name}: {previous['median_ms']:.1f} ms -> {current['median_ms']:.1f} ms"
+                )
+            if current["queries"] > previous["queries"]:
+                regressions.append(
+                    f"{size}/{name}: {previous['queries']} -> {current['queries']} query"
+                )
+    return regressions
+
+
+def print_report(report: dict):
+    for size, cases in report["results"].items():
+        print(f"\n[{size}]")
+        for name, r in cases.items():
+            print(f"  {name:<26} median {r['median_ms']:>10.2f} ms   min {r['min_ms']:>10.2f} ms   query {r['queries']:>4}")
+    for size, memory in report.get("memory", {}).items():
+        print(f"[{size}] picco memoria: {memory['peak_rss_mb']} MB")
+
+
+def build_parser(description: str, default_sizes: str, default_repeat: int, default_baseline: str) -> argparse.ArgumentParser:
+    """Command line shared by the controller and UI benchmarks."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--sizes", default=default_sizes, help=f"Elenco separato da virgole tra: {', '.join(PRESETS)}")
+    parser.add_argument("--repeat", type=int, default=default_repeat)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default="bench_data")
+    parser.add_argument("--output", help="Scrive i risultati in questo file JSON")
+    parser.add_argument("--baseline", help="Confronta con questo file JSON e fallisce in caso di regressioni")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Rallentamento massimo tollerato (0.25 = +25%%)")
+    parser.add_argument("--save-baseline", nargs="?", const=default_baseline, help="Salva i risultati come nuova baseline")
+    return parser
+
+
+def parse_sizes(parser: argparse.ArgumentParser, args) -> list[str]:
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in PRESETS]
+    if unknown:
+        parser.error(f"Dimensioni sconosciute: {', '.join(unknown)}")
+    return sizes
+
+
+def finish_report(report: dict, args) -> int:
+    """
+    Prints the report, writes it to --output/--save-baseline and applies the
+    --baseline gate. Returns the process exit status.
+    """
+    print_report(report)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.threshold)
+        if regressions:
+            print("\nRegressioni rispetto alla baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNessuna regressione rispetto alla baseline.")
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser("Benchmark dei controller su database generati.", "small,medium", 5, DEFAULT_BASELINE)
+    args = parser.parse_args(argv)
+    sizes = parse_sizes(parser, args)
+
+    report = asyncio.run(run_benchmarks(sizes, args.data_dir, args.repeat, args.seed))
+    return finish_report(report, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
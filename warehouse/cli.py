@@ -0,0 +1,303 @@
+"""
+Command line interface for batch work without the GUI, run as
+"python -m warehouse.cli COMMAND" (or "python -m warehouse COMMAND"):
+
+    import ENTITY FILE       bulk CSV import of users/materials/batches
+    export KIND FILE         streaming CSV/JSONL export of withdrawals/logs
+    backup [OUTPUT]          snapshot (or .zip/.db export) of the DB
+    restore FILE             restore a .zip/.db backup
+    stock [--low] [--csv]    stock report
+    maintenance [--compact]  ANALYZE/optimize/integrity check
+    archive-history          move old withdrawals/logs to warehouse_archive.db
+    forecast                 stock-out and expiry-waste forecast of consumables
+    usage [--by] [--period]  usage report from the daily rollup (--rebuild)
+    benchmark [...]          controller benchmarks
+
+The project is not an installable package, so there is no console script.
+Only models, controllers and the database helpers are imported: Qt is never
+loaded, so nightly jobs start fast and do not need a display.
+
+--db, given before or after the command (benchmark excepted), selects a
+database other than the one next to the executable. Commands that query it
+upgrade its schema first, as the application does at startup.
+"""
+import argparse
+import asyncio
+import csv
+import os
+import sys
+from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
+from warehouse import database, tiering
+from warehouse.backup import (
+    export_backup, import_backup, create_snapshot, rotate_snapshots,
+    RetentionPolicy, DB_FILENAME, BACKUPS_DIRNAME,
+)
+from warehouse.maintenance import run_maintenance
+from warehouse.models import MaterialType, EventType
+
+
+def _installation_dir(db_path: str) -> str:
+    """Folder holding warehouse.db and images/, as expected by export/import_backup."""
+    if os.path.basename(db_path) != DB_FILENAME:
+        raise ValueError(f"Operazione disponibile solo per un database chiamato {DB_FILENAME}: {db_path}")
+    return os.path.dirname(db_path)
+
+
+def run_async(coro_fn, db_path: str):
+    """
+    Upgrades the schema of db_path, runs a coroutine against it and releases
+    the engine afterwards. Without the upgrade a DB last opened by an older
+    build would miss the newer tables and columns the queries rely on.
+    """
+    async def runner():
+        if db_path != database.db_path:
+            await database.set_database_path(db_path)
+        try:
+            await database.init_db()
+            return await coro_fn()
+        finally:
+            await database.engine.dispose()
+
+    return asyncio.run(runner())
+
+
+def _parse_mapping(items: list[str]) -> dict[str, str]:
+    mapping = {}
+    for item in items or []:
+        field_name, sep, column = item.partition("=")
+        if not sep or not field_name.strip() or not column.strip():
+            raise ValueError(f"Mappatura non valida: '{item}' (usare campo=Colonna)")
+        mapping[field_name.strip()] = column.strip()
+    return mapping
+
+
+def _parse_date(value: str):
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"data '{value}' non valida (usare AAAA-MM-GG o GG/MM/AAAA)")
+
+
+# --- Commands ---
+
+def cmd_import(args) -> int:
+    from warehouse.importer import import_csv
+
+    mapping = _parse_mapping(args.map)
+    report = run_async(
+        lambda: import_csv(args.file, args.entity, mapping, dry_run=args.dry_run, delimiter=args.delimiter),
+        args.db,
+    )
+    print(report.summary(max_errors=args.max_errors))
+    return 1 if report.error_count else 0
+
+
+def cmd_export(args) -> int:
+    from warehouse.exporter import export_withdrawals, export_logs
+
+    if args.kind == "withdrawals":
+        export = lambda: export_withdrawals(
+            args.file, args.date_from, args.date_to,
+            user=args.user, workplace=args.workplace, material_id=args.material,
+        )
+    else:
+        event_type = EventType(args.event_type) if args.event_type else None
+        export = lambda: export_logs(args.file, args.date_from, args.date_to, event_type=event_type)
+    report = run_async(export, args.db)
+    print(report.summary())
+    return 0
+
+
+def cmd_backup(args) -> int:
+    if args.output:
+        export_backup(os.path.abspath(args.output), _installation_dir(args.db))
+        print(f"Backup esportato in {args.output}")
+        return 0
+    backups_dir = os.path.join(os.path.dirname(args.db), BACKUPS_DIRNAME)
+    path = create_snapshot(args.db, backups_dir, "auto")
+    removed = rotate_snapshots(backups_dir, RetentionPolicy())
+    print(f"Snapshot creato: {path}")
+    if removed:
+        print(f"Snapshot rimossi dalla rotazione: {len(removed)}")
+    return 0
+
+
+def cmd_restore(args) -> int:
+    import_backup(os.path.abspath(args.file), _installation_dir(args.db))
+    print(f"Backup ripristinato in {args.db}")
+    return 0
+
+
+def cmd_stock(args) -> int:
+    from warehouse.controllers_material import get_stock_report
+
+    material_type = MaterialType(args.type) if args.type else None
+    rows = run_async(lambda: get_stock_report(material_type), args.db)
+    if args.low:
+        rows = [(m, stock) for m, stock in rows if m.min_stock > 0 and stock <= m.min_stock]
+
+    if args.csv:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["id", "tipo", "denominazione", "codice", "scorta", "scorta_minima", "sotto_scorta"])
+        for m, stock in rows:
+            writer.writerow([m.id, m.material_type.value, m.denomination, m.code or "", stock, m.min_stock,
+                             int(m.min_stock > 0 and stock <= m.min_stock)])
+        return 0
+
+    for m, stock in rows:
+        flag = "  SOTTO SCORTA" if m.min_stock > 0 and stock <= m.min_stock else ""
+        print(f"{m.id:>6}  {m.material_type.value:<10}  {m.denomination[:40]:<40}  {stock:>8} / {m.min_stock:<6}{flag}")
+    print(f"{len(rows)} materiali")
+    return 0
+
+
+def cmd_maintenance(args) -> int:
+    report = run_maintenance(args.db, full=not args.quick, compact=args.compact)
+    print(report.summary())
+    return 0
+
+
+def cmd_archive_history(args) -> int:
+    report = run_async(lambda: tiering.move_to_archive(args.months * 30), args.db)
+    print(report.summary())
+    return 0
+
+
+def cmd_forecast(args) -> int:
+    from warehouse.analytics import get_forecast
+
+    report = run_async(lambda: get_forecast(args.days) if args.days else get_forecast(), args.db)
+    for f in report.stockouts:
+        print(f"{f.material_id:>6}  {f.denomination[:40]:<40}  scorta {f.stock:>6}  "
+              f"{f.daily_rate:>7.1f}/giorno  esaurimento tra {f.days_left:.0f} giorni")
+    for r in report.waste_risks:
+        print(f"{r.material_id:>6}  {r.denomination[:40]:<40}  lotto {r.batch_id} scade il {r.expiration:%d/%m/%Y}: "
+              f"~{r.expected_waste} di {r.amount} non utilizzati")
+    print(report.summary())
+    return 0
+
+
+def cmd_usage(args) -> int:
+    from warehouse.controllers_usage import get_usage_report, rebuild_usage_rollup
+
+    if args.rebuild:
+        run_async(rebuild_usage_rollup, args.db)
+        print("Riepilogo giornaliero dei consumi ricostruito")
+        return 0
+
+    rows = run_async(lambda: get_usage_report(args.by, args.period, args.date_from, args.date_to), args.db)
+    if args.csv:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["periodo", "chiave", "descrizione", "quantita", "prelievi"])
+        for row in rows:
+            writer.writerow([row.period, row.key if row.key is not None else "", row.label, row.amount, row.count])
+        return 0
+
+    for row in rows:
+        print(f"{row.period:<10}  {row.label[:50]:<50}  {row.amount:>10}  {row.count:>8} prelievi")
+    print(f"{len(rows)} righe")
+    return 0
+
+
+def cmd_benchmark(args) -> int:
+    from warehouse import benchmarks
+    return benchmarks.main(args.benchmark_args)
+
+
+# --- Parser ---
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m warehouse.cli", description="Gestore Magazzino da riga di comando.")
+    parser.add_argument("--db", default=database.db_path, help=f"Database da usare (predefinito: {database.db_path})")
+    # Also accepted after the command; SUPPRESS keeps the subparser from
+    # resetting a --db given before it
+    db_option = argparse.ArgumentParser(add_help=False)
+    db_option.add_argument("--db", default=argparse.SUPPRESS, help="Database da usare")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    from warehouse.importer import ENTITIES
+    import_ = commands.add_parser("import", parents=[db_option], help="Importa utenti, materiali o lotti da un file CSV")
+    import_.add_argument("entity", choices=list(ENTITIES))
+    import_.add_argument("file")
+    import_.add_argument("--map", action="append", metavar="CAMPO=COLONNA", help="Associa un campo a una colonna del file (ripetibile)")
+    import_.add_argument("--delimiter", help="Separatore di colonna (predefinito: rilevato dal file)")
+    import_.add_argument("--dry-run", action="store_true", help="Valida il file senza scrivere nel database")
+    import_.add_argument("--max-errors", type=int, default=50, help="Righe con errori da elencare")
+    import_.set_defaults(func=cmd_import)
+
+    export = commands.add_parser("export", parents=[db_option], help="Esporta prelievi o log eventi in CSV o JSONL (dall'estensione del file)")
+    export.add_argument("kind", choices=["withdrawals", "logs"])
+    export.add_argument("file", help="File .csv o .jsonl da scrivere")
+    export.add_argument("--from", dest="date_from", type=_parse_date, help="Dalla data (inclusa)")
+    export.add_argument("--to", dest="date_to", type=_parse_date, help="Alla data (inclusa)")
+    export.add_argument("--user", help="Solo l'utente con questo ID (es. MR3)")
+    export.add_argument("--workplace", help="Solo gli utenti di questo luogo di lavoro")
+    export.add_argument("--material", type=int, help="Solo il materiale con questo id")
+    export.add_argument("--event-type", choices=[t.value for t in EventType], help="Solo questo tipo di evento (log)")
+    export.set_defaults(func=cmd_export)
+
+    backup = commands.add_parser("backup", parents=[db_option], help="Crea uno snapshot del database o esporta un backup")
+    backup.add_argument("output", nargs="?", help="File .zip (DB + immagini) o .db; senza, snapshot ruotato in backups/")
+    backup.set_defaults(func=cmd_backup)
+
+    restore = commands.add_parser("restore", parents=[db_option], help="Ripristina un backup .zip o .db (chiudere prima l'applicazione)")
+    restore.add_argument("file")
+    restore.set_defaults(func=cmd_restore)
+
+    stock = commands.add_parser("stock", parents=[db_option], help="Report delle scorte")
+    stock.add_argument("--low", action="store_true", help="Solo i materiali sotto la scorta minima")
+    stock.add_argument("--type", choices=[t.value for t in MaterialType])
+    stock.add_argument("--csv", action="store_true", help="Scrive CSV su stdout")
+    stock.set_defaults(func=cmd_stock)
+
+    maintenance = commands.add_parser("maintenance", parents=[db_option], help="Manutenzione del database (completa: chiudere prima l'applicazione)")
+    maintenance.add_argument("--quick", action="store_true", help="Solo PRAGMA optimize e incremental_vacuum, sicura con l'applicazione aperta")
+    maintenance.add_argument("--compact", action="store_true", help="Compatta il file (VACUUM)")
+    maintenance.set_defaults(func=cmd_maintenance)
+
+    archive_history = commands.add_parser(
+        "archive-history", parents=[db_option],
+        help="Sposta prelievi chiusi e log vecchi nell'archivio storico (warehouse_archive.db)",
+    )
+    archive_history.add_argument("--months", type=int, default=tiering.DEFAULT_MONTHS,
+                                 help=f"Età minima in mesi (predefinito: {tiering.DEFAULT_MONTHS})")
+    archive_history.set_defaults(func=cmd_archive_history)
+
+    forecast = commands.add_parser("forecast", parents=[db_option], help="Previsione di esaurimento e di scadenza dei consumabili")
+    # No default here: importing warehouse.analytics (NumPy) would slow down every command
+    forecast.add_argument("--days", type=int, help="Giorni di consumo su cui calcolare la media (predefinito: 90)")
+    forecast.set_defaults(func=cmd_forecast)
+
+    from warehouse.controllers_usage import GROUPINGS, PERIODS
+    usage = commands.add_parser("usage", parents=[db_option], help="Consumi per materiale, utente o luogo di lavoro (dal riepilogo giornaliero)")
+    usage.add_argument("--by", choices=GROUPINGS, default="material")
+    usage.add_argument("--period", choices=list(PERIODS), default="month")
+    usage.add_argument("--from", dest="date_from", type=_parse_date, help="Dalla data (inclusa)")
+    usage.add_argument("--to", dest="date_to", type=_parse_date, help="Alla data (inclusa)")
+    usage.add_argument("--csv", action="store_true", help="Scrive CSV su stdout")
+    usage.add_argument("--rebuild", action="store_true", help="Ricostruisce il riepilogo dai prelievi")
+    usage.set_defaults(func=cmd_usage)
+
+    benchmark = commands.add_parser("benchmark", help="Benchmark dei controller (opzioni di python -m warehouse.benchmarks)")
+    benchmark.add_argument("benchmark_args", nargs=argparse.REMAINDER)
+    benchmark.set_defaults(func=cmd_benchmark)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    args.db = os.path.abspath(args.db)
+    try:
+        return args.func(args)
+    except (ValueError, OSError, SQLAlchemyError) as e:
+        print(f"Errore: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
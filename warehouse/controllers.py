@@ -1,18 +1,35 @@
-from sqlmodel import select, col, func
+from datetime import datetime
+from sqlmodel import select, col, func, update, delete
 from warehouse.database import get_session
-from warehouse.models import User, Withdrawal, Material, Batch, MaterialType, EventType
+from warehouse.models import (
+    User, Withdrawal, Material, Batch, MaterialType, EventType, UserIdCounter, UsageDaily, split_custom_id
+)
 from warehouse.controllers_log import create_log_entry
-from rapidfuzz import process, fuzz, utils
+from warehouse.controllers_usage import record_withdrawal, record_return
+from warehouse import tiering
 
 async def get_all_users():
+    """Active (not archived) users, by surname and name."""
     async with get_session() as session:
-        result = await session.execute(select(User))
+        statement = (
+            select(User)
+            .where(col(User.archived_at).is_(None))
+            .order_by(User.last_name, User.first_name)
+        )
+        result = await session.execute(statement)
+        return list(result.scalars().all())
+
+async def get_archived_users():
+    async with get_session() as session:
+        statement = select(User).where(col(User.archived_at).is_not(None)).order_by(col(User.archived_at).desc())
+        result = await session.execute(statement)
         return list(result.scalars().all())
 
 async def get_user_withdrawals(user_id: int):
     async with get_session() as session:
-        # Join with Material to get denomination
-        statement = select(Withdrawal, Material).join(Material).where(Withdrawal.user_id == user_id).order_by(col(Withdrawal.withdrawal_date).desc())
+        # Join with Material to get denomination; archived withdrawals included
+        W = tiering.history(Withdrawal)
+        statement = select(W, Material).join(Material, W.material_id == Material.id).where(W.user_id == user_id).order_by(W.withdrawal_date.desc())
         result = await session.execute(statement)
         # Returns list of (Withdrawal, Material) tuples
         return result.all()
@@ -21,6 +38,9 @@ def filter_users(query: str, users: list[User]) -> list[User]:
     if not query:
         return users
     
+    # Imported on first search: keeps rapidfuzz off the startup path
+    from rapidfuzz import process, fuzz, utils
+    
     choices = [
         f"{user.first_name or ''} {user.last_name or ''} {user.custom_id or ''} {user.title or ''} {user.workplace or ''} {user.code or ''} {user.notes or ''} {user.email or ''} {user.mobile or ''}"
         for user in users
@@ -31,22 +51,40 @@ def filter_users(query: str, users: list[User]) -> list[User]:
     # results is list of (match_string, score, index) when choices is list
     return [users[index] for match, score, index in results if score > 50]
 
+async def allocate_custom_ids(session, prefix: str, count: int = 1) -> int:
+    """
+    Reserves count consecutive custom_id numbers for prefix and returns the first.
+    Runs inside the caller's transaction: the UPDATE takes SQLite's write lock,
+    so two instances sharing the DB can never receive the same numbers, and a
+    rollback gives the numbers back.
+    """
+    result = await session.execute(
+        update(UserIdCounter)
+        .where(UserIdCounter.prefix == prefix)
+        .values(last_number=UserIdCounter.last_number + count)
+    )
+    if result.rowcount:
+        last = await session.scalar(select(UserIdCounter.last_number).where(UserIdCounter.prefix == prefix))
+        return last - count + 1
+
+    # First user with this prefix since the counters were synced: start after
+    # any matching custom_id already present (DBs written by other tools)
+    existing = await session.execute(select(User.custom_id).where(col(User.custom_id).startswith(prefix)))
+    highest = 0
+    for (custom_id,) in existing:
+        parts = split_custom_id(custom_id)
+        if parts and parts[0] == prefix:
+            highest = max(highest, parts[1])
+    session.add(UserIdCounter(prefix=prefix, last_number=highest + count))
+    await session.flush()
+    return highest + 1
+
+
 async def create_user(first_name: str, last_name: str, **kwargs):
     prefix = (first_name[0] + last_name[0]).upper()
     
     async with get_session() as session:
-        # Find all users whose custom_id starts with prefix
-        # We need to escape % and _ in prefix if they were allowed, but here only letters
-        statement = select(User).where(col(User.custom_id).startswith(prefix))
-        result = await session.execute(statement)
-        existing = result.scalars().all()
-        
-        count = 1
-        new_id = f"{prefix}{count}"
-        existing_ids = {u.custom_id for u in existing}
-        while new_id in existing_ids:
-            count += 1
-            new_id = f"{prefix}{count}"
+        new_id = f"{prefix}{await allocate_custom_ids(session, prefix)}"
             
         if "code" not in kwargs or kwargs["code"] is None:
             kwargs["code"] = new_id
@@ -78,28 +116,58 @@ async def update_user(user_id: int, **kwargs) -> User:
 
 
 async def get_user_dependencies(user_id: int) -> int:
-    """Returns the number of withdrawals associated with the user."""
+    """Returns the number of withdrawals associated with the user, archived ones included."""
     async with get_session() as session:
-        statement = select(Withdrawal).where(Withdrawal.user_id == user_id)
-        result = await session.execute(statement)
-        return len(result.scalars().all())
+        W = tiering.history(Withdrawal)
+        statement = select(func.count()).select_from(W).where(W.user_id == user_id)
+        return await session.scalar(statement)
 
 
-async def delete_user(user_id: int):
-    """Deletes a user and their associated withdrawals."""
+async def archive_user(user_id: int):
+    """
+    Hides a user from the active lists, keeping their withdrawals as history.
+    A single-row UPDATE; restore_user() brings the user back.
+    """
     async with get_session() as session:
         user = await session.get(User, user_id)
-        if not user:
+        if user is None or user.archived_at is not None:
             raise ValueError("User not found")
+        user.archived_at = datetime.now()
+        await session.commit()
         
-        # Delete withdrawals first
-        statement = select(Withdrawal).where(Withdrawal.user_id == user_id)
-        result = await session.execute(statement)
-        withdrawals = result.scalars().all()
-        for w in withdrawals:
-            await session.delete(w)
-            
-        await session.delete(user)
+    await create_log_entry(
+        event_type=EventType.USER_ARCHIVED,
+        description=f"Archiviato utente: {user.first_name} {user.last_name} ({user.custom_id})"
+    )
+
+
+async def restore_user(user_id: int):
+    async with get_session() as session:
+        user = await session.get(User, user_id)
+        if user is None or user.archived_at is None:
+            raise ValueError("User not found")
+        user.archived_at = None
+        await session.commit()
+        
+    await create_log_entry(
+        event_type=EventType.USER_RESTORED,
+        description=f"Ripristinato utente: {user.first_name} {user.last_name} ({user.custom_id})"
+    )
+
+
+async def delete_user(user_id: int):
+    """Permanently deletes a user and their associated withdrawals in one transaction."""
+    async with get_session() as session:
+        if await session.get(User, user_id) is None:
+            raise ValueError("User not found")
+        
+        # Set-based: one DELETE per table, however many withdrawals there are
+        await session.execute(delete(Withdrawal).where(Withdrawal.user_id == user_id))
+        await session.execute(delete(UsageDaily).where(UsageDaily.user_id == user_id))
+        if tiering.is_active():
+            archived = tiering.archive_table(Withdrawal)
+            await session.execute(delete(archived).where(archived.c.user_id == user_id))
+        await session.execute(delete(User).where(User.id == user_id))
         await session.commit()
 
 
@@ -120,6 +188,11 @@ async def create_withdrawal(
         material = await session.get(Material, material_id)
         if not material:
             raise ValueError("Material not found")
+        if material.archived_at is not None:
+            raise ValueError(f"Il materiale '{material.denomination}' è archiviato.")
+        user = await session.get(User, user_id)
+        if user is not None and user.archived_at is not None:
+            raise ValueError(f"L'utente {user.first_name} {user.last_name} è archiviato.")
 
         if material.material_type == MaterialType.ITEM:
             # New logic for Equipment/Items:
@@ -180,6 +253,7 @@ async def create_withdrawal(
             efficient_at_return=efficient_at_return,
         )
         session.add(withdrawal)
+        await record_withdrawal(session, withdrawal, user.workplace if user else None)
         await session.commit()
         await session.refresh(withdrawal)
         
@@ -196,9 +270,15 @@ async def create_withdrawal(
 
 async def get_all_withdrawals():
     async with get_session() as session:
-        statement = select(Withdrawal, User, Material).join(User).join(Material).order_by(col(Withdrawal.withdrawal_date).desc())
+        W = tiering.history(Withdrawal)
+        statement = (
+            select(W, User, Material)
+            .join(User, W.user_id == User.id)
+            .join(Material, W.material_id == Material.id)
+            .order_by(W.withdrawal_date.desc())
+        )
         result = await session.execute(statement)
-        # Returns list of (Withdrawal, User, Material) tuples
+        # Returns list of (Withdrawal, User, Material) tuples, archived withdrawals included
         return result.all()
 
 
@@ -209,6 +289,8 @@ async def return_withdrawal_item(withdrawal_id: int, efficient: bool) -> Withdra
         if not withdrawal:
             raise ValueError("Withdrawal not found")
         
+        if withdrawal.return_date is None:
+            await record_return(session, withdrawal)
         withdrawal.return_date = datetime.now()
         withdrawal.efficient_at_return = efficient
         session.add(withdrawal)
@@ -0,0 +1,170 @@
+"""
+Dashboard snapshot: every panel of the dashboard tab from one session.
+
+The stock per material and the open loans per material are CTEs shared by the
+three panel statements, so the dashboard costs one connection checkout and
+three statements instead of five sessions. Every panel has a total order, so
+the dashboard can diff consecutive snapshots row by row. Rows come back as small frozen
+dataclasses rather than ORM objects: the widgets only need a handful of
+columns, and nothing here is meant to be modified and flushed back.
+
+The last snapshot is kept in memory and reused until the next commit on the
+engine (database.write_activity), a change of DB file, a change of day
+(expiry thresholds are relative to today) or SNAPSHOT_TTL seconds, after
+which writes made by other instances sharing the DB file show up too.
+Restoring a backup or resetting the DB both commit through the engine, so
+they invalidate it as well.
+"""
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from sqlalchemy import literal
+from sqlmodel import select, func
+from warehouse import database
+from warehouse.database import get_session
+from warehouse.instrumentation import instrumentation
+from warehouse.models import Material, MaterialType, Batch, Withdrawal, User
+from warehouse.controllers_material import ACTIVE
+
+CACHE_NAME = "Snapshot dashboard"
+
+EXPIRING_LIMIT = 50
+EXPIRING_DAYS = 30
+
+# Seconds a snapshot is reused when nothing was committed locally
+SNAPSHOT_TTL = 60
+
+
+@dataclass(frozen=True)
+class LowStockEntry:
+    material_id: int
+    denomination: str
+    image_path: str | None
+    min_stock: int
+    stock: int
+
+
+@dataclass(frozen=True)
+class ExpiringBatchEntry:
+    batch_id: int
+    material_id: int
+    denomination: str
+    image_path: str | None
+    expiration: date
+    amount: int
+    location: str | None
+    available: int
+
+
+@dataclass(frozen=True)
+class InefficientEntry:
+    material_id: int
+    denomination: str
+    image_path: str | None
+    part_number: str | None
+    serial_number: str | None
+    # "Nome Cognome" of the users holding the item (sorted), empty when it is in stock
+    borrowers: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    low_stock: list[LowStockEntry] = field(default_factory=list)
+    expiring: list[ExpiringBatchEntry] = field(default_factory=list)
+    inefficient: list[InefficientEntry] = field(default_factory=list)
+    loaded_at: datetime = field(default_factory=datetime.now)
+
+
+# Joins borrower names in SQL; a control character cannot appear in a name
+_NAME_SEPARATOR = "\x1f"
+
+# (cache key, time.monotonic() of the load, snapshot) of the last computed snapshot
+_cached: tuple[tuple, float, DashboardSnapshot] | None = None
+
+
+def _cache_key() -> tuple:
+    return database.db_path, database.write_activity.count, date.today()
+
+
+async def get_dashboard_snapshot(max_age: float = SNAPSHOT_TTL) -> DashboardSnapshot:
+    """
+    All dashboard panels, served from memory when nothing was committed since
+    the last call and the cached snapshot is younger than max_age seconds.
+    """
+    global _cached
+    stats = instrumentation.cache(CACHE_NAME)
+    key = _cache_key()
+    if _cached is not None and _cached[0] == key and time.monotonic() - _cached[1] < max_age:
+        stats.hits += 1
+        return _cached[2]
+    stats.misses += 1
+
+    started = time.monotonic()
+    snapshot = await _load_snapshot()
+    # Key and age taken before loading: a commit during the load makes the next call reload
+    _cached = (key, started, snapshot)
+    return snapshot
+
+
+def invalidate_dashboard_snapshot():
+    """Drops the cached snapshot, so the next call reloads it from the DB."""
+    global _cached
+    _cached = None
+
+
+async def _load_snapshot() -> DashboardSnapshot:
+    limit_date = date.today() + timedelta(days=EXPIRING_DAYS)
+
+    stock = (
+        select(Batch.material_id, func.sum(Batch.amount).label("total"))
+        .group_by(Batch.material_id)
+        .cte("stock")
+    )
+    borrowers = (
+        select(
+            Withdrawal.material_id,
+            func.group_concat(User.first_name + literal(" ") + User.last_name, _NAME_SEPARATOR).label("names"),
+        )
+        .join(User, Withdrawal.user_id == User.id)
+        .where(Withdrawal.return_date == None)
+        .group_by(Withdrawal.material_id)
+        .cte("borrowers")
+    )
+    current_stock = func.coalesce(stock.c.total, 0)
+
+    low_stock_stmt = (
+        select(Material.id, Material.denomination, Material.image_path, Material.min_stock, current_stock)
+        .outerjoin(stock, Material.id == stock.c.material_id)
+        .where(ACTIVE, Material.min_stock > 0, current_stock <= Material.min_stock)
+        .order_by(Material.denomination, Material.id)
+    )
+    expiring_stmt = (
+        select(
+            Batch.id, Material.id, Material.denomination, Material.image_path,
+            Batch.expiration, Batch.amount, Batch.location, current_stock,
+        )
+        .join(Material, Batch.material_id == Material.id)
+        .outerjoin(stock, Material.id == stock.c.material_id)
+        .where(Batch.amount > 0, Batch.expiration <= limit_date)
+        .where(Material.material_type == MaterialType.CONSUMABLE, ACTIVE)
+        .order_by(Batch.expiration, Batch.id)
+        .limit(EXPIRING_LIMIT)
+    )
+    inefficient_stmt = (
+        select(
+            Material.id, Material.denomination, Material.image_path,
+            Material.part_number, Material.serial_number, borrowers.c.names,
+        )
+        .outerjoin(borrowers, Material.id == borrowers.c.material_id)
+        .where(Material.material_type == MaterialType.ITEM, Material.is_efficient == False, ACTIVE)
+        .order_by(Material.denomination, Material.id)
+    )
+
+    async with get_session() as session:
+        low_stock = [LowStockEntry(*row) for row in await session.execute(low_stock_stmt)]
+        expiring = [ExpiringBatchEntry(*row) for row in await session.execute(expiring_stmt)]
+        inefficient = [
+            InefficientEntry(*row[:5], borrowers=tuple(sorted(row[5].split(_NAME_SEPARATOR))) if row[5] else ())
+            for row in await session.execute(inefficient_stmt)
+        ]
+    return DashboardSnapshot(low_stock=low_stock, expiring=expiring, inefficient=inefficient)
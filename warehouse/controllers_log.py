@@ -1,8 +1,9 @@
 from typing import Optional, List
 from datetime import datetime
-from sqlmodel import select, col
+from sqlmodel import select
 from warehouse.database import get_session
 from warehouse.models import EventLog, EventType
+from warehouse import tiering
 
 async def create_log_entry(
     event_type: EventType,
@@ -22,6 +23,8 @@ async def create_log_entry(
 
 async def get_logs(limit: int = 100, offset: int = 0) -> List[EventLog]:
     async with get_session() as session:
-        statement = select(EventLog).order_by(col(EventLog.timestamp).desc()).offset(offset).limit(limit)
+        # Archived entries included
+        Log = tiering.history(EventLog)
+        statement = select(Log).order_by(Log.timestamp.desc()).offset(offset).limit(limit)
         result = await session.execute(statement)
         return result.scalars().all()
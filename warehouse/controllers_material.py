@@ -1,12 +1,16 @@
-from sqlmodel import select, col, func
-from datetime import date, timedelta
+from sqlmodel import select, col, func, delete
+from datetime import date, datetime, timedelta
 from warehouse.database import get_session
-from warehouse.models import Material, MaterialType, Batch, Withdrawal, User, EventType
+from warehouse.models import Material, MaterialType, Batch, Withdrawal, User, EventType, UsageDaily
 from warehouse.controllers_log import create_log_entry
+from warehouse import tiering
+
+ACTIVE = col(Material.archived_at).is_(None)
 
 async def get_materials(material_type: MaterialType):
+    """Active (not archived) materials of the given type."""
     async with get_session() as session:
-        statement = select(Material).where(Material.material_type == material_type)
+        statement = select(Material).where(Material.material_type == material_type, ACTIVE)
         result = await session.execute(statement)
         return list(result.scalars().all())
 
@@ -17,6 +21,7 @@ async def get_material_stocks() -> dict[int, int]:
             select(Batch.material_id, func.sum(Batch.amount))
             .join(Material)
             # Removed filter: .where(Material.material_type == MaterialType.CONSUMABLE)
+            .where(ACTIVE)
             .group_by(Batch.material_id)
         )
         result = await session.execute(statement)
@@ -34,8 +39,9 @@ async def get_material_batches(material_id: int):
 
 async def get_material_withdrawals(material_id: int):
     async with get_session() as session:
-        # Join with User to get names
-        statement = select(Withdrawal, User).join(User).where(Withdrawal.material_id == material_id).order_by(col(Withdrawal.withdrawal_date).desc())
+        # Join with User to get names; archived withdrawals included
+        W = tiering.history(Withdrawal)
+        statement = select(W, User).join(User, W.user_id == User.id).where(W.material_id == material_id).order_by(W.withdrawal_date.desc())
         result = await session.execute(statement)
         return result.all()
 
@@ -110,7 +116,7 @@ async def get_expiring_batches(limit: int = 50, days_threshold: int = 30):
             select(Batch, Material)
             .join(Material)
             .where(Batch.amount > 0)
-            .where(Material.material_type == MaterialType.CONSUMABLE)
+            .where(Material.material_type == MaterialType.CONSUMABLE, ACTIVE)
             .where(Batch.expiration <= limit_date)
             .order_by(Batch.expiration)
             .limit(limit)
@@ -126,7 +132,8 @@ async def get_inefficient_materials():
     async with get_session() as session:
         statement = select(Material).where(
             Material.material_type == MaterialType.ITEM,
-            Material.is_efficient == False
+            Material.is_efficient == False,
+            ACTIVE
         )
         result = await session.execute(statement)
         return result.scalars().all()
@@ -152,6 +159,7 @@ async def get_low_stock_materials():
             .outerjoin(stock_subquery, Material.id == stock_subquery.c.material_id)
             .where(
                 # Removed filter: Material.material_type == MaterialType.CONSUMABLE,
+                ACTIVE,
                 Material.min_stock > 0,
                 func.coalesce(stock_subquery.c.total_stock, 0) <= Material.min_stock
             )
@@ -161,6 +169,28 @@ async def get_low_stock_materials():
         return results.all()
 
 
+async def get_stock_report(material_type: MaterialType | None = None):
+    """
+    Returns (Material, current_stock) for every material ordered by denomination,
+    with the stock computed in the same query (0 when there are no batches).
+    """
+    async with get_session() as session:
+        stock_subquery = (
+            select(Batch.material_id, func.sum(Batch.amount).label("total_stock"))
+            .group_by(Batch.material_id)
+            .subquery()
+        )
+        stmt = (
+            select(Material, func.coalesce(stock_subquery.c.total_stock, 0).label("stock"))
+            .outerjoin(stock_subquery, Material.id == stock_subquery.c.material_id)
+            .where(ACTIVE)
+            .order_by(Material.denomination)
+        )
+        if material_type is not None:
+            stmt = stmt.where(Material.material_type == material_type)
+        results = await session.execute(stmt)
+        return results.all()
+
 async def create_batch(
     material_id: int,
     expiration: "date",
@@ -227,48 +257,77 @@ async def update_material(material_id: int, **kwargs) -> Material:
 
 
 async def get_material_dependencies(material_id: int) -> tuple[int, int]:
-    """Returns a tuple (batch_count, withdrawal_count) associated with the material."""
+    """
+    Returns a tuple (batch_count, withdrawal_count) associated with the material, in one query.
+    Archived withdrawals are counted too.
+    """
     async with get_session() as session:
-        # Count batches
-        batch_stmt = select(Batch).where(Batch.material_id == material_id)
-        batch_res = await session.execute(batch_stmt)
-        batch_count = len(batch_res.scalars().all())
-        
-        # Count withdrawals
-        withdrawal_stmt = select(Withdrawal).where(Withdrawal.material_id == material_id)
-        withdrawal_res = await session.execute(withdrawal_stmt)
-        withdrawal_count = len(withdrawal_res.scalars().all())
-        
+        W = tiering.history(Withdrawal)
+        statement = select(
+            select(func.count()).select_from(Batch).where(Batch.material_id == material_id).scalar_subquery(),
+            select(func.count()).select_from(W).where(W.material_id == material_id).scalar_subquery(),
+        )
+        batch_count, withdrawal_count = (await session.execute(statement)).one()
         return batch_count, withdrawal_count
 
 
-async def delete_material(material_id: int):
-    """Deletes a material and its associated batches and withdrawals."""
+async def get_archived_materials():
+    async with get_session() as session:
+        statement = select(Material).where(col(Material.archived_at).is_not(None)).order_by(col(Material.archived_at).desc())
+        result = await session.execute(statement)
+        return list(result.scalars().all())
+
+
+async def archive_material(material_id: int):
+    """
+    Hides a material from the active lists and stock reports, keeping its
+    batches and withdrawals as history. A single-row UPDATE.
+    """
     async with get_session() as session:
         material = await session.get(Material, material_id)
-        if not material:
+        if material is None or material.archived_at is not None:
             raise ValueError("Material not found")
+        material.archived_at = datetime.now()
+        await session.commit()
         
-        # Delete withdrawals
-        w_stmt = select(Withdrawal).where(Withdrawal.material_id == material_id)
-        w_res = await session.execute(w_stmt)
-        for w in w_res.scalars().all():
-            await session.delete(w)
-            
-        # Delete batches
-        b_stmt = select(Batch).where(Batch.material_id == material_id)
-        b_res = await session.execute(b_stmt)
-        for b in b_res.scalars().all():
-            await session.delete(b)
-            
-        # Log event (must be done before delete or capture name before)
-        mat_name = material.denomination
+    await create_log_entry(
+        event_type=EventType.MATERIAL_ARCHIVED,
+        description=f"Archiviato materiale: {material.denomination}"
+    )
+
+
+async def restore_material(material_id: int):
+    async with get_session() as session:
+        material = await session.get(Material, material_id)
+        if material is None or material.archived_at is None:
+            raise ValueError("Material not found")
+        material.archived_at = None
+        await session.commit()
         
-        await session.delete(material)
+    await create_log_entry(
+        event_type=EventType.MATERIAL_RESTORED,
+        description=f"Ripristinato materiale: {material.denomination}"
+    )
+
+
+async def delete_material(material_id: int):
+    """Permanently deletes a material and its associated batches and withdrawals in one transaction."""
+    async with get_session() as session:
+        mat_name = await session.scalar(select(Material.denomination).where(Material.id == material_id))
+        if mat_name is None:
+            raise ValueError("Material not found")
+        
+        # Set-based: one DELETE per table instead of loading every row
+        await session.execute(delete(Withdrawal).where(Withdrawal.material_id == material_id))
+        if tiering.is_active():
+            archived = tiering.archive_table(Withdrawal)
+            await session.execute(delete(archived).where(archived.c.material_id == material_id))
+        await session.execute(delete(UsageDaily).where(UsageDaily.material_id == material_id))
+        await session.execute(delete(Batch).where(Batch.material_id == material_id))
+        await session.execute(delete(Material).where(Material.id == material_id))
         await session.commit()
         
         await create_log_entry(
             event_type=EventType.MATERIAL_DELETED,
             description=f"Eliminato materiale: {mat_name}"
         )
-
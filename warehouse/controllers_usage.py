@@ -0,0 +1,162 @@
+"""
+Daily usage rollup and the usage reports built on it.
+
+Every withdrawal is also added to its UsageDaily row (day, material, user) in
+the same transaction that creates it, and every return bumps the row's
+returned counter, so reports per material, user or workplace over months or
+years read a few thousand rollup rows instead of the whole withdrawal history
+joined with the users.
+
+The rollup can always be rebuilt from history(Withdrawal) with one
+INSERT ... SELECT (rebuild_usage_rollup, "python -m warehouse.cli usage
+--rebuild"); init_db does so when it upgrades a DB from before the rollup existed. A rebuild
+attributes every withdrawal to the user's current workplace, while the
+incremental path keeps the workplace the user had at the time.
+"""
+from dataclasses import dataclass
+from datetime import date
+from sqlalchemy import delete, update, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import select
+from warehouse import database, tiering
+from warehouse.database import get_session
+from warehouse.models import UsageDaily, Withdrawal, User, Material
+
+GROUPINGS = ("material", "user", "workplace")
+
+# Report period -> strftime() format of its label
+PERIODS = {
+    "day": "%Y-%m-%d",
+    "month": "%Y-%m",
+    "year": "%Y",
+}
+
+
+@dataclass(frozen=True)
+class UsageRow:
+    period: str
+    # Material or user id, or the workplace name
+    key: int | str | None
+    label: str
+    amount: int
+    count: int
+
+
+async def record_withdrawal(session, withdrawal: Withdrawal, workplace: str | None):
+    """Adds withdrawal to its rollup row; runs inside the caller's transaction."""
+    statement = insert(UsageDaily).values(
+        day=withdrawal.withdrawal_date.date(),
+        material_id=withdrawal.material_id,
+        user_id=withdrawal.user_id,
+        workplace=workplace,
+        amount=withdrawal.amount,
+        count=1,
+        returned=int(withdrawal.return_date is not None),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["day", "material_id", "user_id"],
+        set_={
+            "amount": UsageDaily.amount + statement.excluded.amount,
+            "count": UsageDaily.count + 1,
+            "returned": UsageDaily.returned + statement.excluded.returned,
+        },
+    )
+    await session.execute(statement)
+
+
+async def record_return(session, withdrawal: Withdrawal):
+    """Counts the return of withdrawal in its rollup row; runs inside the caller's transaction."""
+    await session.execute(
+        update(UsageDaily)
+        .where(
+            UsageDaily.day == withdrawal.withdrawal_date.date(),
+            UsageDaily.material_id == withdrawal.material_id,
+            UsageDaily.user_id == withdrawal.user_id,
+        )
+        .values(returned=UsageDaily.returned + 1)
+    )
+
+
+def usage_rollup_statements(model=Withdrawal) -> list:
+    """
+    DELETE + INSERT ... SELECT rebuilding the rollup from model (Withdrawal or
+    tiering.history(Withdrawal)). Shared with warehouse.datagen, which runs
+    them on a plain synchronous connection.
+    """
+    day = func.date(model.withdrawal_date)
+    rows = (
+        select(
+            day, model.material_id, model.user_id, func.max(User.workplace),
+            func.sum(model.amount), func.count(), func.count(model.return_date),
+        )
+        .join(User, model.user_id == User.id)
+        .group_by(day, model.material_id, model.user_id)
+    )
+    columns = ["day", "material_id", "user_id", "workplace", "amount", "count", "returned"]
+    return [delete(UsageDaily), insert(UsageDaily).from_select(columns, rows)]
+
+
+async def rebuild_usage_rollup(conn=None):
+    """Recomputes the whole rollup, on conn or in a transaction of its own."""
+    if conn is None:
+        async with database.engine.begin() as conn:
+            await rebuild_usage_rollup(conn)
+        await database.sync_working_copy()
+        return
+    for statement in usage_rollup_statements(tiering.history(Withdrawal)):
+        await conn.execute(statement)
+
+
+async def get_usage_report(
+    by: str = "material",
+    period: str = "month",
+    date_from: date | None = None,
+    date_to: date | None = None,
+) -> list[UsageRow]:
+    """
+    Units withdrawn and number of withdrawals per period and per material,
+    user or workplace, from the rollup. Rows are ordered by period, then by
+    amount (highest first).
+    """
+    if by not in GROUPINGS:
+        raise ValueError(f"Raggruppamento non valido: {by} (usare {', '.join(GROUPINGS)})")
+    if period not in PERIODS:
+        raise ValueError(f"Periodo non valido: {period} (usare {', '.join(PERIODS)})")
+
+    period_label = func.strftime(PERIODS[period], UsageDaily.day).label("period")
+    amount = func.sum(UsageDaily.amount).label("amount")
+    count = func.sum(UsageDaily.count)
+
+    if by == "material":
+        statement = (
+            select(period_label, UsageDaily.material_id, Material.denomination, amount, count)
+            .join(Material, UsageDaily.material_id == Material.id)
+            .group_by(period_label, UsageDaily.material_id)
+        )
+    elif by == "user":
+        statement = (
+            select(
+                period_label, UsageDaily.user_id,
+                User.first_name + " " + User.last_name + " (" + User.custom_id + ")", amount, count,
+            )
+            .join(User, UsageDaily.user_id == User.id)
+            .group_by(period_label, UsageDaily.user_id)
+        )
+    else:
+        statement = (
+            select(period_label, UsageDaily.workplace, UsageDaily.workplace, amount, count)
+            .group_by(period_label, UsageDaily.workplace)
+        )
+
+    if date_from is not None:
+        statement = statement.where(UsageDaily.day >= date_from)
+    if date_to is not None:
+        statement = statement.where(UsageDaily.day <= date_to)
+    statement = statement.order_by(period_label, amount.desc())
+
+    async with get_session() as session:
+        result = await session.execute(statement)
+        return [
+            UsageRow(row[0], row[1], row[2] or "(nessuno)", int(row[3]), int(row[4]))
+            for row in result
+        ]
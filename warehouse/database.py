@@ -1,9 +1,11 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
+from sqlalchemy import text, event
 from sqlmodel import SQLModel
 from contextlib import asynccontextmanager
+import asyncio
 import os
+import time
 from warehouse.utils import get_base_path
 
 # Using a relative path for the database so it works on USB
@@ -11,10 +13,113 @@ from warehouse.utils import get_base_path
 db_path = os.path.join(get_base_path(), "warehouse.db")
 DATABASE_URL = f"sqlite+aiosqlite:///{db_path}"
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+# Stored in PRAGMA user_version; bump it whenever init_db gains a migration
+# that older builds of the app would not understand.
+SCHEMA_VERSION = 4
+
+# Callables applied to every engine this module creates (event listeners etc.),
+# so they survive set_database_path()
+_engine_hooks = []
+
+# Set by enable_working_copy() when the DB is served from a local copy
+working_copy = None
+
+
+def _create_engine(url):
+    new_engine = create_async_engine(url, echo=False, future=True)
+    for hook in _engine_hooks:
+        hook(new_engine)
+    return new_engine
+
+
+def register_engine_hook(hook):
+    """Applies hook(engine) to the current engine and to any engine created later."""
+    _engine_hooks.append(hook)
+    hook(engine)
+
+
+engine = _create_engine(DATABASE_URL)
+
+
+async def set_database_path(path: str):
+    """
+    Points the module-level engine at another SQLite file.
+    Modules must access the engine as `database.engine` to see the change.
+    """
+    global db_path, DATABASE_URL, engine
+    await engine.dispose()
+    db_path = path
+    DATABASE_URL = f"sqlite+aiosqlite:///{db_path}"
+    engine = _create_engine(DATABASE_URL)
+
+
+async def enable_working_copy(sync_interval: float = 120):
+    """
+    Serves the DB from a local copy of the portable one (see warehouse.working_copy).
+    Must be called before init_db().
+    """
+    global working_copy
+    from warehouse.working_copy import WorkingCopy
+
+    copy = WorkingCopy(db_path, sync_interval=sync_interval)
+    local_path = await asyncio.to_thread(copy.open)
+    await set_database_path(local_path)
+    working_copy = copy
+    working_copy.start()
+
+
+async def sync_working_copy():
+    """Writes the local copy back to the portable DB. No-op without a working copy."""
+    if working_copy is not None:
+        await working_copy.sync_now()
+
+
+class WriteActivity:
+    """
+    Counts committed transactions on the engine.
+    Read-only sessions never commit, so this is a cheap proxy for write operations
+    used by the background schedulers (backups, maintenance) and, through
+    add_listener(), by views that follow the data (dashboard).
+    """
+    def __init__(self):
+        self.count = 0
+        self.last_write = None  # time.monotonic() of the last commit
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """callback() runs after every commit; it must only schedule work, not query."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def record(self):
+        self.count += 1
+        self.last_write = time.monotonic()
+        for callback in list(self._listeners):
+            try:
+                callback()
+            except Exception as e:
+                # Never let a listener fail the commit
+                print(f"Errore nel listener delle scritture: {e}")
+
+
+write_activity = WriteActivity()
+
+def _track_commits(target_engine):
+    @event.listens_for(target_engine.sync_engine, "commit")
+    def _on_commit(conn):
+        write_activity.record()
+
+register_engine_hook(_track_commits)
 
 async def init_db():
+    # Registers the engine hook attaching the history archive, if there is one
+    from warehouse import tiering
+
     async with engine.begin() as conn:
+        previous_version = (await conn.execute(text("PRAGMA user_version"))).scalar()
         await conn.run_sync(SQLModel.metadata.create_all)
         
         # Simple migration for is_efficient column
@@ -31,6 +136,63 @@ async def init_db():
             # Column likely exists
             pass
 
+        # Soft delete (schema 3): older builds would show archived rows as active
+        for table in ("user", "material"):
+            try:
+                await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN archived_at DATETIME"))
+            except Exception:
+                # Column likely exists
+                pass
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_user_active ON user (last_name, first_name) WHERE archived_at IS NULL"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_material_active ON material (material_type, denomination) WHERE archived_at IS NULL"
+        ))
+
+        # Foreign key indexes, declared in models.py but missing from older
+        # DBs: dependency counts and cascading deletes look rows up by parent id
+        for table, column in (("withdrawal", "user_id"), ("withdrawal", "material_id"), ("batch", "material_id")):
+            await conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"))
+
+        await _sync_user_id_counters(conn)
+
+        if tiering.is_active():
+            await tiering.sync_archive_schema(conn)
+
+        # Daily usage rollup (schema 4): filled from the existing history once;
+        # older builds would add withdrawals without updating it
+        if previous_version < 4:
+            from warehouse.controllers_usage import rebuild_usage_rollup
+            await rebuild_usage_rollup(conn)
+
+        await conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+
+
+async def _sync_user_id_counters(conn):
+    """
+    Raises each useridcounter row to the highest custom_id number in use.
+    Fills the table on the first start after the upgrade (schema 2) and catches
+    up with users added by older builds sharing the same DB; cheap enough
+    (one pass over user.custom_id) to run at every start.
+    """
+    from warehouse.models import split_custom_id
+
+    highest = {}
+    result = await conn.execute(text("SELECT custom_id FROM user"))
+    for (custom_id,) in result:
+        parts = split_custom_id(custom_id)
+        if parts and parts[1] > highest.get(parts[0], 0):
+            highest[parts[0]] = parts[1]
+    if highest:
+        await conn.execute(
+            text(
+                "INSERT INTO useridcounter (prefix, last_number) VALUES (:prefix, :number) "
+                "ON CONFLICT(prefix) DO UPDATE SET last_number = max(last_number, excluded.last_number)"
+            ),
+            [{"prefix": prefix, "number": number} for prefix, number in highest.items()],
+        )
+
 @asynccontextmanager
 async def get_session():
     async_session = sessionmaker(
@@ -0,0 +1,254 @@
+"""
+Deterministic synthetic data for load testing and benchmarks.
+
+    python -m warehouse.datagen bench_large.db --preset large
+    python -m warehouse.datagen custom.db --users 1000 --withdrawals 50000 --seed 7
+
+Rows are built in memory in chunks and written with Core executemany inserts
+in a single transaction per table, on a fresh file with journaling disabled.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, insert, text
+from sqlmodel import SQLModel
+from warehouse.database import SCHEMA_VERSION
+from warehouse.models import User, Material, Batch, Withdrawal, EventLog, MaterialType, EventType
+from warehouse.controllers_usage import usage_rollup_statements
+
+PRESETS = {
+    "tiny": dict(users=100, materials=60, batches_per_material=2, withdrawals=2_000, years=1),
+    "small": dict(users=500, materials=200, batches_per_material=3, withdrawals=20_000, years=2),
+    "medium": dict(users=5_000, materials=2_000, batches_per_material=4, withdrawals=200_000, years=3),
+    "large": dict(users=50_000, materials=20_000, batches_per_material=5, withdrawals=2_000_000, years=5),
+}
+
+CHUNK_SIZE = 50_000
+
+FIRST_NAMES = [
+    "Mario", "Giulia", "Stefano", "Francesca", "Luca", "Chiara", "Marco", "Sara",
+    "Andrea", "Elena", "Paolo", "Anna", "Giovanni", "Laura", "Davide", "Marta",
+    "Alessandro", "Valentina", "Roberto", "Silvia", "Fabio", "Federica", "Matteo", "Alice",
+]
+LAST_NAMES = [
+    "Rossi", "Bianchi", "Verdi", "Russo", "Ferrari", "Esposito", "Romano", "Colombo",
+    "Ricci", "Marino", "Greco", "Bruno", "Gallo", "Conti", "De Luca", "Costa",
+    "Giordano", "Mancini", "Rizzo", "Lombardi", "Moretti", "Barbieri", "Fontana", "Santoro",
+]
+TITLES = [None, "Dr", "Infermiere", "Tecnico", "Ing", "OSS"]
+WORKPLACES = [
+    "Pronto Soccorso", "Reparto Chirurgia", "Magazzino", "Cardiologia", "Pediatria",
+    "Ortopedia", "Radiologia", "Laboratorio", "Sala Operatoria", "Ambulatorio",
+]
+CONSUMABLE_NAMES = [
+    "Mascherina chirurgica", "Guanti in nitrile", "Siringa monouso", "Garza sterile",
+    "Cerotto", "Ago cannula", "Soluzione fisiologica", "Benda elastica", "Camice monouso",
+    "Provetta", "Deflussore", "Elettrodo ECG",
+]
+ITEM_NAMES = [
+    "Defibrillatore portatile", "Pompa infusione", "Monitor multiparametrico", "Saturimetro",
+    "Sfigmomanometro", "Aspiratore", "Barella", "Carrozzina", "Ventilatore", "Termometro digitale",
+]
+LOCATIONS = [f"Magazzino {w} - Scaffale {n}" for w in "ABC" for n in range(1, 9)]
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert_all(conn, table, rows) -> int:
+    count = 0
+    for chunk in _chunks(rows):
+        conn.execute(insert(table), chunk)
+        count += len(chunk)
+    return count
+
+
+def _user_rows(rng: random.Random, count: int):
+    counters = {}
+    for _ in range(count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        prefix = (first[0] + last[0]).upper()
+        counters[prefix] = counters.get(prefix, 0) + 1
+        custom_id = f"{prefix}{counters[prefix]}"
+        yield {
+            "custom_id": custom_id,
+            "code": custom_id,
+            "title": rng.choice(TITLES),
+            "first_name": first,
+            "last_name": last,
+            "workplace": rng.choice(WORKPLACES),
+            "mobile": f"3{rng.randrange(10**8, 10**9)}",
+            "email": f"{first}.{last}.{custom_id}@example.com".lower().replace(" ", ""),
+            "notes": None,
+        }
+
+
+def _material_rows(rng: random.Random, count: int):
+    for i in range(1, count + 1):
+        is_item = rng.random() < 0.3
+        base = rng.choice(ITEM_NAMES if is_item else CONSUMABLE_NAMES)
+        yield {
+            "material_type": MaterialType.ITEM if is_item else MaterialType.CONSUMABLE,
+            "denomination": f"{base} {i}",
+            "ndc": f"NDC-{i:06d}",
+            "part_number": f"PN-{rng.randrange(10**6):06d}",
+            "serial_number": f"SN-{i:08d}" if is_item else None,
+            "code": f"CODE{i:06d}",
+            "image_path": None,
+            "min_stock": rng.choice((0, 0, 5, 10, 50)),
+            "is_efficient": not is_item or rng.random() > 0.05,
+        }
+
+
+def generate_database(
+    path: str,
+    users: int,
+    materials: int,
+    batches_per_material: int,
+    withdrawals: int,
+    years: int,
+    seed: int = 42,
+    events: int | None = None,
+    today: date | None = None,
+) -> dict:
+    """
+    Creates a new database at path filled with synthetic data.
+    The same arguments (including seed and today) always produce the same rows.
+    `events` defaults to one log entry per generated withdrawal.
+    Returns the number of rows written per table.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    rng = random.Random(seed)
+    today = today or date.today()
+    now = datetime.combine(today, datetime.min.time()) + timedelta(hours=18)
+    history_seconds = int(years * 365 * 86400)
+    events = withdrawals if events is None else events
+
+    engine = create_engine(f"sqlite:///{path}")
+    counts = {}
+    with engine.connect() as conn:
+        # Throwaway file: no journal needed while filling it
+        conn.exec_driver_sql("PRAGMA journal_mode = OFF")
+        conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        SQLModel.metadata.create_all(conn)
+        conn.commit()
+
+        counts["user"] = _insert_all(conn, User.__table__, _user_rows(rng, users))
+        counts["material"] = _insert_all(conn, Material.__table__, _material_rows(rng, materials))
+        conn.commit()
+
+        material_types = {
+            row[0]: row[1] for row in conn.execute(text("SELECT id, material_type FROM material"))
+        }
+        item_ids = [mid for mid, mtype in material_types.items() if mtype == MaterialType.ITEM.name]
+        material_ids = list(material_types)
+        user_ids = [row[0] for row in conn.execute(text("SELECT id FROM user"))]
+
+        def batch_rows():
+            for material_id in material_ids:
+                is_item = material_types[material_id] == MaterialType.ITEM.name
+                for _ in range(rng.randint(1, batches_per_material)):
+                    yield {
+                        "material_id": material_id,
+                        "expiration": date(9999, 12, 31) if is_item else today + timedelta(days=rng.randint(-60, 3 * 365)),
+                        "amount": rng.randint(1, 5) if is_item else rng.randint(0, 2000),
+                        "location": rng.choice(LOCATIONS),
+                    }
+
+        item_set = set(item_ids)
+        open_window = 14 * 86400
+
+        def withdrawal_rows():
+            for _ in range(withdrawals):
+                material_id = rng.choice(material_ids)
+                age = rng.randrange(history_seconds)
+                withdrawal_date = now - timedelta(seconds=age)
+                row = {
+                    "user_id": rng.choice(user_ids),
+                    "material_id": material_id,
+                    "amount": 1 if material_id in item_set else rng.randint(1, 20),
+                    "withdrawal_date": withdrawal_date,
+                    "notes": None,
+                    "return_date": None,
+                    "efficient_at_return": None,
+                }
+                if material_id in item_set:
+                    # Only recent equipment withdrawals may still be out
+                    if age > open_window or rng.random() < 0.7:
+                        row["return_date"] = withdrawal_date + timedelta(hours=rng.randint(1, 240))
+                        row["efficient_at_return"] = rng.random() > 0.05
+                yield row
+
+        def event_rows():
+            event_types = list(EventType)
+            for _ in range(events):
+                yield {
+                    "timestamp": now - timedelta(seconds=rng.randrange(history_seconds)),
+                    "event_type": rng.choice(event_types),
+                    "description": f"Evento generato {rng.randrange(10**6)}",
+                    "details": None,
+                }
+
+        counts["batch"] = _insert_all(conn, Batch.__table__, batch_rows())
+        conn.commit()
+        counts["withdrawal"] = _insert_all(conn, Withdrawal.__table__, withdrawal_rows())
+        conn.commit()
+        counts["eventlog"] = _insert_all(conn, EventLog.__table__, event_rows())
+        conn.commit()
+
+        for statement in usage_rollup_statements():
+            conn.execute(statement)
+        counts["usagedaily"] = conn.execute(text("SELECT COUNT(*) FROM usagedaily")).scalar()
+        conn.commit()
+
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.exec_driver_sql("PRAGMA journal_mode = DELETE")
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+    engine.dispose()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un database sintetico per test di carico.")
+    parser.add_argument("path", help="File di destinazione (viene sovrascritto)")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--materials", type=int)
+    parser.add_argument("--batches-per-material", type=int)
+    parser.add_argument("--withdrawals", type=int)
+    parser.add_argument("--years", type=int)
+    parser.add_argument("--events", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    params = dict(PRESETS[args.preset])
+    for key in ("users", "materials", "batches_per_material", "withdrawals", "years"):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+
+    start = time.perf_counter()
+    counts = generate_database(args.path, seed=args.seed, events=args.events, **params)
+    elapsed = time.perf_counter() - start
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    print(f"Generato {args.path} in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
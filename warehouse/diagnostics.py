@@ -0,0 +1,209 @@
+"""
+Runtime diagnostics for the "Prestazioni" panel and for support exports:
+query latencies, UI actions, loop lag, cache hit rates, DB size and memory.
+"""
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+from warehouse import database, watchdog, startup_trace
+from warehouse.instrumentation import instrumentation
+from warehouse.maintenance import get_database_stats, format_size
+
+
+def _windows_memory() -> dict:
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    kernel32 = ctypes.windll.kernel32
+    psapi = ctypes.windll.psapi
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return {"rss": None, "peak_rss": None}
+    return {"rss": counters.WorkingSetSize, "peak_rss": counters.PeakWorkingSetSize}
+
+
+def process_memory() -> dict:
+    """Current and peak resident memory of this process in bytes (None where unknown)."""
+    if sys.platform == "win32":
+        return _windows_memory()
+    if os.path.exists("/proc/self/status"):
+        values = {}
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":", 1)
+                    values[key] = int(value.split()[0]) * 1024
+        return {"rss": values.get("VmRSS"), "peak_rss": values.get("VmHWM")}
+    try:
+        import resource
+    except ImportError:
+        return {"rss": None, "peak_rss": None}
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return {"rss": None, "peak_rss": peak if sys.platform == "darwin" else peak * 1024}
+
+
+def _database_section() -> dict:
+    section = {
+        "path": database.db_path,
+        "working_copy": database.working_copy is not None,
+        "writes": database.write_activity.count,
+    }
+    try:
+        stats = get_database_stats(database.db_path)
+        section.update(
+            file_size=stats.file_size,
+            page_count=stats.page_count,
+            freelist_ratio=round(stats.freelist_ratio, 3),
+        )
+    except Exception as e:
+        section["error"] = str(e)
+    return section
+
+
+def _loop_section() -> dict | None:
+    dog = watchdog.loop_watchdog
+    if dog is None:
+        return None
+    return {
+        "threshold_ms": dog.threshold_ms,
+        "beats": dog.beats,
+        "max_lag_ms": round(dog.max_lag_ms, 1),
+        "debug": dog.debug,
+        "histogram": dog.histogram_rows(),
+        "stalls": [
+            {
+                "started_at": s.started_at.isoformat(timespec="seconds"),
+                "duration_ms": round(s.duration_ms),
+                "stack": s.stack[-10:],
+            }
+            for s in dog.stalls
+        ],
+    }
+
+
+def collect_diagnostics() -> dict:
+    queries = instrumentation.to_dict()
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": _database_section(),
+        "memory": process_memory(),
+        "startup": startup_trace.current_trace.to_dict() if startup_trace.current_trace is not None else None,
+        "loop": _loop_section(),
+        "query_count": queries["query_count"],
+        "recent_queries": [
+            {
+                "at": q.at.strftime("%H:%M:%S"),
+                "elapsed_ms": round(q.elapsed_ms, 2),
+                "rows": q.rows,
+                "statement": q.statement,
+            }
+            for q in reversed(instrumentation.recent_queries)
+        ],
+        "statements": queries["statements"][:20],
+        "actions": queries["actions"],
+        "caches": queries["caches"],
+        "n_plus_one": queries["n_plus_one"],
+    }
+
+
+def _size(value) -> str:
+    return format_size(value) if value is not None else "n/d"
+
+
+def format_diagnostics(data: dict) -> str:
+    db = data["database"]
+    memory = data["memory"]
+    lines = [
+        f"Report generato: {data['created_at']}  ({data['platform']}, Python {data['python']})",
+        "",
+        "DATABASE",
+        f"  File: {db['path']}" + ("  (copia locale)" if db["working_copy"] else ""),
+    ]
+    if "error" in db:
+        lines.append(f"  Statistiche non disponibili: {db['error']}")
+    else:
+        lines.append(f"  Dimensione: {format_size(db['file_size'])}, pagine {db['page_count']}, libere {db['freelist_ratio']:.0%}")
+    lines += [
+        f"  Scritture dall'avvio: {db['writes']}",
+        "",
+        "MEMORIA",
+        f"  In uso: {_size(memory['rss'])}   Picco: {_size(memory['peak_rss'])}",
+        "",
+        "AVVIO",
+    ]
+    startup = data["startup"]
+    if startup is None:
+        lines.append("  Non misurato")
+    else:
+        for checkpoint in startup["checkpoints"]:
+            lines.append(f"  {checkpoint['ms']:>8.0f} ms  {checkpoint['label']}")
+        lines.append(f"  Import: {startup['imports_ms']:.0f} ms, i più lenti:")
+        for i in startup["slowest_imports"][:5]:
+            lines.append(f"    {i['self_ms']:>7.1f} ms  {i['module']}")
+    lines += [
+        "",
+        "CACHE",
+    ]
+    if data["caches"]:
+        for c in data["caches"]:
+            lines.append(f"  {c['name']:<30} {c['hit_rate']:>6.1%}  ({c['hits']} hit, {c['misses']} miss)")
+    else:
+        lines.append("  Nessuna cache attiva")
+
+    lines += ["", "LATENZA DEL LOOP"]
+    loop = data["loop"]
+    if loop is None:
+        lines.append("  Watchdog non attivo")
+    else:
+        lines.append(f"  Massima: {loop['max_lag_ms']:.0f} ms su {loop['beats']} campioni (soglia {loop['threshold_ms']:.0f} ms)")
+        peak = max((count for _, count in loop["histogram"]), default=0) or 1
+        for label, count in loop["histogram"]:
+            lines.append(f"  {label:>11} {count:>7}  {'#' * round(30 * count / peak)}")
+        for stall in loop["stalls"][-5:]:
+            lines.append(f"  Blocco {stall['started_at']}: {stall['duration_ms']} ms")
+            if stall["stack"]:
+                lines.append("    " + stall["stack"][-1].strip().splitlines()[0])
+
+    lines += ["", f"AZIONI PIÙ LENTE ({data['query_count']} query totali)"]
+    for a in sorted(data["actions"], key=lambda a: a["max_ms"], reverse=True)[:10]:
+        flag = "  [N+1]" if a["n_plus_one"] else ""
+        lines.append(f"  {a['max_ms']:>9.1f} ms max  {a['avg_ms']:>9.1f} ms medi  {a['avg_queries']:>5.1f} query  {a['name']}{flag}")
+
+    lines += ["", "QUERY RECENTI"]
+    for q in data["recent_queries"][:20]:
+        lines.append(f"  {q['at']}  {q['elapsed_ms']:>8.2f} ms  {q['rows']:>6} righe  {q['statement'][:90]}")
+    return "\n".join(lines)
+
+
+def export_diagnostics(path: str) -> dict:
+    """Writes the report as JSON when path ends in .json, as text otherwise."""
+    data = collect_diagnostics()
+    with open(path, "w", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            json.dump(data, f, indent=2)
+        else:
+            f.write(format_diagnostics(data))
+    return data
@@ -0,0 +1,162 @@
+"""
+Streaming CSV/JSONL export of withdrawals and event logs.
+
+Rows are read through a server-side cursor (session.stream with yield_per)
+as plain columns, never as ORM objects, and written to the file one
+partition at a time, so memory stays flat however many years of history
+are exported. The format follows the file extension: .jsonl (or .json)
+writes one JSON object per line, anything else writes CSV with a header.
+"""
+import csv
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from sqlmodel import select
+from warehouse import tiering
+from warehouse.database import get_session
+from warehouse.models import Withdrawal, User, Material, EventLog, EventType
+
+PARTITION_SIZE = 1000
+
+def _withdrawal_columns(W) -> dict:
+    return {
+        "id": W.id,
+        "data_prelievo": W.withdrawal_date,
+        "utente_id": User.custom_id,
+        "nome": User.first_name,
+        "cognome": User.last_name,
+        "luogo_di_lavoro": User.workplace,
+        "materiale_id": Material.id,
+        "materiale": Material.denomination,
+        "tipo": Material.material_type,
+        "codice_materiale": Material.code,
+        "quantita": W.amount,
+        "data_restituzione": W.return_date,
+        "efficiente_alla_restituzione": W.efficient_at_return,
+        "note": W.notes,
+    }
+
+
+def _log_columns(Log) -> dict:
+    return {
+        "id": Log.id,
+        "data_ora": Log.timestamp,
+        "tipo_evento": Log.event_type,
+        "descrizione": Log.description,
+        "dettagli": Log.details,
+    }
+
+
+# Header of each export
+WITHDRAWAL_COLUMNS = tuple(_withdrawal_columns(Withdrawal))
+LOG_COLUMNS = tuple(_log_columns(EventLog))
+
+
+@dataclass
+class ExportReport:
+    path: str
+    rows: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return f"{self.rows} righe esportate in {os.path.basename(self.path)} ({self.seconds:.2f}s)"
+
+
+def export_format(path: str) -> str:
+    return "jsonl" if path.lower().endswith((".jsonl", ".json")) else "csv"
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "value"):
+        # str Enums (material type, event type)
+        return value.value
+    return value
+
+
+def _date_range(statement, column, date_from: date | None, date_to: date | None):
+    if date_from is not None:
+        statement = statement.where(column >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        # date_to is inclusive
+        statement = statement.where(column < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return statement
+
+
+async def _stream_to_file(statement, columns: list[str], path: str, partition_size: int) -> ExportReport:
+    report = ExportReport(path=path)
+    start = time.perf_counter()
+    fmt = export_format(path)
+    partial = path + ".partial"
+    try:
+        with open(partial, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f) if fmt == "csv" else None
+            if writer is not None:
+                writer.writerow(columns)
+            async with get_session() as session:
+                result = await session.stream(statement.execution_options(yield_per=partition_size))
+                async for partition in result.partitions():
+                    for row in partition:
+                        values = [_plain(v) for v in row]
+                        if writer is not None:
+                            writer.writerow(values)
+                        else:
+                            f.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False) + "\n")
+                    report.rows += len(partition)
+        # Never leave a truncated export under the requested name
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+async def export_withdrawals(
+    path: str,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    user: str | None = None,
+    workplace: str | None = None,
+    material_id: int | None = None,
+    partition_size: int = PARTITION_SIZE,
+) -> ExportReport:
+    """
+    Writes the withdrawals matching every given filter, oldest first, including
+    those moved to the history archive. user is a custom_id; date_from/date_to
+    bound the withdrawal date, both inclusive.
+    """
+    W = tiering.history(Withdrawal)
+    statement = (
+        select(*_withdrawal_columns(W).values())
+        .join(User, W.user_id == User.id)
+        .join(Material, W.material_id == Material.id)
+        .order_by(W.withdrawal_date, W.id)
+    )
+    statement = _date_range(statement, W.withdrawal_date, date_from, date_to)
+    if user:
+        statement = statement.where(User.custom_id == user)
+    if workplace:
+        statement = statement.where(User.workplace == workplace)
+    if material_id is not None:
+        statement = statement.where(W.material_id == material_id)
+    return await _stream_to_file(statement, list(WITHDRAWAL_COLUMNS), path, partition_size)
+
+
+async def export_logs(
+    path: str,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    event_type: EventType | None = None,
+    partition_size: int = PARTITION_SIZE,
+) -> ExportReport:
+    """Writes the event log entries matching the filters, oldest first, archived ones included."""
+    Log = tiering.history(EventLog)
+    statement = select(*_log_columns(Log).values()).order_by(Log.timestamp, Log.id)
+    statement = _date_range(statement, Log.timestamp, date_from, date_to)
+    if event_type is not None:
+        statement = statement.where(Log.event_type == event_type)
+    return await _stream_to_file(statement, list(LOG_COLUMNS), path, partition_size)
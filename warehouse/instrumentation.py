@@ -0,0 +1,317 @@
+"""
+SQL instrumentation hooked into the engine's cursor events.
+
+Records latency and affected rows of every statement, counts the queries each
+user action issues and flags actions that run the same statement many times
+(the N+1 pattern: one query per row of a previous result).
+
+UI slots opt in with the track_action() decorator, placed under @asyncSlot():
+
+    @asyncSlot()
+    @track_action()
+    async def refresh_users(self, *args):
+        ...
+
+Queries issued while an action runs are attributed to the outermost action,
+so a slot that calls other slots reports the full cost of the user action.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import interfaces
+from warehouse import database
+
+# Executions of one statement within a single action that count as N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+RECENT_ACTIONS = 200
+RECENT_QUERIES = 100
+
+# Cache fed by this module: SQLAlchemy's cache of compiled statements
+SQL_CACHE_NAME = "Statement SQL compilati"
+
+# "IN (?, ?, ?)" expanded from a list parameter: one shape whatever the length
+_EXPANDED_IN = re.compile(r"\(\?(?:,\s*\?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    return _EXPANDED_IN.sub("(?...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+def _row_count(cursor) -> int:
+    # Rows written by INSERT/UPDATE/DELETE; SQLite reports -1 for a SELECT
+    return max(cursor.rowcount, 0)
+
+
+def listen_statement_timing(sync_engine, on_statement):
+    """
+    Calls on_statement(cursor, statement, parameters, context, executemany, elapsed_ms)
+    after every statement the engine runs.
+
+    The start time travels on the execution context rather than on the
+    connection, so a statement that fails (e.g. an IntegrityError) leaves
+    nothing behind for the next one on the same pooled connection.
+    """
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._warehouse_query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_warehouse_query_start", None)
+        if start is None:
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        on_statement(cursor, statement, parameters, context, executemany, elapsed)
+
+
+@dataclass
+class StatementStats:
+    statement: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+
+@dataclass
+class RecentQuery:
+    at: datetime
+    elapsed_ms: float
+    rows: int
+    statement: str
+
+
+@dataclass
+class CacheStats:
+    name: str
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class ActionTrace:
+    name: str
+    started_at: datetime
+    queries: int = 0
+    query_ms: float = 0.0
+    duration_ms: float = 0.0
+    executions: dict[str, int] = field(default_factory=dict)
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> dict[str, int]:
+        return {s: n for s, n in self.executions.items() if n >= threshold}
+
+
+@dataclass
+class ActionStats:
+    name: str
+    count: int = 0
+    total_queries: int = 0
+    max_queries: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    n_plus_one: int = 0
+
+    @property
+    def avg_queries(self) -> float:
+        return self.total_queries / self.count if self.count else 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+
+class QueryInstrumentation:
+    def __init__(self):
+        self.query_count = 0
+        self.statements: dict[str, StatementStats] = {}
+        self.actions: dict[str, ActionStats] = {}
+        self.recent: deque[ActionTrace] = deque(maxlen=RECENT_ACTIONS)
+        self.recent_queries: deque[RecentQuery] = deque(maxlen=RECENT_QUERIES)
+        self.caches: dict[str, CacheStats] = {}
+        self.started_at = datetime.now()
+        self._current = contextvars.ContextVar("warehouse_action", default=None)
+        self._reported = set()
+
+    def attach(self, target_engine):
+        listen_statement_timing(target_engine.sync_engine, self._on_statement)
+
+    def _on_statement(self, cursor, statement, parameters, context, executemany, elapsed_ms):
+        self.record_query(statement, elapsed_ms, _row_count(cursor))
+        if context.cache_hit is interfaces.CacheStats.CACHE_HIT:
+            self.cache(SQL_CACHE_NAME).hits += 1
+        elif context.cache_hit is interfaces.CacheStats.CACHE_MISS:
+            self.cache(SQL_CACHE_NAME).misses += 1
+
+    def record_query(self, statement: str, elapsed_ms: float, rows: int):
+        self.query_count += 1
+        key = normalize_statement(statement)
+        stats = self.statements.get(key)
+        if stats is None:
+            stats = self.statements[key] = StatementStats(key)
+        stats.count += 1
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        stats.rows += rows
+        self.recent_queries.append(RecentQuery(datetime.now(), elapsed_ms, rows, key))
+
+        trace = self._current.get()
+        if trace is not None:
+            trace.queries += 1
+            trace.query_ms += elapsed_ms
+            trace.executions[key] = trace.executions.get(key, 0) + 1
+
+    def cache(self, name: str) -> CacheStats:
+        """Hit/miss counters shown in the diagnostics, created on first use."""
+        stats = self.caches.get(name)
+        if stats is None:
+            stats = self.caches[name] = CacheStats(name)
+        return stats
+
+    # --- Actions ---
+
+    def current_action(self) -> str | None:
+        trace = self._current.get()
+        return trace.name if trace is not None else None
+
+    def _begin(self, name: str):
+        if self._current.get() is not None:
+            return None, None
+        trace = ActionTrace(name, datetime.now())
+        return trace, self._current.set(trace)
+
+    def _end(self, trace: ActionTrace | None, token, start: float):
+        if trace is None:
+            return
+        self._current.reset(token)
+        trace.duration_ms = (time.perf_counter() - start) * 1000
+        self.recent.append(trace)
+
+        stats = self.actions.get(trace.name)
+        if stats is None:
+            stats = self.actions[trace.name] = ActionStats(trace.name)
+        stats.count += 1
+        stats.total_queries += trace.queries
+        stats.max_queries = max(stats.max_queries, trace.queries)
+        stats.total_ms += trace.duration_ms
+        stats.max_ms = max(stats.max_ms, trace.duration_ms)
+
+        repeated = trace.repeated()
+        if repeated:
+            stats.n_plus_one += 1
+            for statement, n in repeated.items():
+                if (trace.name, statement) not in self._reported:
+                    self._reported.add((trace.name, statement))
+                    print(f"Possibile N+1 in '{trace.name}': {n} esecuzioni di {statement[:120]}")
+
+    def track_action(self, name: str | None = None):
+        """Decorator attributing the queries of a function (sync or async) to an action."""
+        def decorator(fn):
+            action = name or fn.__qualname__
+
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    trace, token = self._begin(action)
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        self._end(trace, token, start)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                trace, token = self._begin(action)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self._end(trace, token, start)
+            return wrapper
+        return decorator
+
+    # --- Reporting ---
+
+    def slowest_statements(self, limit: int = 10) -> list[StatementStats]:
+        return sorted(self.statements.values(), key=lambda s: s.total_ms, reverse=True)[:limit]
+
+    def costliest_actions(self, limit: int = 10) -> list[ActionStats]:
+        return sorted(self.actions.values(), key=lambda a: a.max_queries, reverse=True)[:limit]
+
+    def n_plus_one_traces(self) -> list[ActionTrace]:
+        return [t for t in self.recent if t.repeated()]
+
+    def to_dict(self) -> dict:
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "query_count": self.query_count,
+            "statements": [
+                dict(asdict(s), avg_ms=round(s.avg_ms, 3)) for s in self.slowest_statements(limit=None)
+            ],
+            "actions": [
+                dict(asdict(a), avg_queries=round(a.avg_queries, 1), avg_ms=round(a.avg_ms, 3))
+                for a in self.costliest_actions(limit=None)
+            ],
+            "caches": [
+                dict(asdict(c), hit_rate=round(c.hit_rate, 3)) for c in self.caches.values()
+            ],
+            "n_plus_one": [
+                {
+                    "action": t.name,
+                    "started_at": t.started_at.isoformat(timespec="seconds"),
+                    "queries": t.queries,
+                    "repeated": t.repeated(),
+                }
+                for t in self.n_plus_one_traces()
+            ],
+        }
+
+    def report(self) -> str:
+        lines = [f"Query eseguite: {self.query_count}", "", "Azioni (query per esecuzione, media/max):"]
+        for a in self.costliest_actions(limit=20):
+            flag = f"  [N+1 x{a.n_plus_one}]" if a.n_plus_one else ""
+            lines.append(f"  {a.name:<50} {a.avg_queries:>6.1f} / {a.max_queries:<4} {a.avg_ms:>9.1f} ms x{a.count}{flag}")
+        lines += ["", "Statement più costosi (tempo totale):"]
+        for s in self.slowest_statements():
+            lines.append(f"  {s.total_ms:>9.1f} ms  x{s.count:<6} {s.avg_ms:>7.2f} ms/q  righe {s.rows:<8} {s.statement[:100]}")
+        return "\n".join(lines)
+
+    def dump_report(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def reset(self):
+        self.query_count = 0
+        self.statements.clear()
+        self.actions.clear()
+        self.recent.clear()
+        self.recent_queries.clear()
+        for cache in self.caches.values():
+            cache.hits = cache.misses = 0
+        self._reported.clear()
+        self.started_at = datetime.now()
+
+
+instrumentation = QueryInstrumentation()
+track_action = instrumentation.track_action
+database.register_engine_hook(instrumentation.attach)
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from warehouse.database import write_activity
+
+# PRAGMA auto_vacuum values
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Above this share of free pages a full maintenance run compacts the file
+COMPACT_FREELIST_RATIO = 0.2
+
+_DB_SIDE_SUFFIXES = ("-journal", "-wal", "-shm")
+
+
+def format_size(num_bytes: int) -> str:
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+@dataclass
+class DatabaseStats:
+    file_size: int
+    page_size: int
+    page_count: int
+    freelist_count: int
+    auto_vacuum: int
+
+    @property
+    def freelist_ratio(self) -> float:
+        return self.freelist_count / self.page_count if self.page_count else 0.0
+
+
+@dataclass
+class MaintenanceReport:
+    started_at: datetime
+    before: DatabaseStats
+    after: DatabaseStats | None = None
+    quick_check: str | None = None
+    compacted: bool = False
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.timings.values())
+
+    def summary(self) -> str:
+        after = self.after or self.before
+        lines = [
+            f"Eseguita: {self.started_at.strftime('%Y-%m-%d %H:%M:%S')}",
+            f"Dimensione: {format_size(self.before.file_size)} → {format_size(after.file_size)}",
+            f"Pagine libere: {self.before.freelist_count} → {after.freelist_count} (su {after.page_count})",
+        ]
+        if self.quick_check is not None:
+            lines.append(f"Controllo integrità: {self.quick_check}")
+        if self.compacted:
+            lines.append("File compattato (auto_vacuum incrementale attivo)")
+        steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items())
+        lines.append(f"Tempi: {steps} (totale {self.total_seconds:.2f}s)")
+        return "\n".join(lines)
+
+
+def read_stats(conn: sqlite3.Connection, db_file: str) -> DatabaseStats:
+    return DatabaseStats(
+        file_size=os.path.getsize(db_file),
+        page_size=conn.execute("PRAGMA page_size").fetchone()[0],
+        page_count=conn.execute("PRAGMA page_count").fetchone()[0],
+        freelist_count=conn.execute("PRAGMA freelist_count").fetchone()[0],
+        auto_vacuum=conn.execute("PRAGMA auto_vacuum").fetchone()[0],
+    )
+
+
+def get_database_stats(db_file: str) -> DatabaseStats:
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        return read_stats(conn, db_file)
+    finally:
+        conn.close()
+
+
+def _compact_into_place(conn: sqlite3.Connection, db_file: str):
+    """
+    Rewrites the DB with VACUUM INTO a sibling file and renames it over the original.
+    Unlike an in-place VACUUM this writes the data once and needs no rollback
+    journal, which matters on USB flash. The copy is created with incremental
+    auto_vacuum so later runs can reclaim space without rewriting the file.
+    """
+    compacted = db_file + ".compact"
+    if os.path.exists(compacted):
+        os.remove(compacted)
+    conn.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+    conn.execute("VACUUM INTO ?", (compacted,))
+    conn.close()
+    for suffix in _DB_SIDE_SUFFIXES:
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+    os.replace(compacted, db_file)
+
+
+def run_maintenance(db_file: str, full: bool = True, compact: bool = False) -> MaintenanceReport:
+    """
+    Runs SQLite housekeeping on db_file and reports what it did.
+
+    Light run (full=False): PRAGMA optimize and incremental_vacuum; safe while
+    the application keeps its own connections open.
+    Full run: quick_check, ANALYZE, PRAGMA optimize and, when requested or when
+    too many pages are free, a compaction through VACUUM INTO. A full run
+    replaces the DB file, so the caller must release every other connection.
+    """
+    conn = sqlite3.connect(db_file, timeout=30)
+    report = MaintenanceReport(started_at=datetime.now(), before=read_stats(conn, db_file))
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        report.timings[name] = time.perf_counter() - start
+        return result
+
+    try:
+        if full:
+            report.quick_check = timed(
+                "quick_check", lambda: conn.execute("PRAGMA quick_check").fetchone()[0]
+            )
+            if report.quick_check != "ok":
+                # Never rewrite a damaged file; leave it for a restore from backup
+                return report
+            timed("ANALYZE", lambda: conn.execute("ANALYZE"))
+
+        timed("optimize", lambda: conn.execute("PRAGMA optimize"))
+
+        needs_compaction = full and (
+            compact
+            or report.before.auto_vacuum != AUTO_VACUUM_INCREMENTAL and report.before.freelist_ratio >= COMPACT_FREELIST_RATIO
+        )
+        if needs_compaction:
+            timed("compattazione", lambda: _compact_into_place(conn, db_file))
+            report.compacted = True
+            conn = sqlite3.connect(db_file, timeout=30)
+        elif report.before.auto_vacuum == AUTO_VACUUM_INCREMENTAL and report.before.freelist_count:
+            # executescript steps the pragma to completion; execute().fetchall()
+            # frees a single page per call on Python <= 3.11
+            timed("incremental_vacuum", lambda: conn.executescript("PRAGMA incremental_vacuum;"))
+        conn.commit()
+
+        report.after = read_stats(conn, db_file)
+        return report
+    finally:
+        conn.close()
+
+
+class MaintenanceScheduler:
+    """
+    Runs a light maintenance pass when the application has been idle
+    (no committed writes) for `idle_minutes`, at most once every `min_interval_hours`.
+    `last_run` is a time.time() timestamp persisted by the caller through `on_report`.
+    """
+    CHECK_INTERVAL_SECONDS = 60
+
+    def __init__(self, db_file: str, idle_minutes: float = 10, min_interval_hours: float = 24, last_run: float | None = None, on_report=None):
+        self.db_file = db_file
+        self.idle_minutes = idle_minutes
+        self.min_interval_hours = min_interval_hours
+        self.last_run = last_run
+        self.last_report = None
+        self.on_report = on_report
+        self._started = time.monotonic()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_due(self) -> bool:
+        if self.last_run is not None and time.time() - self.last_run < self.min_interval_hours * 3600:
+            return False
+        last_activity = write_activity.last_write or self._started
+        return time.monotonic() - last_activity >= self.idle_minutes * 60
+
+    async def run_now(self) -> MaintenanceReport:
+        report = await asyncio.to_thread(run_maintenance, self.db_file, False)
+        self.record(report)
+        return report
+
+    def record(self, report: MaintenanceReport):
+        self.last_run = time.time()
+        self.last_report = report
+        if self.on_report:
+            self.on_report(report)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.CHECK_INTERVAL_SECONDS)
+            if self.is_due() and os.path.exists(self.db_file):
+                try:
+                    await self.run_now()
+                except Exception as e:
+                    print(f"Manutenzione automatica fallita: {e}")
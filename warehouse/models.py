@@ -1,13 +1,22 @@
 from typing import Optional, List
 from datetime import date, datetime
 from enum import Enum
+import re
+from sqlalchemy import Index, text
 from sqlmodel import Field, SQLModel, Relationship
 
 class MaterialType(str, Enum):
     CONSUMABLE = "consumable"
     ITEM = "item"
 
+# Archived users and materials keep their history but are hidden from the
+# active lists; these partial indexes only hold the active rows, which is
+# what every hot query filters on (archived_at IS NULL).
+ACTIVE_ROWS = text("archived_at IS NULL")
+
 class User(SQLModel, table=True):
+    __table_args__ = (Index("ix_user_active", "last_name", "first_name", sqlite_where=ACTIVE_ROWS),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     # Custom ID: First[0] + Last[0] + Counter
     custom_id: str = Field(index=True, unique=True) 
@@ -19,10 +28,26 @@ class User(SQLModel, table=True):
     email: Optional[str] = None
     notes: Optional[str] = None
     code: Optional[str] = Field(default=None, index=True, unique=True)
+    archived_at: Optional[datetime] = None
     
     withdrawals: List["Withdrawal"] = Relationship(back_populates="user")
 
+# custom_id = prefix (initials) + progressive number, e.g. "MR3"
+CUSTOM_ID_PATTERN = re.compile(r"^(\D+)(\d+)$")
+
+def split_custom_id(custom_id: str | None) -> tuple[str, int] | None:
+    """'MR3' -> ('MR', 3); None for ids not following the pattern."""
+    match = CUSTOM_ID_PATTERN.match(custom_id or "")
+    return (match.group(1), int(match.group(2))) if match else None
+
+class UserIdCounter(SQLModel, table=True):
+    """Last custom_id number handed out for each prefix (see allocate_custom_ids)."""
+    prefix: str = Field(primary_key=True)
+    last_number: int = Field(default=0)
+
 class Material(SQLModel, table=True):
+    __table_args__ = (Index("ix_material_active", "material_type", "denomination", sqlite_where=ACTIVE_ROWS),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     material_type: MaterialType
     denomination: str
@@ -33,13 +58,14 @@ class Material(SQLModel, table=True):
     image_path: Optional[str] = None
     min_stock: int = Field(default=0)
     is_efficient: bool = Field(default=True)
+    archived_at: Optional[datetime] = None
     
     batches: List["Batch"] = Relationship(back_populates="material")
     withdrawals: List["Withdrawal"] = Relationship(back_populates="material")
 
 class Batch(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    material_id: int = Field(foreign_key="material.id")
+    material_id: int = Field(foreign_key="material.id", index=True)
     expiration: date
     amount: int
     location: Optional[str] = None
@@ -48,8 +74,8 @@ class Batch(SQLModel, table=True):
 
 class Withdrawal(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="user.id")
-    material_id: int = Field(foreign_key="material.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
+    material_id: int = Field(foreign_key="material.id", index=True)
     amount: int
     withdrawal_date: datetime = Field(default_factory=datetime.now)
     notes: Optional[str] = None
@@ -61,6 +87,21 @@ class Withdrawal(SQLModel, table=True):
     user: User = Relationship(back_populates="withdrawals")
     material: Material = Relationship(back_populates="withdrawals")
 
+class UsageDaily(SQLModel, table=True):
+    """
+    Withdrawals rolled up per day, material and user (see controllers_usage):
+    usage reports read these rows instead of the whole withdrawal history.
+    """
+    day: date = Field(primary_key=True)
+    material_id: int = Field(primary_key=True, index=True)
+    user_id: int = Field(primary_key=True, index=True)
+    # The user's workplace at the time of the first withdrawal of the day
+    workplace: Optional[str] = None
+    amount: int = Field(default=0)
+    count: int = Field(default=0)
+    # Withdrawals of this row already returned (items)
+    returned: int = Field(default=0)
+
 class EventType(str, Enum):
     USER_CREATED = "user_created"
     MATERIAL_CREATED = "material_created"
@@ -69,6 +110,10 @@ class EventType(str, Enum):
     BATCH_CREATED = "batch_created"
     WITHDRAWAL_CREATED = "withdrawal_created"
     WITHDRAWAL_RETURNED = "withdrawal_returned"
+    USER_ARCHIVED = "user_archived"
+    USER_RESTORED = "user_restored"
+    MATERIAL_ARCHIVED = "material_archived"
+    MATERIAL_RESTORED = "material_restored"
 
 class EventLog(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -0,0 +1,180 @@
+"""
+Opt-in session profiling, enabled with an environment variable:
+
+    WAREHOUSE_PROFILE=cpu        cProfile of the loop thread (.prof + .txt summary)
+    WAREHOUSE_PROFILE=mem        tracemalloc snapshots at startup and at exit
+    WAREHOUSE_PROFILE=sql        trace of every statement (.jsonl) + query report
+    WAREHOUSE_PROFILE=cpu,sql    modes can be combined
+
+Artefacts are written at shutdown into the "profiles" folder next to the
+database, named profile_<timestamp>_<mode>.*, so a session on the real
+hardware (frozen build included) can be profiled without code changes.
+cProfile only sees the loop thread: work sent to asyncio.to_thread (backups,
+maintenance) is not included, and the greenlet switches of the async DB
+layer inflate cumulative times along the query path (tottime is reliable).
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import tracemalloc
+from datetime import datetime
+from warehouse import database
+from warehouse.instrumentation import instrumentation, listen_statement_timing
+
+PROFILE_MODES = ("cpu", "mem", "sql")
+PROFILES_DIRNAME = "profiles"
+
+TRACEMALLOC_FRAMES = 10
+TOP_ENTRIES = 50
+
+
+class SessionProfiler:
+    def __init__(self, modes: list[str], output_dir: str):
+        self.modes = modes
+        self.output_dir = output_dir
+        self.prefix = None
+        self._cpu = None
+        self._snapshots = []
+        self._sql_file = None
+
+    @classmethod
+    def from_env(cls, value: str | None, output_dir: str) -> "SessionProfiler | None":
+        if not value:
+            return None
+        modes = []
+        for mode in value.lower().replace(" ", "").split(","):
+            if mode in PROFILE_MODES:
+                modes.append(mode)
+            elif mode:
+                print(f"Modalità di profilazione sconosciuta ignorata: '{mode}' (valide: {', '.join(PROFILE_MODES)})")
+        return cls(modes, output_dir) if modes else None
+
+    def _path(self, suffix: str) -> str:
+        return os.path.join(self.output_dir, f"{self.prefix}_{suffix}")
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.prefix = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if "mem" in self.modes:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if "sql" in self.modes:
+            self._sql_file = open(self._path("sql.jsonl"), "w", encoding="utf-8")
+            database.register_engine_hook(self._attach_sql_trace)
+        if "cpu" in self.modes:
+            self._cpu = cProfile.Profile()
+            self._cpu.enable()
+        print(f"Profilazione attiva ({', '.join(self.modes)}): risultati in {self.output_dir}")
+
+    def checkpoint(self, label: str):
+        """Memory snapshot compared against the final one (e.g. once the window is shown)."""
+        if "mem" in self.modes and tracemalloc.is_tracing():
+            self._snapshots.append((label, tracemalloc.take_snapshot()))
+
+    def stop(self) -> list[str]:
+        """Stops every mode and writes the artefacts; returns their paths."""
+        written = []
+        if self._cpu is not None:
+            self._cpu.disable()
+        if "mem" in self.modes and tracemalloc.is_tracing():
+            # Before formatting the CPU stats, which allocate a lot
+            self.checkpoint("chiusura")
+            tracemalloc.stop()
+            written += self._write_mem()
+        if self._cpu is not None:
+            written += self._write_cpu()
+            self._cpu = None
+        if self._sql_file is not None:
+            self._sql_file.close()
+            self._sql_file = None
+            written.append(self._path("sql.jsonl"))
+            report_path = self._path("sql_report.json")
+            instrumentation.dump_report(report_path)
+            written.append(report_path)
+        return written
+
+    # --- CPU ---
+
+    def _write_cpu(self) -> list[str]:
+        prof_path = self._path("cpu.prof")
+        self._cpu.dump_stats(prof_path)
+        text_path = self._path("cpu.txt")
+        with open(text_path, "w", encoding="utf-8") as f:
+            for sort_key in ("cumulative", "tottime"):
+                buffer = io.StringIO()
+                pstats.Stats(self._cpu, stream=buffer).strip_dirs().sort_stats(sort_key).print_stats(TOP_ENTRIES)
+                f.write(f"=== Ordinati per {sort_key} ===\n{buffer.getvalue()}\n")
+        return [prof_path, text_path]
+
+    # --- Memory ---
+
+    def _write_mem(self) -> list[str]:
+        label, final = self._snapshots[-1]
+        snapshot_path = self._path("mem.tracemalloc")
+        final.dump(snapshot_path)
+        text_path = self._path("mem.txt")
+        with open(text_path, "w", encoding="utf-8") as f:
+            stats = final.statistics("lineno")
+            total = sum(s.size for s in stats)
+            f.write(f"=== Memoria allocata alla {label}: {total / 1024 / 1024:.1f} MB ===\n")
+            for stat in stats[:TOP_ENTRIES]:
+                f.write(f"{stat}\n")
+            for earlier_label, earlier in self._snapshots[:-1]:
+                f.write(f"\n=== Crescita da '{earlier_label}' a '{label}' ===\n")
+                for stat in final.compare_to(earlier, "lineno")[:TOP_ENTRIES]:
+                    f.write(f"{stat}\n")
+            f.write("\n=== Allocazioni maggiori per traceback ===\n")
+            for stat in final.statistics("traceback")[:10]:
+                f.write(f"{stat.size / 1024:.1f} KB in {stat.count} blocchi\n")
+                for line in stat.traceback.format():
+                    f.write(f"{line}\n")
+        return [snapshot_path, text_path]
+
+    # --- SQL ---
+
+    def _attach_sql_trace(self, target_engine):
+        listen_statement_timing(target_engine.sync_engine, self._trace_statement)
+
+    def _trace_statement(self, cursor, statement, parameters, context, executemany, elapsed_ms):
+        if self._sql_file is None:
+            return
+        record = {
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "ms": round(elapsed_ms, 3),
+            "action": instrumentation.current_action(),
+            "executemany": executemany,
+            "statement": statement,
+            "parameters": repr(parameters)[:200],
+        }
+        self._sql_file.write(json.dumps(record) + "\n")
+
+
+# Set by start_profiling(), used by checkpoint()
+active_profiler: SessionProfiler | None = None
+
+
+def start_profiling(value: str | None, output_dir: str) -> SessionProfiler | None:
+    global active_profiler
+    active_profiler = SessionProfiler.from_env(value, output_dir)
+    if active_profiler is not None:
+        active_profiler.start()
+    return active_profiler
+
+
+def checkpoint(label: str):
+    if active_profiler is not None:
+        active_profiler.checkpoint(label)
+
+
+def stop_profiling() -> list[str]:
+    global active_profiler
+    if active_profiler is None:
+        return []
+    try:
+        written = active_profiler.stop()
+    finally:
+        active_profiler = None
+    for path in written:
+        print(f"Profilo salvato: {path}")
+    return written
@@ -0,0 +1,249 @@
+"""
+Startup timing trace.
+
+main.py starts the trace before its heavy imports and marks checkpoints
+along the launch (PyQt6 imported, SQLModel metadata built, database ready,
+window built, first paint, first data shown). Times are relative to the
+creation of the process, so the interpreter's own startup from the USB
+stick is included. While the trace runs, an import hook measures how long
+each module takes to load, like "python -X importtime".
+
+Each launch is appended to logs/startup.log and the current one is shown in
+the "Prestazioni" panel of the settings. Only the standard library is
+imported here: the module is loaded before everything it measures.
+"""
+import importlib.abc
+import os
+import platform
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+FIRST_PAINT = "prima visualizzazione"
+FIRST_DATA = "primi dati visualizzati"
+
+TOP_IMPORTS = 25
+MAX_LOG_BYTES = 1024 * 1024
+
+
+def process_started_at() -> float | None:
+    """Creation time of this process as a Unix timestamp, None where unknown."""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            creation, exit_, kernel, user = (wintypes.FILETIME() for _ in range(4))
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+            if not kernel32.GetProcessTimes(
+                kernel32.GetCurrentProcess(),
+                ctypes.byref(creation), ctypes.byref(exit_), ctypes.byref(kernel), ctypes.byref(user),
+            ):
+                return None
+            # 100 ns intervals since 1601-01-01
+            ticks = (creation.dwHighDateTime << 32) | creation.dwLowDateTime
+            return (ticks - 116444736000000000) / 10_000_000
+        if os.path.exists("/proc/self/stat"):
+            with open("/proc/self/stat", "r", encoding="utf-8") as f:
+                # The command name may contain spaces: fields start after ")"
+                fields = f.read().rsplit(")", 1)[1].split()
+            start_ticks = int(fields[19])
+            with open("/proc/stat", "r", encoding="utf-8") as f:
+                boot = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+            return boot + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, StopIteration, AttributeError):
+        pass
+    return None
+
+
+@dataclass
+class ImportCost:
+    module: str
+    total_ms: float
+    self_ms: float
+
+
+class _TimedLoader:
+    """
+    Wraps a loader for one module; the original is put back once executed.
+    Both phases are timed: extension modules (PyQt6) do their work in
+    create_module, Python modules in exec_module.
+    """
+
+    def __init__(self, loader, name: str, trace: "StartupTrace"):
+        self._loader = loader
+        self._name = name
+        self._trace = trace
+        self._total_ms = 0.0
+        self._self_ms = 0.0
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+    def _timed(self, fn, *args):
+        if threading.get_ident() != self._trace._thread:
+            return fn(*args)
+        stack = self._trace._import_stack
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            total = (time.perf_counter() - start) * 1000
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            self._total_ms += total
+            self._self_ms += total - children
+
+    def create_module(self, spec):
+        return self._timed(self._loader.create_module, spec)
+
+    def exec_module(self, module):
+        try:
+            return self._timed(self._loader.exec_module, module)
+        finally:
+            module.__loader__ = self._loader
+            if getattr(module, "__spec__", None) is not None:
+                module.__spec__.loader = self._loader
+            self._trace.imports.append(ImportCost(self._name, self._total_ms, self._self_ms))
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Finds specs through the other finders and times their loaders."""
+
+    def __init__(self, trace: "StartupTrace"):
+        self.trace = trace
+        self._local = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, name, self.trace)
+        return spec
+
+
+@dataclass
+class StartupTrace:
+    started_at: datetime = field(default_factory=datetime.now)
+    # Seconds between process creation and the start of the trace
+    offset: float = 0.0
+    checkpoints: list[tuple[str, float]] = field(default_factory=list)
+    imports: list[ImportCost] = field(default_factory=list)
+    finished: bool = False
+
+    def __post_init__(self):
+        self._origin = time.perf_counter()
+        self._thread = threading.get_ident()
+        self._import_stack: list[float] = []
+        self._hook = None
+
+    def elapsed_ms(self) -> float:
+        return (self.offset + time.perf_counter() - self._origin) * 1000
+
+    def mark(self, label: str) -> float | None:
+        """Records a checkpoint and returns its time; only the first occurrence of each label counts."""
+        if self.finished or any(existing == label for existing, _ in self.checkpoints):
+            return None
+        elapsed = self.elapsed_ms()
+        self.checkpoints.append((label, elapsed))
+        return elapsed
+
+    def install_import_hook(self):
+        if self._hook is None:
+            self._hook = _ImportTimer(self)
+            sys.meta_path.insert(0, self._hook)
+
+    def remove_import_hook(self):
+        if self._hook is not None:
+            if self._hook in sys.meta_path:
+                sys.meta_path.remove(self._hook)
+            self._hook = None
+
+    def slowest_imports(self, limit: int | None = TOP_IMPORTS) -> list[ImportCost]:
+        return sorted(self.imports, key=lambda i: i.self_ms, reverse=True)[:limit]
+
+    def to_dict(self) -> dict:
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished": self.finished,
+            "checkpoints": [{"label": label, "ms": round(ms, 1)} for label, ms in self.checkpoints],
+            "imports_ms": round(sum(i.self_ms for i in self.imports), 1),
+            "slowest_imports": [
+                {"module": i.module, "total_ms": round(i.total_ms, 1), "self_ms": round(i.self_ms, 1)}
+                for i in self.slowest_imports()
+            ],
+        }
+
+    def format(self) -> str:
+        lines = [f"=== Avvio del {self.started_at.strftime('%Y-%m-%d %H:%M:%S')} ({platform.platform()}) ==="]
+        previous = 0.0
+        for label, ms in self.checkpoints:
+            lines.append(f"  {ms:>8.0f} ms  (+{ms - previous:>6.0f})  {label}")
+            previous = ms
+        total = sum(i.self_ms for i in self.imports)
+        lines.append(f"  Import misurati: {len(self.imports)} moduli, {total:.0f} ms")
+        lines.append("  Import più costosi (proprio / cumulativo):")
+        for i in self.slowest_imports():
+            lines.append(f"    {i.self_ms:>8.1f} / {i.total_ms:>8.1f} ms  {i.module}")
+        return "\n".join(lines)
+
+
+# Set by start(), read by the diagnostics
+current_trace: StartupTrace | None = None
+_log_file: str | None = None
+
+
+def start(log_file: str | None = None) -> StartupTrace:
+    global current_trace, _log_file
+    started = process_started_at()
+    offset = max(0.0, time.time() - started) if started is not None else 0.0
+    current_trace = StartupTrace(offset=offset)
+    _log_file = log_file
+    if started is not None:
+        current_trace.checkpoints.append(("avvio interprete", 0.0))
+    current_trace.mark("inizio main.py")
+    current_trace.install_import_hook()
+    return current_trace
+
+
+def mark(label: str) -> float | None:
+    if current_trace is not None:
+        return current_trace.mark(label)
+    return None
+
+
+def finish():
+    """Stops measuring imports and appends the trace to the log (once)."""
+    trace = current_trace
+    if trace is None or trace.finished:
+        return
+    trace.remove_import_hook()
+    trace.finished = True
+    if not _log_file:
+        return
+    try:
+        os.makedirs(os.path.dirname(_log_file), exist_ok=True)
+        if os.path.exists(_log_file) and os.path.getsize(_log_file) > MAX_LOG_BYTES:
+            os.replace(_log_file, _log_file + ".1")
+        with open(_log_file, "a", encoding="utf-8") as f:
+            f.write(trace.format() + "\n\n")
+    except OSError as e:
+        print(f"Scrittura log di avvio fallita: {e}")
@@ -0,0 +1,197 @@
+"""
+History archive: closed withdrawals and old event logs moved out of the hot DB.
+
+Rows older than a configurable age are moved into warehouse_archive.db, next
+to warehouse.db on the stick, so the tables every list and stock query scans
+stay small. Once the archive file exists it is ATTACHed as "archive" on every
+connection of the engine; history views and reports query history(model),
+a UNION ALL of the hot and archived rows, and see no difference. Hot queries
+(stock, open loans, dashboard) keep using the models directly.
+
+The move runs in one transaction over both files (rollback journal: SQLite
+commits attached databases atomically). Open item loans are never moved, nor
+is the row holding the highest id: SQLite picks max(id) + 1 for new rows, so
+keeping it in the hot table prevents archived ids from being handed out again.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from sqlalchemy import MetaData, Table, Column, Index, insert, delete, select, union_all, func, or_, and_, text, event
+from sqlalchemy.orm import aliased
+from warehouse import database
+from warehouse.models import Withdrawal, EventLog, Material, MaterialType
+
+ARCHIVE_FILENAME = "warehouse_archive.db"
+ARCHIVE_SCHEMA = "archive"
+
+# Default age, in months, used by the settings tab and the CLI
+DEFAULT_MONTHS = 24
+
+# Tables that can be archived and the column giving each row's age
+_AGE_COLUMNS = {
+    Withdrawal: "withdrawal_date",
+    EventLog: "timestamp",
+}
+
+_archive_metadata = MetaData(schema=ARCHIVE_SCHEMA)
+
+
+def archive_path() -> str:
+    """The archive lives next to the portable DB, also when a local working copy is in use."""
+    portable_db = database.working_copy.portable_db if database.working_copy else database.db_path
+    return os.path.join(os.path.dirname(portable_db), ARCHIVE_FILENAME)
+
+
+def is_active() -> bool:
+    return os.path.exists(archive_path())
+
+
+def _attach_archive(target_engine):
+    @event.listens_for(target_engine.sync_engine, "connect")
+    def _on_connect(dbapi_conn, connection_record):
+        path = archive_path()
+        if os.path.exists(path):
+            cursor = dbapi_conn.cursor()
+            cursor.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+            cursor.close()
+
+database.register_engine_hook(_attach_archive)
+
+
+def archive_table(model) -> Table:
+    """The archive copy of model's table: same columns, no foreign keys, indexed by age."""
+    table = model.__table__
+    key = f"{ARCHIVE_SCHEMA}.{table.name}"
+    if key not in _archive_metadata.tables:
+        age_column = _AGE_COLUMNS[model]
+        Table(
+            table.name, _archive_metadata,
+            *[Column(c.name, c.type.copy(), primary_key=c.primary_key) for c in table.columns],
+            Index(f"ix_{table.name}_{age_column}", age_column),
+        )
+    return _archive_metadata.tables[key]
+
+
+def history(model):
+    """
+    Stands in for model in history queries: the hot rows plus, once the
+    archive exists, the archived ones (UNION ALL subquery mapped to model).
+    """
+    if not is_active():
+        return model
+    table = model.__table__
+    rows = union_all(
+        select(*table.columns),
+        select(*archive_table(model).columns),
+    ).subquery(f"{table.name}_history")
+    return aliased(model, rows, name=model.__name__)
+
+
+async def sync_archive_schema(conn):
+    """Creates the archive tables and adds columns the models gained since they were created."""
+    for model in _AGE_COLUMNS:
+        archive_table(model)
+    await conn.run_sync(_archive_metadata.create_all)
+    for model in _AGE_COLUMNS:
+        table = archive_table(model)
+        result = await conn.execute(text(f"PRAGMA {ARCHIVE_SCHEMA}.table_info({table.name})"))
+        existing = {row[1] for row in result}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                await conn.execute(text(f"ALTER TABLE {ARCHIVE_SCHEMA}.{table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def set_aside_archive(backups_dir: str) -> str | None:
+    """
+    Moves the archive into backups_dir when the hot DB is replaced (reset,
+    restore of an older backup), so its rows are neither lost nor shown next
+    to unrelated ones. Every connection must have been released.
+    Returns the new path, None when there is no archive.
+    """
+    path = archive_path()
+    if not os.path.exists(path):
+        return None
+    os.makedirs(backups_dir, exist_ok=True)
+    target = os.path.join(backups_dir, f"{ARCHIVE_FILENAME[:-3]}_previous_{datetime.now():%Y%m%d_%H%M%S}.db")
+    os.replace(path, target)
+    return target
+
+
+@dataclass
+class TieringReport:
+    cutoff: datetime
+    withdrawals: int = 0
+    logs: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Spostati nell'archivio storico {self.withdrawals} prelievi chiusi e {self.logs} voci di log "
+            f"anteriori al {self.cutoff:%d/%m/%Y} ({self.seconds:.2f}s)"
+        )
+
+
+def _movable(model, cutoff: datetime):
+    table = model.__table__
+    conditions = [
+        table.c[_AGE_COLUMNS[model]] < cutoff,
+        table.c.id < select(func.max(table.c.id)).scalar_subquery(),
+    ]
+    if model is Withdrawal:
+        # Consumables are never returned; items only once back in stock
+        consumables = select(Material.id).where(Material.material_type == MaterialType.CONSUMABLE)
+        conditions.append(or_(table.c.return_date.is_not(None), table.c.material_id.in_(consumables)))
+    return and_(*conditions)
+
+
+async def move_to_archive(older_than_days: int) -> TieringReport:
+    """Moves closed withdrawals and event logs older than older_than_days into the archive."""
+    if older_than_days < 1:
+        raise ValueError("L'età minima per l'archiviazione è di un giorno")
+    report = TieringReport(cutoff=datetime.now() - timedelta(days=older_than_days))
+    start = time.perf_counter()
+
+    if not is_active():
+        # Create the file, then reopen the pool so every connection attaches it
+        await asyncio.to_thread(lambda: sqlite3.connect(archive_path()).close())
+        await database.engine.dispose()
+
+    async with database.engine.begin() as conn:
+        await sync_archive_schema(conn)
+        for model in _AGE_COLUMNS:
+            table = model.__table__
+            movable = _movable(model, report.cutoff)
+            moved = await conn.execute(
+                insert(archive_table(model)).from_select(
+                    [c.name for c in table.columns], select(*table.columns).where(movable)
+                )
+            )
+            await conn.execute(delete(table).where(movable))
+            if model is Withdrawal:
+                report.withdrawals = moved.rowcount
+            else:
+                report.logs = moved.rowcount
+
+    await database.sync_working_copy()
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+async def get_archive_counts() -> dict[str, int]:
+    """Rows per archived table ({} while there is no archive)."""
+    if not is_active():
+        return {}
+    async with database.engine.connect() as conn:
+        counts = {}
+        for model in _AGE_COLUMNS:
+            table = archive_table(model)
+            try:
+                counts[table.name] = await conn.scalar(select(func.count()).select_from(table))
+            except Exception:
+                # Attached but tables not created yet
+                counts[table.name] = 0
+        return counts
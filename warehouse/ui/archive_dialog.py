@@ -0,0 +1,144 @@
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QTabWidget, QTableWidget, QTableWidgetItem,
+    QHeaderView, QPushButton, QMessageBox, QWidget
+)
+from PyQt6.QtCore import Qt
+from qasync import asyncSlot
+from warehouse.instrumentation import track_action
+from warehouse.controllers import get_archived_users, restore_user, delete_user, get_user_dependencies
+from warehouse.controllers_material import (
+    get_archived_materials, restore_material, delete_material, get_material_dependencies
+)
+from warehouse.ui.colors import AppColors
+
+
+class ArchiveDialog(QDialog):
+    """Archived users and materials: restore them or delete them permanently."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Archivio")
+        self.resize(700, 450)
+        # Set when something was restored or deleted, so the caller refreshes the tabs
+        self.changed = False
+
+        layout = QVBoxLayout()
+        self.tabs = QTabWidget()
+        self.users_table = self.create_table(["ID", "Nome", "Luogo di lavoro", "Archiviato il"])
+        self.materials_table = self.create_table(["Tipo", "Denominazione", "Codice", "Archiviato il"])
+        self.tabs.addTab(self.users_table, "Utenti")
+        self.tabs.addTab(self.materials_table, "Materiali")
+        layout.addWidget(self.tabs)
+
+        buttons = QHBoxLayout()
+        btn_restore = QPushButton("Ripristina")
+        btn_restore.clicked.connect(self.restore_selected)
+        buttons.addWidget(btn_restore)
+        btn_delete = QPushButton("Elimina definitivamente")
+        btn_delete.setStyleSheet(AppColors.danger_button_style())
+        btn_delete.clicked.connect(self.delete_selected)
+        buttons.addWidget(btn_delete)
+        buttons.addStretch()
+        btn_close = QPushButton("Chiudi")
+        btn_close.clicked.connect(self.accept)
+        buttons.addWidget(btn_close)
+        layout.addLayout(buttons)
+
+        self.setLayout(layout)
+
+    def create_table(self, headers: list[str]) -> QTableWidget:
+        table = QTableWidget()
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        return table
+
+    def fill_table(self, table: QTableWidget, rows: list[tuple[int, list[str]]]):
+        table.setRowCount(0)
+        for row_id, values in rows:
+            row = table.rowCount()
+            table.insertRow(row)
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setData(Qt.ItemDataRole.UserRole, row_id)
+                table.setItem(row, column, item)
+
+    async def load(self):
+        users = await get_archived_users()
+        self.fill_table(self.users_table, [
+            (u.id, [u.custom_id, f"{u.first_name} {u.last_name}", u.workplace or "",
+                    u.archived_at.strftime("%d/%m/%Y %H:%M")])
+            for u in users
+        ])
+        materials = await get_archived_materials()
+        self.fill_table(self.materials_table, [
+            (m.id, ["Attrezzatura" if m.material_type.value == "item" else "Consumabile", m.denomination,
+                    m.code or "", m.archived_at.strftime("%d/%m/%Y %H:%M")])
+            for m in materials
+        ])
+
+    def selected(self) -> tuple[bool, int | None, str]:
+        """(is_user, id, name) of the selected row in the current tab."""
+        is_user = self.tabs.currentWidget() is self.users_table
+        table = self.users_table if is_user else self.materials_table
+        row = table.currentRow()
+        if row < 0:
+            return is_user, None, ""
+        return is_user, table.item(row, 0).data(Qt.ItemDataRole.UserRole), table.item(row, 1).text()
+
+    @asyncSlot()
+    @track_action()
+    async def restore_selected(self):
+        is_user, row_id, name = self.selected()
+        if row_id is None:
+            return
+        try:
+            await (restore_user if is_user else restore_material)(row_id)
+            self.changed = True
+            await self.load()
+        except Exception as e:
+            QMessageBox.critical(self, "Errore", f"Impossibile ripristinare {name}: {e}")
+
+    @asyncSlot()
+    @track_action()
+    async def delete_selected(self):
+        is_user, row_id, name = self.selected()
+        if row_id is None:
+            return
+        try:
+            if is_user:
+                withdrawal_count = await get_user_dependencies(row_id)
+                details = f"{withdrawal_count} prelievi"
+            else:
+                batch_count, withdrawal_count = await get_material_dependencies(row_id)
+                details = f"{batch_count} lotti e {withdrawal_count} prelievi"
+
+            box = QMessageBox(self)
+            box.setWindowTitle("Conferma Eliminazione")
+            box.setText(f"Eliminare definitivamente {name}?\n\n"
+                        f"ATTENZIONE: verranno eliminati anche {details} associati. L'operazione non è reversibile.")
+            box.setIcon(QMessageBox.Icon.Warning)
+            btn_yes = box.addButton("Sì, elimina", QMessageBox.ButtonRole.YesRole)
+            btn_no = box.addButton("No, annulla", QMessageBox.ButtonRole.NoRole)
+            box.setDefaultButton(btn_no)
+            box.exec()
+            if box.clickedButton() != btn_yes:
+                return
+
+            await (delete_user if is_user else delete_material)(row_id)
+            self.changed = True
+            await self.load()
+        except Exception as e:
+            QMessageBox.critical(self, "Errore", f"Impossibile eliminare {name}: {e}")
+
+
+async def open_archive(parent: QWidget) -> bool:
+    """Shows the archive; returns True when something was restored or deleted."""
+    dialog = ArchiveDialog(parent)
+    await dialog.load()
+    dialog.exec()
+    return dialog.changed
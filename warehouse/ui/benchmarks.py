@@ -0,0 +1,193 @@
+"""
+Headless UI benchmarks: boots MainWindow under the offscreen Qt platform
+against a generated database.
+
+    python -m warehouse.ui.benchmarks --sizes tiny,small --output ui_bench.json
+    python -m warehouse.ui.benchmarks --baseline benchmarks/ui_baseline.json
+
+Measures window startup, the time each tab takes to (re)populate, the time
+per keystroke in the search bars, tab-switch latency and peak RSS. Results
+use the same JSON layout and baseline gate as warehouse.benchmarks.
+The tabs build one widget per row, so sizes above "small" need several GB.
+"""
+import asyncio
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication
+from qasync import QEventLoop
+from warehouse import database
+from warehouse.benchmarks import measure, prepare_database, build_parser, parse_sizes, finish_report
+from warehouse.controllers_dashboard import invalidate_dashboard_snapshot
+from warehouse.diagnostics import process_memory
+from warehouse.instrumentation import instrumentation
+
+DEFAULT_BASELINE = os.path.join("benchmarks", "ui_baseline.json")
+
+SEARCH_TEXT = "mario ros"
+
+
+def peak_rss_mb() -> float | None:
+    peak = process_memory()["peak_rss"]
+    return round(peak / (1024 * 1024), 1) if peak is not None else None
+
+
+async def settle():
+    """Waits until the refreshes started by Qt signals and timers have finished."""
+    idle_rounds = 0
+    while idle_rounds < 5:
+        await asyncio.sleep(0)
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and not t.done()]
+        idle_rounds = 0 if pending else idle_rounds + 1
+
+
+def _summary(timings_ms: list[float], queries: int) -> dict:
+    return {
+        "runs": len(timings_ms),
+        "min_ms": round(min(timings_ms), 3),
+        "median_ms": round(statistics.median(timings_ms), 3),
+        "max_ms": round(max(timings_ms), 3),
+        "queries": queries,
+    }
+
+
+def _typing(search_bar, text: str):
+    """Returns a callable that types the next character of text at each call."""
+    prefixes = iter(text[:i] for i in range(1, len(text) + 1))
+
+    def keystroke():
+        search_bar.setText(next(prefixes))
+        QApplication.processEvents()
+
+    return keystroke
+
+
+def _reloading(dashboard):
+    """Returns a callable that reloads the dashboard, bypassing the snapshot cache."""
+    async def reload():
+        invalidate_dashboard_snapshot()
+        # Forget the shown snapshot too, or refresh_data skips the panel diff
+        dashboard.snapshot = None
+        await dashboard.refresh_data()
+
+    return reload
+
+
+async def _benchmark_window(repeat: int) -> dict:
+    from warehouse.ui.main_window import MainWindow
+
+    results = {}
+    before = instrumentation.query_count
+    start = time.perf_counter()
+    window = MainWindow()
+    window.show()
+    window.activate_tabs()
+    await settle()
+    results["startup"] = _summary([(time.perf_counter() - start) * 1000], instrumentation.query_count - before)
+
+    # Tabs are built on first activation: build them all before measuring
+    for key in window.lazy_tabs:
+        window.tab(key)
+    await settle()
+
+    populate = {
+        "populate_dashboard": _reloading(window.tab("dashboard")),
+        "populate_users": window.tab("users").refresh_users,
+        "populate_items": window.tab("items").refresh_materials,
+        "populate_consumables": window.tab("consumables").refresh_materials,
+        "populate_withdrawals": window.tab("withdrawals").refresh_withdrawals,
+        "populate_logs": window.tab("logs").refresh_logs,
+    }
+    for name, refresh in populate.items():
+        results[name] = await measure(refresh, repeat)
+
+    for name in ("users", "consumables"):
+        tab = window.tab(name)
+        window.tabs.setCurrentWidget(window.lazy_tabs[name])
+        await settle()
+        tab.search_bar.clear()
+        results[f"keystroke_{name}"] = await measure(_typing(tab.search_bar, SEARCH_TEXT), len(SEARCH_TEXT))
+        tab.search_bar.clear()
+        await settle()
+
+    home = window.tabs.indexOf(window.lazy_tabs["dashboard"])
+    for index in range(window.tabs.count()):
+        if index == home:
+            continue
+        widget = window.tabs.widget(index).widget
+
+        async def switch(index=index):
+            window.tabs.setCurrentIndex(index)
+            await settle()
+
+        runs = []
+        for _ in range(repeat):
+            window.tabs.setCurrentIndex(home)
+            await settle()
+            runs.append(await measure(switch, 1))
+        results[f"tab_switch_{type(widget).__name__}"] = _summary(
+            [r["median_ms"] for r in runs], max(r["queries"] for r in runs)
+        )
+
+    window.close()
+    window.deleteLater()
+    await settle()
+    return results
+
+
+async def run_ui_benchmarks(sizes: list[str], data_dir: str, repeat: int = 3, seed: int = 42) -> dict:
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "qt_platform": QApplication.platformName(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": {},
+        "memory": {},
+    }
+    original_path = database.db_path
+    with tempfile.TemporaryDirectory() as work_dir:
+        try:
+            for size in sizes:
+                source = prepare_database(size, data_dir, seed)
+                work_db = os.path.join(work_dir, f"{size}.db")
+                shutil.copyfile(source, work_db)
+                await database.set_database_path(work_db)
+                print(f"Benchmark interfaccia '{size}'...")
+                report["results"][size] = await _benchmark_window(repeat)
+                # Peak so far: a larger size can only raise it
+                report["memory"][size] = {"peak_rss_mb": peak_rss_mb()}
+        finally:
+            await database.set_database_path(original_path)
+            await database.engine.dispose()
+    return report
+
+
+def main(argv=None):
+    parser = build_parser("Benchmark dell'interfaccia su piattaforma Qt offscreen.", "tiny", 3, DEFAULT_BASELINE)
+    args = parser.parse_args(argv)
+    sizes = parse_sizes(parser, args)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    # The window is closed between sizes; that must not end the run
+    app.setQuitOnLastWindowClosed(False)
+    loop = QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    with loop:
+        report = loop.run_until_complete(run_ui_benchmarks(sizes, args.data_dir, args.repeat, args.seed))
+
+    return finish_report(report, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from PyQt6.QtWidgets import QComboBox, QCompleter
+from PyQt6.QtWidgets import QComboBox, QCompleter, QWidget, QVBoxLayout, QLabel
 from PyQt6.QtCore import Qt, pyqtSignal
 
 class BarcodeSearchComboBox(QComboBox):
@@ -94,3 +94,33 @@ class BarcodeSearchComboBox(QComboBox):
     def setItemData(self, index, value, role=Qt.ItemDataRole.UserRole):
         super().setItemData(index, value, role)
 
+
+class LazyTab(QWidget):
+    """
+    Placeholder page of a QTabWidget that builds the real tab the first time
+    ensure_built() is called, so startup only pays for the tab on screen.
+    """
+
+    def __init__(self, factory, parent=None):
+        super().__init__(parent)
+        self.factory = factory
+        self.widget = None
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.placeholder = QLabel("Caricamento...")
+        self.placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(self.placeholder)
+        self.setLayout(layout)
+
+    @property
+    def is_built(self) -> bool:
+        return self.widget is not None
+
+    def ensure_built(self):
+        if self.widget is None:
+            self.widget = self.factory()
+            self.layout().removeWidget(self.placeholder)
+            self.placeholder.deleteLater()
+            self.layout().addWidget(self.widget)
+        return self.widget
@@ -0,0 +1,90 @@
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QFormLayout, QLineEdit, QDialogButtonBox,
+    QCheckBox, QDateEdit, QComboBox, QFileDialog, QMessageBox, QWidget
+)
+from PyQt6.QtCore import QDate
+from warehouse.exporter import export_withdrawals, export_logs
+from warehouse.models import EventType
+
+FILE_FILTERS = "File CSV (*.csv);;JSON Lines (*.jsonl)"
+
+
+class ExportDialog(QDialog):
+    """Filters for the withdrawals ("withdrawals") or event log ("logs") export."""
+
+    def __init__(self, kind: str, parent=None):
+        super().__init__(parent)
+        self.kind = kind
+        self.setWindowTitle("Esporta Prelievi" if kind == "withdrawals" else "Esporta Log Eventi")
+
+        layout = QVBoxLayout()
+        form = QFormLayout()
+
+        self.period_check = QCheckBox("Solo il periodo")
+        form.addRow(self.period_check)
+        today = QDate.currentDate()
+        self.from_input = QDateEdit(today.addYears(-1))
+        self.to_input = QDateEdit(today)
+        for date_input in (self.from_input, self.to_input):
+            date_input.setCalendarPopup(True)
+            date_input.setDisplayFormat("dd/MM/yyyy")
+            date_input.setEnabled(False)
+            self.period_check.toggled.connect(date_input.setEnabled)
+        form.addRow("Dal:", self.from_input)
+        form.addRow("Al:", self.to_input)
+
+        if kind == "withdrawals":
+            self.user_input = QLineEdit()
+            self.user_input.setPlaceholderText("ID utente, es. MR3 (vuoto: tutti)")
+            self.workplace_input = QLineEdit()
+            self.workplace_input.setPlaceholderText("Vuoto: tutti")
+            form.addRow("Utente:", self.user_input)
+            form.addRow("Luogo di lavoro:", self.workplace_input)
+        else:
+            self.event_combo = QComboBox()
+            self.event_combo.addItem("Tutti", None)
+            for event_type in EventType:
+                self.event_combo.addItem(event_type.value, event_type)
+            form.addRow("Tipo evento:", self.event_combo)
+
+        layout.addLayout(form)
+
+        buttons = QDialogButtonBox()
+        buttons.addButton("Esporta...", QDialogButtonBox.ButtonRole.AcceptRole)
+        buttons.addButton("Annulla", QDialogButtonBox.ButtonRole.RejectRole)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def filters(self) -> dict:
+        filters = {}
+        if self.period_check.isChecked():
+            filters["date_from"] = self.from_input.date().toPyDate()
+            filters["date_to"] = self.to_input.date().toPyDate()
+        if self.kind == "withdrawals":
+            filters["user"] = self.user_input.text().strip() or None
+            filters["workplace"] = self.workplace_input.text().strip() or None
+        else:
+            filters["event_type"] = self.event_combo.currentData()
+        return filters
+
+
+async def run_export(parent: QWidget, kind: str):
+    """Asks for filters and destination, then streams the export to the file."""
+    dialog = ExportDialog(kind, parent)
+    if not dialog.exec():
+        return
+    default_name = "prelievi.csv" if kind == "withdrawals" else "log_eventi.csv"
+    file_path, selected_filter = QFileDialog.getSaveFileName(parent, dialog.windowTitle(), default_name, FILE_FILTERS)
+    if not file_path:
+        return
+    if "jsonl" in selected_filter and not file_path.lower().endswith(".jsonl"):
+        file_path = file_path.rsplit(".csv", 1)[0] + ".jsonl"
+
+    export = export_withdrawals if kind == "withdrawals" else export_logs
+    try:
+        report = await export(file_path, **dialog.filters())
+        QMessageBox.information(parent, "Esportazione", report.summary())
+    except Exception as e:
+        QMessageBox.critical(parent, "Errore", f"Impossibile esportare: {e}")
@@ -7,19 +7,33 @@ from PyQt6.QtGui import QPalette, QColor
 from PyQt6.QtCore import Qt, QSettings
 from qasync import asyncSlot
 
+from warehouse import startup_trace
+from warehouse.instrumentation import track_action
 from warehouse.models import MaterialType
-from warehouse.ui.tabs.users_tab import UsersTab
-from warehouse.ui.tabs.materials_tab import MaterialsTab
-from warehouse.ui.tabs.withdrawals_tab import WithdrawalsTab
-from warehouse.ui.tabs.dashboard_tab import DashboardTab
-from warehouse.ui.tabs.settings_tab import SettingsTab
-from warehouse.ui.tabs.logs_tab import LogsTab
+from warehouse.ui.components import LazyTab
 from warehouse.ui.theme import apply_theme
 
+# Tab modules are imported by the factories below, on first activation
+
+# Tab key -> method reloading its data after a database import/reset
+TAB_REFRESHERS = (
+    ("dashboard", "refresh_data"),
+    ("users", "refresh_users"),
+    ("items", "refresh_materials"),
+    ("consumables", "refresh_materials"),
+    ("withdrawals", "refresh_withdrawals"),
+    ("logs", "refresh_logs"),
+)
+
 class MainWindow(QMainWindow):
-    def __init__(self, stop_event=None):
+    def __init__(self, stop_event=None, backup_scheduler=None, maintenance_scheduler=None):
         super().__init__()
         self.stop_event = stop_event
+        self.backup_scheduler = backup_scheduler
+        self.maintenance_scheduler = maintenance_scheduler
+        self.painted = False
+        # Tabs are built only once the database is ready (see activate_tabs)
+        self.tabs_active = False
         self.setWindowTitle("Gestore Magazzino")
         self.resize(1200, 800)
         
@@ -45,76 +59,110 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(container)
 
     def setup_ui(self):
-        # Tabs
+        # Tabs: placeholders only, each one builds its tab on first activation
         self.tabs = QTabWidget()
+        self.lazy_tabs = {}
         
         # 0. Dashboard Tab (New)
-        self.dashboard_tab = DashboardTab()
-        self.tabs.addTab(self.dashboard_tab, "Dashboard")
+        self.add_lazy_tab("dashboard", "Dashboard", self.create_dashboard_tab)
         
         # 1. Users Tab
-        self.users_tab = UsersTab()
-        self.tabs.addTab(self.users_tab, "Utenti")
+        self.add_lazy_tab("users", "Utenti", self.create_users_tab)
         
         # 2. Items Tab
-        self.items_tab = MaterialsTab(MaterialType.ITEM)
-        self.tabs.addTab(self.items_tab, "Attrezzature")
+        self.add_lazy_tab("items", "Attrezzature", lambda: self.create_materials_tab(MaterialType.ITEM))
         
         # 3. Consumables Tab
-        self.consumables_tab = MaterialsTab(MaterialType.CONSUMABLE)
-        self.tabs.addTab(self.consumables_tab, "Consumabili")
+        self.add_lazy_tab("consumables", "Consumabili", lambda: self.create_materials_tab(MaterialType.CONSUMABLE))
         
         # 4. Withdrawals Tab
-        self.withdrawals_tab = WithdrawalsTab()
-        self.tabs.addTab(self.withdrawals_tab, "Prelievi")
+        self.add_lazy_tab("withdrawals", "Prelievi", self.create_withdrawals_tab)
         
         # 5. Logs Tab
-        self.logs_tab = LogsTab()
-        self.tabs.addTab(self.logs_tab, "Log Eventi")
+        self.add_lazy_tab("logs", "Log Eventi", self.create_logs_tab)
 
         # 6. Settings Tab
-        self.settings_tab = SettingsTab()
-        self.settings_tab.db_changed.connect(self.on_db_changed)
-        self.tabs.addTab(self.settings_tab, "Impostazioni")
+        self.add_lazy_tab("settings", "Impostazioni", self.create_settings_tab)
         
         self.tabs.currentChanged.connect(self.on_tab_changed)
         
         self.layout.addWidget(self.tabs)
         
         # Status Bar
+        self.statusBar().showMessage("Apertura database...")
+
+    def add_lazy_tab(self, key, title, factory):
+        page = LazyTab(factory)
+        self.lazy_tabs[key] = page
+        self.tabs.addTab(page, title)
+
+    def tab(self, key):
+        """The tab registered under key, built now if it was never opened."""
+        return self.lazy_tabs[key].ensure_built()
+
+    # --- Tab factories ---
+
+    def create_dashboard_tab(self):
+        from warehouse.ui.tabs.dashboard_tab import DashboardTab
+        return DashboardTab()
+
+    def create_users_tab(self):
+        from warehouse.ui.tabs.users_tab import UsersTab
+        return UsersTab()
+
+    def create_materials_tab(self, material_type):
+        from warehouse.ui.tabs.materials_tab import MaterialsTab
+        return MaterialsTab(material_type)
+
+    def create_withdrawals_tab(self):
+        from warehouse.ui.tabs.withdrawals_tab import WithdrawalsTab
+        return WithdrawalsTab()
+
+    def create_logs_tab(self):
+        from warehouse.ui.tabs.logs_tab import LogsTab
+        return LogsTab()
+
+    def create_settings_tab(self):
+        from warehouse.ui.tabs.settings_tab import SettingsTab
+        settings_tab = SettingsTab(
+            backup_scheduler=self.backup_scheduler,
+            maintenance_scheduler=self.maintenance_scheduler
+        )
+        settings_tab.db_changed.connect(self.on_db_changed)
+        return settings_tab
+
+    def activate_tabs(self):
+        """Called once the database is ready: builds the tab on screen."""
+        self.tabs_active = True
+        self.on_tab_changed(self.tabs.currentIndex())
         self.statusBar().showMessage("Pronto")
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            elapsed = startup_trace.mark(startup_trace.FIRST_PAINT)
+            if elapsed is not None:
+                print(f"Finestra visualizzata dopo {elapsed:.0f} ms dall'avvio")
+
     @asyncSlot()
+    @track_action()
     async def on_db_changed(self):
         """Called when DB is imported or reset from SettingsTab"""
-        # Refresh all tabs
-        await self.dashboard_tab.refresh_data()
-        await self.users_tab.refresh_users()
-        await self.items_tab.refresh_materials()
-        await self.consumables_tab.refresh_materials()
-        await self.withdrawals_tab.refresh_withdrawals()
-        await self.logs_tab.refresh_logs()
+        # Refresh the tabs opened so far; the others load fresh data when first opened
+        for key, method in TAB_REFRESHERS:
+            page = self.lazy_tabs[key]
+            if page.is_built:
+                await getattr(page.widget, method)()
         self.statusBar().showMessage("Dati aggiornati dopo operazione su DB", 5000)
 
-    @asyncSlot()
-    async def on_tab_changed(self, *args):
-        if not args:
+    @track_action()
+    def on_tab_changed(self, index):
+        # Building a tab runs its initial load; tabs already built refresh
+        # themselves in showEvent (dashboard, materials) or via their buttons
+        if not self.tabs_active or index < 0:
             return
-        index = args[0]
-        widget = self.tabs.widget(index)
-        if isinstance(widget, DashboardTab):
-            await widget.refresh_data()
-        elif isinstance(widget, LogsTab):
-            await widget.refresh_logs()
-        elif isinstance(widget, UsersTab):
-            # Assuming UsersTab has a refresh method, check previous code if needed.
-            # Usually it loads on init. Let's check if it has a public refresh method.
-            if hasattr(widget, "refresh_users"):
-                await widget.refresh_users()
-        elif isinstance(widget, MaterialsTab):
-            await widget.refresh_materials()
-        elif isinstance(widget, WithdrawalsTab):
-            await widget.refresh_withdrawals()
+        self.tabs.widget(index).ensure_built()
 
     def closeEvent(self, event):
         """Assicura che il loop asyncio venga terminato alla chiusura della finestra."""
@@ -5,6 +5,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QSize, QDate
 from PyQt6.QtGui import QPixmap, QImage
 from qasync import asyncSlot
+from warehouse.instrumentation import track_action
 import os
 import uuid
 import shutil
@@ -201,6 +202,7 @@ class MaterialFormDialog(QDialog):
             return None
 
     @asyncSlot()
+    @track_action()
     async def accept_data(self, *args):
         self.buttons.setEnabled(False)
         
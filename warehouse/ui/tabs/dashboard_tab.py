@@ -5,24 +5,27 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QDate, QTimer
 from PyQt6.QtGui import QColor, QPalette, QPixmap
 from qasync import asyncSlot
-from datetime import date, timedelta
+from warehouse import startup_trace, database
+from warehouse.instrumentation import track_action
+from datetime import date, datetime, timedelta
 import os
 from warehouse.utils import get_base_path
 from warehouse.ui.colors import AppColors
-from warehouse.controllers_material import (
-    get_expiring_batches, 
-    get_inefficient_materials, 
-    get_material_stocks,
-    get_low_stock_materials
+from warehouse.controllers_dashboard import (
+    get_dashboard_snapshot, LowStockEntry, ExpiringBatchEntry, InefficientEntry
 )
-from warehouse.controllers import get_active_item_withdrawals
-from warehouse.models import Batch, Material
+
+# Background refresh: the snapshot is only reloaded once it is older than
+# SNAPSHOT_TTL (or after a write), so most ticks are served from memory
+REFRESH_INTERVAL_MS = 15_000
+# Delay after a commit before the dashboard follows it: groups the commits of
+# one operation (withdrawal + log entry) into a single refresh
+WRITE_REFRESH_DELAY_MS = 500
 
 class LowStockItemWidget(QWidget):
-    def __init__(self, material: Material, current_stock: int):
+    def __init__(self, entry: LowStockEntry):
         super().__init__()
-        self.material = material
-        self.current_stock = current_stock
+        self.entry = entry
         self.setup_ui()
 
     def setup_ui(self):
@@ -35,8 +38,8 @@ class LowStockItemWidget(QWidget):
         image_label.setStyleSheet("border: 1px solid #ddd; border-radius: 4px; background-color: #f9f9f9;")
         image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
-        if self.material.image_path:
-            full_path = os.path.join(get_base_path(), self.material.image_path)
+        if self.entry.image_path:
+            full_path = os.path.join(get_base_path(), self.entry.image_path)
             if os.path.exists(full_path):
                 pixmap = QPixmap(full_path)
                 if not pixmap.isNull():
@@ -60,12 +63,12 @@ class LowStockItemWidget(QWidget):
         details_layout.setVerticalSpacing(2)
         
         # Name
-        lbl_name = QLabel(f"{self.material.denomination}")
+        lbl_name = QLabel(f"{self.entry.denomination}")
         lbl_name.setStyleSheet("font-weight: bold; font-size: 14px;")
         details_layout.addWidget(lbl_name, 0, 0, 1, 2)
         
         # Stock Info
-        stock_text = f"Disponibile: {self.current_stock} / Min: {self.material.min_stock}"
+        stock_text = f"Disponibile: {self.entry.stock} / Min: {self.entry.min_stock}"
         lbl_stock = QLabel(stock_text)
         lbl_stock.setStyleSheet(AppColors.danger_style())
         details_layout.addWidget(lbl_stock, 1, 0, 1, 2)
@@ -74,11 +77,9 @@ class LowStockItemWidget(QWidget):
         self.setLayout(layout)
 
 class ExpiringBatchItemWidget(QWidget):
-    def __init__(self, batch: Batch, material: Material, available_qty: int | None = None):
+    def __init__(self, entry: ExpiringBatchEntry):
         super().__init__()
-        self.batch = batch
-        self.material = material
-        self.available_qty = available_qty
+        self.entry = entry
         self.setup_ui()
 
     def setup_ui(self):
@@ -91,8 +92,8 @@ class ExpiringBatchItemWidget(QWidget):
         image_label.setStyleSheet("border: 1px solid #ddd; border-radius: 4px; background-color: #f9f9f9;")
         image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
-        if self.material.image_path:
-            full_path = os.path.join(get_base_path(), self.material.image_path)
+        if self.entry.image_path:
+            full_path = os.path.join(get_base_path(), self.entry.image_path)
             if os.path.exists(full_path):
                 pixmap = QPixmap(full_path)
                 if not pixmap.isNull():
@@ -116,13 +117,13 @@ class ExpiringBatchItemWidget(QWidget):
         details_layout.setVerticalSpacing(2)
         
         # Material Name
-        lbl_name = QLabel(self.material.denomination)
+        lbl_name = QLabel(self.entry.denomination)
         lbl_name.setStyleSheet("font-weight: bold; font-size: 14px;")
         details_layout.addWidget(lbl_name, 0, 0, 1, 2)
         
         # Expiration
-        days_left = (self.batch.expiration - date.today()).days
-        exp_str = f"Scadenza: {self.batch.expiration} ({days_left} giorni)"
+        days_left = (self.entry.expiration - date.today()).days
+        exp_str = f"Scadenza: {self.entry.expiration} ({days_left} giorni)"
         lbl_exp = QLabel(exp_str)
         if days_left < 0:
             lbl_exp.setStyleSheet(AppColors.danger_style())
@@ -131,26 +132,24 @@ class ExpiringBatchItemWidget(QWidget):
         details_layout.addWidget(lbl_exp, 1, 0)
         
         # Amount
-        details_layout.addWidget(QLabel(f"Quantità Lotto: {self.batch.amount}"), 1, 1)
+        details_layout.addWidget(QLabel(f"Quantità Lotto: {self.entry.amount}"), 1, 1)
 
         # Available Quantity
-        if self.available_qty is not None:
-             qty_label = QLabel(f"Totale Disponibile: {self.available_qty}")
-             qty_label.setStyleSheet(f"color: {AppColors.TEAL}; font-weight: bold;")
-             details_layout.addWidget(qty_label, 2, 1)
+        qty_label = QLabel(f"Totale Disponibile: {self.entry.available}")
+        qty_label.setStyleSheet(f"color: {AppColors.TEAL}; font-weight: bold;")
+        details_layout.addWidget(qty_label, 2, 1)
 
         # Location
-        loc = self.batch.location or "N/A"
+        loc = self.entry.location or "N/A"
         details_layout.addWidget(QLabel(f"Posizione: {loc}"), 2, 0)
         
         layout.addLayout(details_layout)
         self.setLayout(layout)
 
 class InefficientMaterialItemWidget(QWidget):
-    def __init__(self, material: Material, withdrawal_info: str | None = None):
+    def __init__(self, entry: InefficientEntry):
         super().__init__()
-        self.material = material
-        self.withdrawal_info = withdrawal_info
+        self.entry = entry
         self.setup_ui()
 
     def setup_ui(self):
@@ -163,8 +162,8 @@ class InefficientMaterialItemWidget(QWidget):
         image_label.setStyleSheet("border: 1px solid #ddd; border-radius: 4px; background-color: #f9f9f9;")
         image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
-        if self.material.image_path:
-            full_path = os.path.join(get_base_path(), self.material.image_path)
+        if self.entry.image_path:
+            full_path = os.path.join(get_base_path(), self.entry.image_path)
             if os.path.exists(full_path):
                 pixmap = QPixmap(full_path)
                 if not pixmap.isNull():
@@ -188,38 +187,154 @@ class InefficientMaterialItemWidget(QWidget):
         details_layout.setVerticalSpacing(2)
         
         # Name
-        lbl_name = QLabel(f"{self.material.denomination} (ID: {self.material.id})")
+        lbl_name = QLabel(f"{self.entry.denomination} (ID: {self.entry.material_id})")
         lbl_name.setStyleSheet(f"font-weight: bold; font-size: 14px; color: {AppColors.DANGER};") # Red title for inefficient
         details_layout.addWidget(lbl_name, 0, 0, 1, 2)
         
         # Codes
         details = []
-        if self.material.part_number:
-            details.append(f"P/N: {self.material.part_number}")
-        if self.material.serial_number:
-            details.append(f"S/N: {self.material.serial_number}")
+        if self.entry.part_number:
+            details.append(f"P/N: {self.entry.part_number}")
+        if self.entry.serial_number:
+            details.append(f"S/N: {self.entry.serial_number}")
         
         details_layout.addWidget(QLabel(" | ".join(details)), 1, 0, 1, 2)
         
-        if self.withdrawal_info:
-            w_label = QLabel(self.withdrawal_info)
+        if self.entry.borrowers:
+            w_label = QLabel(f"PRELEVATO da {', '.join(self.entry.borrowers)}")
             w_label.setStyleSheet(AppColors.danger_style())
             details_layout.addWidget(w_label, 2, 0, 1, 2)
 
         layout.addLayout(details_layout)
         self.setLayout(layout)
 
+class ForecastItemWidget(QWidget):
+    """A stock-out forecast or a batch at risk of expiring unused (warehouse.analytics)."""
+
+    def __init__(self, entry):
+        super().__init__()
+        self.entry = entry
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        layout.setContentsMargins(5, 5, 5, 5)
+        layout.setSpacing(2)
+
+        lbl_name = QLabel(self.entry.denomination)
+        lbl_name.setStyleSheet("font-weight: bold; font-size: 14px;")
+        layout.addWidget(lbl_name)
+
+        if hasattr(self.entry, "days_left"):
+            lbl_detail = QLabel(
+                f"Esaurimento previsto tra {self.entry.days_left:.0f} giorni "
+                f"(scorta {self.entry.stock}, ~{self.entry.daily_rate:.1f} al giorno)"
+            )
+            lbl_detail.setStyleSheet(AppColors.danger_style())
+        else:
+            lbl_detail = QLabel(
+                f"Lotto in scadenza il {self.entry.expiration:%d/%m/%Y}: "
+                f"~{self.entry.expected_waste} di {self.entry.amount} non utilizzati"
+            )
+            lbl_detail.setStyleSheet(AppColors.warning_style())
+        layout.addWidget(lbl_detail)
+
+        self.setLayout(layout)
+
+
+def sync_list_widget(list_widget: QListWidget, shown: list, entries: list, key, make_widget) -> int:
+    """
+    Brings list_widget from the entries in shown (one per row, updated in
+    place) to entries, matching rows by key(entry). Rows whose entry is
+    unchanged keep their widget; only new, changed or moved rows get a new one,
+    so a refresh repaints (and reloads thumbnails for) what actually changed.
+    Returns the number of widgets created.
+    """
+    wanted = {key(entry) for entry in entries}
+    created = 0
+    list_widget.setUpdatesEnabled(False)
+    try:
+        # Drop the rows that left the panel, bottom-up so the rows stay valid
+        for row in range(len(shown) - 1, -1, -1):
+            if key(shown[row]) not in wanted:
+                list_widget.takeItem(row)
+                del shown[row]
+
+        for row, entry in enumerate(entries):
+            if row < len(shown) and key(shown[row]) == key(entry):
+                if shown[row] == entry:
+                    continue
+                item = list_widget.item(row)
+            else:
+                # New row, or one further down that moved up: the item widget
+                # does not survive takeItem(), so both get a fresh one
+                old_row = next((r for r in range(row + 1, len(shown)) if key(shown[r]) == key(entry)), None)
+                if old_row is not None:
+                    list_widget.takeItem(old_row)
+                    del shown[old_row]
+                item = QListWidgetItem()
+                list_widget.insertItem(row, item)
+                shown.insert(row, entry)
+            widget = make_widget(entry)
+            item.setSizeHint(widget.sizeHint())
+            list_widget.setItemWidget(item, widget)
+            shown[row] = entry
+            created += 1
+    finally:
+        list_widget.setUpdatesEnabled(True)
+    return created
+
+
 class DashboardTab(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
+        # Last snapshot shown and the entries behind each list's rows
+        self.snapshot = None
+        self.shown_low_stock = []
+        self.shown_expiring = []
+        self.shown_inefficient = []
+        self.shown_forecast = []
+        # Set when a refresh came due while the tab was hidden
+        self.pending = False
         self.setup_ui()
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(REFRESH_INTERVAL_MS)
+        self.refresh_timer.timeout.connect(self.request_refresh)
+        self.refresh_timer.start()
+
+        self.write_timer = QTimer(self)
+        self.write_timer.setSingleShot(True)
+        self.write_timer.setInterval(WRITE_REFRESH_DELAY_MS)
+        self.write_timer.timeout.connect(self.request_refresh)
+        # Every commit (re)starts write_timer: the dashboard follows local writes
+        self.on_write = self.write_timer.start
+        database.write_activity.add_listener(self.on_write)
+        self.destroyed.connect(lambda: database.write_activity.remove_listener(self.on_write))
+
         QTimer.singleShot(0, self.refresh_data)
 
+    def request_refresh(self):
+        """Refreshes now when visible, otherwise on the next showEvent."""
+        if self.isVisible():
+            self.refresh_in_background()
+        else:
+            self.pending = True
+
     def showEvent(self, event):
         super().showEvent(event)
-        QTimer.singleShot(0, self.refresh_data)
+        # Coming back to the tab only reloads if something came due meanwhile
+        if self.pending:
+            self.pending = False
+            QTimer.singleShot(0, self.refresh_in_background)
 
     def setup_ui(self):
+        outer_layout = QVBoxLayout()
+        self.updated_label = QLabel("")
+        self.updated_label.setStyleSheet(f"color: {AppColors.GREY};")
+        self.updated_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+        outer_layout.addWidget(self.updated_label)
+
         main_layout = QHBoxLayout()
         
         # Section 1: Expiring Batches
@@ -246,53 +361,77 @@ class DashboardTab(QWidget):
         low_stock_layout.addWidget(self.low_stock_list)
         low_stock_group.setLayout(low_stock_layout)
 
+        # Section 4: Forecasts from the recent consumption rates
+        forecast_group = QGroupBox("Previsioni di Consumo")
+        forecast_layout = QVBoxLayout()
+        self.forecast_list = QListWidget()
+        self.forecast_list.setSpacing(2)
+        forecast_layout.addWidget(self.forecast_list)
+        forecast_group.setLayout(forecast_layout)
+
         main_layout.addWidget(low_stock_group)
         main_layout.addWidget(expiring_group)
         main_layout.addWidget(inefficient_group)
+        main_layout.addWidget(forecast_group)
         
-        self.setLayout(main_layout)
+        outer_layout.addLayout(main_layout)
+        self.setLayout(outer_layout)
 
     @asyncSlot()
+    @track_action()
     async def refresh_data(self, *args):
+        await self.load_snapshot(background=False)
+
+    @asyncSlot()
+    @track_action()
+    async def refresh_in_background(self, *args):
+        await self.load_snapshot(background=True)
+
+    async def load_snapshot(self, background: bool):
+        """
+        Shows the current snapshot. Errors of background refreshes (timers,
+        writes) go to updated_label: they repeat every few seconds while the
+        cause lasts, and a dialog each time would pile up on an unattended PC.
+        """
         try:
-            # Load Data
-            material_stocks = await get_material_stocks()
-            active_withdrawals = await get_active_item_withdrawals()
-            low_stock_data = await get_low_stock_materials()
+            # All panels from one session (cached until the next write or the TTL)
+            snapshot = await get_dashboard_snapshot()
+            self.pending = False
+
+            # Same object: nothing was written since the last refresh
+            changed = snapshot is not self.snapshot
+            if changed:
+                sync_list_widget(self.low_stock_list, self.shown_low_stock, snapshot.low_stock,
+                                 lambda e: e.material_id, LowStockItemWidget)
+                sync_list_widget(self.expiring_list, self.shown_expiring, snapshot.expiring,
+                                 lambda e: e.batch_id, ExpiringBatchItemWidget)
+                sync_list_widget(self.inefficient_list, self.shown_inefficient, snapshot.inefficient,
+                                 lambda e: e.material_id, InefficientMaterialItemWidget)
+                self.snapshot = snapshot
+            # Also clears the message of a failed background refresh
+            self.updated_label.setText(f"Aggiornato alle {snapshot.loaded_at:%H:%M:%S}")
             
-            # Load Low Stock Consumables
-            self.low_stock_list.clear()
-            for material, current_stock in low_stock_data:
-                item = QListWidgetItem(self.low_stock_list)
-                widget = LowStockItemWidget(material, current_stock)
-                item.setSizeHint(widget.sizeHint())
-                self.low_stock_list.setItemWidget(item, widget)
-
-            # Load Expiring Batches
-            self.expiring_list.clear()
-            batches_data = await get_expiring_batches(limit=50)
-            for batch, material in batches_data:
-                item = QListWidgetItem(self.expiring_list)
-                available = material_stocks.get(material.id, 0)
-                widget = ExpiringBatchItemWidget(batch, material, available_qty=available)
-                item.setSizeHint(widget.sizeHint())
-                self.expiring_list.setItemWidget(item, widget)
-
-            # Load Inefficient Items
-            self.inefficient_list.clear()
-            inefficient_items = await get_inefficient_materials()
-            for material in inefficient_items:
-                item = QListWidgetItem(self.inefficient_list)
-                
-                withdrawal_info = None
-                if material.id in active_withdrawals:
-                    withdrawals_list = active_withdrawals[material.id]
-                    users = [f"{u.first_name} {u.last_name}" for _, u in withdrawals_list]
-                    withdrawal_info = f"PRELEVATO da {', '.join(users)}"
-                
-                widget = InefficientMaterialItemWidget(material, withdrawal_info=withdrawal_info)
-                item.setSizeHint(widget.sizeHint())
-                self.inefficient_list.setItemWidget(item, widget)
+            # The dashboard is the first tab: its first load ends the startup trace
+            startup_trace.mark(startup_trace.FIRST_DATA)
+            startup_trace.finish()
+
+            if changed:
+                await self.refresh_forecast()
                 
         except Exception as e:
-            QMessageBox.critical(self, "Errore", f"Impossibile aggiornare la dashboard: {e}")
+            if background:
+                self.updated_label.setText(f"Aggiornamento non riuscito alle {datetime.now():%H:%M:%S}: {e}")
+            else:
+                QMessageBox.critical(self, "Errore", f"Impossibile aggiornare la dashboard: {e}")
+
+    async def refresh_forecast(self):
+        # Imported on first use: keeps NumPy off the startup path
+        from warehouse.analytics import get_forecast, WasteRisk
+
+        report = await get_forecast()
+        sync_list_widget(
+            self.forecast_list, self.shown_forecast, report.stockouts + report.waste_risks,
+            lambda e: (type(e).__name__, e.batch_id if isinstance(e, WasteRisk) else e.material_id),
+            ForecastItemWidget,
+        )
+        self.forecast_list.setToolTip(report.summary())
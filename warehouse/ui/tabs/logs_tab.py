@@ -4,8 +4,10 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt
 from qasync import asyncSlot
+from warehouse.instrumentation import track_action
 from warehouse.controllers_log import get_logs
 from warehouse.models import EventLog
+from warehouse.ui.export_dialog import run_export
 
 class LogsTab(QWidget):
     def __init__(self):
@@ -34,6 +36,11 @@ class LogsTab(QWidget):
         self.refresh_btn.clicked.connect(self.on_refresh_click)
         header_layout.addWidget(self.refresh_btn)
         
+        self.export_btn = QPushButton("Esporta...")
+        self.export_btn.setToolTip("Esporta il log in CSV o JSONL")
+        self.export_btn.clicked.connect(self.export_logs)
+        header_layout.addWidget(self.export_btn)
+        
         self.layout.addLayout(header_layout)
         
         # Table
@@ -80,6 +87,12 @@ class LogsTab(QWidget):
         self.refresh_logs()
 
     @asyncSlot()
+    @track_action()
+    async def export_logs(self):
+        await run_export(self, "logs")
+
+    @asyncSlot()
+    @track_action()
     async def refresh_logs(self):
         logs = await get_logs(limit=self.page_size, offset=self.current_offset)
         
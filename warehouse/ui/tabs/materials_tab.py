@@ -7,6 +7,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QDate, QTimer, pyqtSignal
 from PyQt6.QtGui import QPixmap, QImage
 from qasync import asyncSlot
+from warehouse.instrumentation import track_action
 import asyncio
 import os
 import uuid
@@ -15,7 +16,7 @@ from warehouse.utils import get_base_path
 
 from warehouse.controllers_material import (
     get_materials, update_material, get_material_batches, get_material_withdrawals,
-    create_batch, get_material_dependencies, delete_material, get_material_stocks
+    create_batch, get_material_dependencies, archive_material, get_material_stocks
 )
 from warehouse.controllers import get_all_users, create_withdrawal, get_active_item_withdrawals, return_withdrawal_item
 from warehouse.models import MaterialType, Material
@@ -183,9 +184,9 @@ class MaterialDetailDialog(QDialog):
             self.update_efficiency_button()
             bottom_layout.addWidget(self.toggle_efficiency_btn)
 
-        self.delete_button = QPushButton("Elimina")
+        self.delete_button = QPushButton("Archivia")
         self.delete_button.setStyleSheet(AppColors.danger_button_style())
-        self.delete_button.clicked.connect(self.delete_material_action)
+        self.delete_button.clicked.connect(self.archive_material_action)
         bottom_layout.addWidget(self.delete_button)
         
         bottom_layout.addStretch()
@@ -479,6 +480,7 @@ class MaterialDetailDialog(QDialog):
         self.new_withdrawal_layout.addStretch()
 
     @asyncSlot()
+    @track_action()
     async def toggle_efficiency(self):
         try:
             new_status = not self.material.is_efficient
@@ -500,31 +502,31 @@ class MaterialDetailDialog(QDialog):
         self.new_withdrawal_amount_input.setText("1")
 
     @asyncSlot()
-    async def delete_material_action(self):
+    @track_action()
+    async def archive_material_action(self):
         try:
             batch_count, withdrawal_count = await get_material_dependencies(self.material.id)
-            total_deps = batch_count + withdrawal_count
             
-            msg = f"Sei sicuro di voler eliminare {self.material.denomination}?"
-            if total_deps > 0:
-                msg += f"\n\nATTENZIONE: Eliminando questo elemento verranno eliminati anche {batch_count} lotti e {withdrawal_count} prelievi associati!"
-            else:
-                msg += "\n\nNessun dato associato verrà eliminato."
+            msg = f"Archiviare {self.material.denomination}?"
+            msg += "\n\nNon comparirà più negli elenchi, nelle scorte e nei prelievi."
+            if batch_count + withdrawal_count > 0:
+                msg += f"\nI {batch_count} lotti e {withdrawal_count} prelievi associati restano nella cronologia."
+            msg += "\n\nPotrà essere ripristinato da Impostazioni > Archivio."
                 
             box = QMessageBox(self)
-            box.setWindowTitle("Conferma Eliminazione")
+            box.setWindowTitle("Conferma Archiviazione")
             box.setText(msg)
             box.setIcon(QMessageBox.Icon.Question)
             
-            btn_yes = box.addButton("Sì, elimina", QMessageBox.ButtonRole.YesRole)
+            btn_yes = box.addButton("Sì, archivia", QMessageBox.ButtonRole.YesRole)
             btn_no = box.addButton("No, annulla", QMessageBox.ButtonRole.NoRole)
             box.setDefaultButton(btn_no)
             
             box.exec()
             
             if box.clickedButton() == btn_yes:
-                await delete_material(self.material.id)
-                QMessageBox.information(self, "Eliminato", "Elemento eliminato con successo.")
+                await archive_material(self.material.id)
+                QMessageBox.information(self, "Archiviato", "Elemento archiviato con successo.")
                 
                 parent = self.parent()
                 if hasattr(parent, "refresh_materials"):
@@ -533,9 +535,10 @@ class MaterialDetailDialog(QDialog):
                 self.accept()
                 
         except Exception as e:
-            QMessageBox.critical(self, "Errore", f"Impossibile eliminare l'elemento: {e}")
+            QMessageBox.critical(self, "Errore", f"Impossibile archiviare l'elemento: {e}")
 
     @asyncSlot()
+    @track_action()
     async def add_batch(self):
         self.add_batch_button.setEnabled(False)
         try:
@@ -575,6 +578,7 @@ class MaterialDetailDialog(QDialog):
             self.add_batch_button.setEnabled(True)
 
     @asyncSlot()
+    @track_action()
     async def load_related_data(self, *args):
         try:
             # Load Batches (for both Consumables and Items)
@@ -618,6 +622,7 @@ class MaterialDetailDialog(QDialog):
             QMessageBox.warning(self, "Errore Caricamento Dati", f"Impossibile caricare i dati correlati: {e}")
 
     @asyncSlot()
+    @track_action()
     async def handle_return(self, withdrawal_id):
         dialog = ReturnDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
@@ -643,6 +648,7 @@ class MaterialDetailDialog(QDialog):
                 QMessageBox.critical(self, "Errore", f"Impossibile restituire l'attrezzatura: {e}")
 
     @asyncSlot()
+    @track_action()
     async def load_users_for_withdrawal(self, *args):
         try:
             users = await get_all_users()
@@ -684,6 +690,7 @@ class MaterialDetailDialog(QDialog):
             self.new_withdrawal_amount_input.setFocus()
 
     @asyncSlot()
+    @track_action()
     async def add_material_withdrawal(self, *args):
         self.add_withdrawal_button.setEnabled(False)
         try:
@@ -798,6 +805,7 @@ class MaterialDetailDialog(QDialog):
             return None
 
     @asyncSlot()
+    @track_action()
     async def save_changes(self, *args):
         denomination = self.denomination_input.text().strip()
         if not denomination:
@@ -1027,6 +1035,7 @@ class MaterialsTab(QWidget):
         self.layout.addLayout(btn_layout)
 
     @asyncSlot()
+    @track_action()
     async def refresh_materials(self, *args):
         try:
             self.materials = await get_materials(self.material_type)
@@ -1045,6 +1054,7 @@ class MaterialsTab(QWidget):
     def open_return_dialog(self, withdrawal_id):
         asyncio.create_task(self._open_return_dialog_async(withdrawal_id))
 
+    @track_action()
     async def _open_return_dialog_async(self, withdrawal_id):
         dialog = ReturnDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
@@ -1192,6 +1202,7 @@ class MaterialsTab(QWidget):
         dialog.open()
 
     @asyncSlot()
+    @track_action()
     async def open_add_material_dialog(self):
         dialog = MaterialFormDialog(self.material_type, self)
         
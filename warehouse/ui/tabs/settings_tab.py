@@ -1,19 +1,25 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QComboBox, QPushButton, 
     QMessageBox, QFileDialog, QGroupBox, QApplication, QStyleFactory,
-    QHBoxLayout
+    QHBoxLayout, QCheckBox, QSpinBox, QFormLayout, QPlainTextEdit, QScrollArea,
+    QInputDialog
 )
-from PyQt6.QtGui import QPalette, QColor
-from PyQt6.QtCore import Qt, pyqtSignal, QSettings
+from PyQt6.QtGui import QPalette, QColor, QFontDatabase, QDesktopServices
+from PyQt6.QtCore import Qt, pyqtSignal, QSettings, QUrl
 from qasync import asyncSlot
-import shutil
+from warehouse.instrumentation import track_action
+import asyncio
 import os
-import zipfile
-import tempfile
 from datetime import datetime
-from warehouse.database import engine, init_db, DATABASE_URL
+from warehouse import database, tiering
+from warehouse.database import init_db
 from warehouse.models import SQLModel
-from warehouse.utils import get_base_path
+from warehouse.utils import get_base_path, get_logs_dir
+from warehouse.backup import export_backup, import_backup, create_snapshot, BACKUPS_DIRNAME
+from warehouse.maintenance import run_maintenance
+from warehouse.importer import import_csv
+from warehouse.ui import archive_dialog
+from warehouse.diagnostics import collect_diagnostics, format_diagnostics, export_diagnostics
 from warehouse.ui.theme import apply_theme
 from warehouse.ui.colors import AppColors
 from sqlalchemy import text
@@ -21,8 +27,10 @@ from sqlalchemy import text
 class SettingsTab(QWidget):
     db_changed = pyqtSignal()
 
-    def __init__(self, parent=None):
+    def __init__(self, backup_scheduler=None, maintenance_scheduler=None, parent=None):
         super().__init__(parent)
+        self.backup_scheduler = backup_scheduler
+        self.maintenance_scheduler = maintenance_scheduler
         self.setup_ui()
 
     def setup_ui(self):
@@ -78,6 +86,18 @@ class SettingsTab(QWidget):
         btn_import.clicked.connect(self.import_db)
         db_layout.addWidget(btn_import)
         
+        # Bulk CSV import
+        btn_import_csv = QPushButton("Importa da CSV...")
+        btn_import_csv.setToolTip("Utenti, materiali o lotti da un file CSV (intestazioni come nei moduli di inserimento)")
+        btn_import_csv.clicked.connect(self.import_csv)
+        db_layout.addWidget(btn_import_csv)
+        
+        # Archived users and materials
+        btn_archive = QPushButton("Archivio...")
+        btn_archive.setToolTip("Utenti e materiali archiviati: ripristino o eliminazione definitiva")
+        btn_archive.clicked.connect(self.open_archive)
+        db_layout.addWidget(btn_archive)
+        
         # Reset
         btn_reset = QPushButton("Reset Database")
         btn_reset.setStyleSheet(AppColors.danger_button_style())
@@ -87,7 +107,317 @@ class SettingsTab(QWidget):
         db_group.setLayout(db_layout)
         layout.addWidget(db_group)
         
-        self.setLayout(layout)
+        # 3. Automatic Backups
+        if self.backup_scheduler is not None:
+            layout.addWidget(self.create_backup_group())
+        
+        # 4. Maintenance
+        layout.addWidget(self.create_maintenance_group())
+        
+        # 4b. History archive
+        layout.addWidget(self.create_history_group())
+        
+        # 5. Storage mode
+        layout.addWidget(self.create_storage_group())
+        
+        # 6. Performance diagnostics
+        layout.addWidget(self.create_performance_group())
+        
+        # The groups no longer fit the window height: scroll them
+        content = QWidget()
+        content.setLayout(layout)
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setWidget(content)
+        outer_layout = QVBoxLayout()
+        outer_layout.setContentsMargins(0, 0, 0, 0)
+        outer_layout.addWidget(scroll)
+        self.setLayout(outer_layout)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh_performance()
+
+    def create_performance_group(self):
+        performance_group = QGroupBox("Prestazioni")
+        performance_layout = QVBoxLayout()
+        
+        performance_layout.addWidget(QLabel(
+            "Tempi di avvio, delle query e delle operazioni, blocchi dell'interfaccia, cache e memoria.\n"
+            "Esporta il report per inviarlo all'assistenza."
+        ))
+        
+        self.performance_view = QPlainTextEdit()
+        self.performance_view.setReadOnly(True)
+        self.performance_view.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.performance_view.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        self.performance_view.setMinimumHeight(320)
+        performance_layout.addWidget(self.performance_view)
+        
+        btn_layout = QHBoxLayout()
+        btn_refresh = QPushButton("Aggiorna")
+        btn_refresh.clicked.connect(self.refresh_performance)
+        btn_layout.addWidget(btn_refresh)
+        
+        btn_export = QPushButton("Esporta Report...")
+        btn_export.clicked.connect(self.export_performance_report)
+        btn_layout.addWidget(btn_export)
+        
+        btn_startup_log = QPushButton("Storico Avvii...")
+        btn_startup_log.setToolTip("Tempi di avvio delle sessioni precedenti (logs/startup.log)")
+        btn_startup_log.clicked.connect(self.open_startup_log)
+        btn_layout.addWidget(btn_startup_log)
+        performance_layout.addLayout(btn_layout)
+        
+        performance_group.setLayout(performance_layout)
+        return performance_group
+
+    def refresh_performance(self, *args):
+        try:
+            self.performance_view.setPlainText(format_diagnostics(collect_diagnostics()))
+        except Exception as e:
+            self.performance_view.setPlainText(f"Impossibile raccogliere le statistiche: {e}")
+
+    def export_performance_report(self, *args):
+        default_name = f"diagnostica_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Esporta Report Prestazioni", default_name, "Testo (*.txt);;JSON (*.json)"
+        )
+        if not file_path:
+            return
+        try:
+            export_diagnostics(file_path)
+            QMessageBox.information(self, "Successo", f"Report salvato in:\n{file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "Errore", f"Impossibile salvare il report: {e}")
+
+    def open_startup_log(self, *args):
+        log_path = os.path.join(get_logs_dir(), "startup.log")
+        if not os.path.exists(log_path):
+            QMessageBox.information(self, "Storico Avvii", "Nessun avvio registrato finora.")
+            return
+        QDesktopServices.openUrl(QUrl.fromLocalFile(log_path))
+
+    def create_storage_group(self):
+        storage_group = QGroupBox("Archiviazione")
+        storage_layout = QVBoxLayout()
+        
+        settings = QSettings("WarehouseApp", "WarehouseGUI")
+        self.local_copy_check = QCheckBox("Lavora su una copia locale del database (consigliato su chiavetta USB)")
+        self.local_copy_check.setChecked(settings.value("storage/local_copy", False, type=bool))
+        self.local_copy_check.toggled.connect(self.save_storage_settings)
+        storage_layout.addWidget(self.local_copy_check)
+        
+        sync_interval = settings.value("storage/sync_interval", 120, type=int)
+        storage_layout.addWidget(QLabel(
+            f"Le modifiche vengono salvate sulla chiavetta ogni {sync_interval} secondi e alla chiusura.\n"
+            "La modifica ha effetto al prossimo avvio."
+        ))
+        
+        if database.working_copy is not None:
+            status = QLabel(f"Copia locale attiva: {database.working_copy.local_db}")
+            status.setStyleSheet(AppColors.success_style())
+            status.setWordWrap(True)
+            storage_layout.addWidget(status)
+        
+        storage_group.setLayout(storage_layout)
+        return storage_group
+
+    def save_storage_settings(self, *args):
+        settings = QSettings("WarehouseApp", "WarehouseGUI")
+        settings.setValue("storage/local_copy", self.local_copy_check.isChecked())
+
+    def create_maintenance_group(self):
+        maintenance_group = QGroupBox("Manutenzione Database")
+        maintenance_layout = QVBoxLayout()
+        
+        maintenance_layout.addWidget(QLabel(
+            "Aggiorna le statistiche, verifica l'integrità e recupera lo spazio libero del database.\n"
+            "Una manutenzione leggera viene eseguita automaticamente quando l'applicazione è inattiva."
+        ))
+        
+        self.maintenance_label = QLabel()
+        self.maintenance_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        last_report = self.maintenance_scheduler.last_report if self.maintenance_scheduler else None
+        self.maintenance_label.setText(last_report.summary() if last_report else "")
+        maintenance_layout.addWidget(self.maintenance_label)
+        
+        btn_layout = QHBoxLayout()
+        btn_maintenance = QPushButton("Esegui Manutenzione")
+        btn_maintenance.clicked.connect(self.run_maintenance)
+        btn_layout.addWidget(btn_maintenance)
+        
+        btn_compact = QPushButton("Compatta Database")
+        btn_compact.clicked.connect(self.compact_db)
+        btn_layout.addWidget(btn_compact)
+        maintenance_layout.addLayout(btn_layout)
+        
+        maintenance_group.setLayout(maintenance_layout)
+        return maintenance_group
+
+    def create_history_group(self):
+        history_group = QGroupBox("Archivio Storico")
+        history_layout = QVBoxLayout()
+        
+        history_layout.addWidget(QLabel(
+            f"Sposta i prelievi chiusi e i log più vecchi in {tiering.ARCHIVE_FILENAME}, accanto al database.\n"
+            "Restano visibili nella cronologia, nei dettagli e nelle esportazioni; il database principale resta piccolo e veloce."
+        ))
+        
+        form = QFormLayout()
+        self.history_months_spin = QSpinBox()
+        self.history_months_spin.setRange(1, 240)
+        self.history_months_spin.setSuffix(" mesi")
+        settings = QSettings("WarehouseApp", "WarehouseGUI")
+        self.history_months_spin.setValue(int(settings.value("history_archive_months", tiering.DEFAULT_MONTHS)))
+        self.history_months_spin.valueChanged.connect(
+            lambda value: QSettings("WarehouseApp", "WarehouseGUI").setValue("history_archive_months", value)
+        )
+        form.addRow("Archivia dati più vecchi di:", self.history_months_spin)
+        history_layout.addLayout(form)
+        
+        self.history_label = QLabel()
+        self.history_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        history_layout.addWidget(self.history_label)
+        
+        btn_move = QPushButton("Sposta nell'Archivio Storico")
+        btn_move.clicked.connect(self.move_to_history_archive)
+        history_layout.addWidget(btn_move)
+        
+        history_group.setLayout(history_layout)
+        self.refresh_history_status()
+        return history_group
+
+    @asyncSlot()
+    async def refresh_history_status(self):
+        try:
+            counts = await tiering.get_archive_counts()
+        except Exception as e:
+            self.history_label.setText(f"Stato dell'archivio storico non disponibile: {e}")
+            return
+        if counts:
+            self.history_label.setText(
+                f"Nell'archivio: {counts.get('withdrawal', 0)} prelievi, {counts.get('eventlog', 0)} voci di log"
+            )
+        else:
+            self.history_label.setText("Archivio storico non ancora creato")
+
+    @asyncSlot()
+    @track_action()
+    async def move_to_history_archive(self, *args):
+        months = self.history_months_spin.value()
+        reply = QMessageBox.question(
+            self, "Archivio Storico",
+            f"Spostare nell'archivio storico i prelievi chiusi e i log più vecchi di {months} mesi?\n"
+            "I prestiti di attrezzature non ancora restituiti restano nel database principale.",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        self.history_label.setText("Spostamento in corso...")
+        try:
+            report = await tiering.move_to_archive(months * 30)
+            QMessageBox.information(
+                self, "Archivio Storico",
+                f"{report.summary()}\n\nCon \"Compatta Database\" il file principale si riduce di conseguenza."
+            )
+            self.db_changed.emit()
+        except Exception as e:
+            QMessageBox.critical(self, "Errore", f"Impossibile spostare i dati nell'archivio: {e}")
+        await self.refresh_history_status()
+
+    @asyncSlot()
+    @track_action()
+    async def run_maintenance(self, *args):
+        await self._run_full_maintenance(compact=False)
+
+    @asyncSlot()
+    @track_action()
+    async def compact_db(self, *args):
+        await self._run_full_maintenance(compact=True)
+
+    async def _run_full_maintenance(self, compact: bool):
+        if not os.path.exists(database.db_path):
+            QMessageBox.warning(self, "Attenzione", "Database non trovato.")
+            return
+        
+        self.maintenance_label.setText("Manutenzione in corso...")
+        try:
+            # A full run may replace the file, release our connections first
+            await database.engine.dispose()
+            report = await asyncio.to_thread(run_maintenance, database.db_path, True, compact)
+            if self.maintenance_scheduler:
+                self.maintenance_scheduler.record(report)
+            self.maintenance_label.setText(report.summary())
+            if report.quick_check not in (None, "ok"):
+                QMessageBox.critical(
+                    self, "Errore",
+                    f"Il controllo di integrità ha rilevato problemi:\n{report.quick_check}\n"
+                    "Si consiglia di ripristinare un backup."
+                )
+        except Exception as e:
+            self.maintenance_label.setText("")
+            QMessageBox.critical(self, "Errore", f"Impossibile eseguire la manutenzione: {e}")
+
+    def create_backup_group(self):
+        backup_group = QGroupBox("Backup Automatici")
+        backup_layout = QFormLayout()
+        
+        self.backup_on_close_check = QCheckBox("Crea un backup alla chiusura")
+        self.backup_on_close_check.setChecked(self.backup_scheduler.on_close)
+        self.backup_on_close_check.toggled.connect(self.save_backup_settings)
+        backup_layout.addRow(self.backup_on_close_check)
+        
+        self.backup_interval_spin = QSpinBox()
+        self.backup_interval_spin.setRange(0, 168)
+        self.backup_interval_spin.setSuffix(" ore")
+        self.backup_interval_spin.setSpecialValueText("Disattivato")
+        self.backup_interval_spin.setValue(int(self.backup_scheduler.interval_hours))
+        self.backup_interval_spin.valueChanged.connect(self.save_backup_settings)
+        backup_layout.addRow("Ogni:", self.backup_interval_spin)
+        
+        self.backup_writes_spin = QSpinBox()
+        self.backup_writes_spin.setRange(0, 100000)
+        self.backup_writes_spin.setSuffix(" operazioni")
+        self.backup_writes_spin.setSpecialValueText("Disattivato")
+        self.backup_writes_spin.setValue(self.backup_scheduler.write_threshold)
+        self.backup_writes_spin.valueChanged.connect(self.save_backup_settings)
+        backup_layout.addRow("Dopo:", self.backup_writes_spin)
+        
+        policy = self.backup_scheduler.policy
+        backup_layout.addRow(QLabel(
+            f"Conservati in '{BACKUPS_DIRNAME}': ultimi {policy.hourly} orari, "
+            f"{policy.daily} giornalieri, {policy.weekly} settimanali."
+        ))
+        
+        btn_backup_now = QPushButton("Crea Backup Ora")
+        btn_backup_now.clicked.connect(self.backup_now)
+        backup_layout.addRow(btn_backup_now)
+        
+        backup_group.setLayout(backup_layout)
+        return backup_group
+
+    def save_backup_settings(self, *args):
+        self.backup_scheduler.on_close = self.backup_on_close_check.isChecked()
+        self.backup_scheduler.interval_hours = self.backup_interval_spin.value()
+        self.backup_scheduler.write_threshold = self.backup_writes_spin.value()
+        
+        settings = QSettings("WarehouseApp", "WarehouseGUI")
+        settings.setValue("backup/on_close", self.backup_scheduler.on_close)
+        settings.setValue("backup/interval_hours", self.backup_scheduler.interval_hours)
+        settings.setValue("backup/write_threshold", self.backup_scheduler.write_threshold)
+
+    @asyncSlot()
+    @track_action()
+    async def backup_now(self):
+        try:
+            path = await self.backup_scheduler.backup_now()
+            if path:
+                QMessageBox.information(self, "Successo", f"Backup creato: {os.path.basename(path)}")
+            else:
+                QMessageBox.warning(self, "Attenzione", "Nessun database da salvare.")
+        except Exception as e:
+            QMessageBox.critical(self, "Errore", f"Impossibile creare il backup: {e}")
 
     def change_theme(self, theme_name):
         # Save preference
@@ -97,7 +427,9 @@ class SettingsTab(QWidget):
         # Apply theme
         apply_theme(theme_name)
 
-    def export_db(self):
+    @asyncSlot()
+    @track_action()
+    async def export_db(self):
         file_path, _ = QFileDialog.getSaveFileName(
             self, "Esporta Backup Completo", "warehouse_backup.zip", "ZIP Archive (*.zip);;SQLite Database (*.db *.sqlite)"
         )
@@ -105,35 +437,19 @@ class SettingsTab(QWidget):
             return
 
         try:
-            base_path = get_base_path()
-            db_file = os.path.join(base_path, "warehouse.db")
-            images_dir = os.path.join(base_path, "images")
-
+            # In working-copy mode the stick DB lags behind; write it back first
+            await database.sync_working_copy()
+            await asyncio.to_thread(export_backup, file_path, get_base_path())
             if file_path.endswith('.zip'):
-                # Create ZIP directly from source files
-                with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    # Add DB
-                    if os.path.exists(db_file):
-                        zipf.write(db_file, "warehouse.db")
-                    
-                    # Add Images
-                    if os.path.exists(images_dir):
-                        for root, dirs, files in os.walk(images_dir):
-                            for file in files:
-                                abs_path = os.path.join(root, file)
-                                rel_path = os.path.relpath(abs_path, base_path)
-                                zipf.write(abs_path, rel_path)
-                                    
                 QMessageBox.information(self, "Successo", "Backup completo (DB + Immagini) esportato con successo.")
             else:
-                # Legacy DB only export
-                shutil.copy2(db_file, file_path)
                 QMessageBox.information(self, "Successo", "Database (solo file) esportato con successo.")
                 
         except Exception as e:
             QMessageBox.critical(self, "Errore", f"Impossibile esportare il backup: {e}")
 
     @asyncSlot()
+    @track_action()
     async def import_db(self):
         box = QMessageBox(self)
         box.setWindowTitle("Conferma Importazione")
@@ -158,44 +474,17 @@ class SettingsTab(QWidget):
 
         try:
             # We need to close the engine connection properly before overwriting the file
-            await engine.dispose()
+            await database.engine.dispose()
             
-            base_path = get_base_path()
-            db_file = os.path.join(base_path, "warehouse.db")
-            images_dir = os.path.join(base_path, "images")
-
-            if file_path.endswith('.zip'):
-                # Extract ZIP
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_dir)
-                    
-                    # Check for DB file in extracted root
-                    extracted_db = os.path.join(temp_dir, "warehouse.db")
-                    if not os.path.exists(extracted_db):
-                        raise FileNotFoundError("Il file 'warehouse.db' non è presente nell'archivio.")
-                    
-                    # Replace DB
-                    shutil.copy2(extracted_db, db_file)
-                    
-                    # Replace Images
-                    extracted_images = os.path.join(temp_dir, "images")
-                    if os.path.exists(extracted_images):
-                        if os.path.exists(images_dir):
-                            shutil.rmtree(images_dir)
-                        shutil.copytree(extracted_images, images_dir)
-                    else:
-                        # If zip has no images folder, should we clear local images?
-                        # Yes, to match backup state.
-                        if os.path.exists(images_dir):
-                            shutil.rmtree(images_dir)
+            # Validation and file swap run off the UI thread; the live files
+            # are only touched once the archive has been fully checked.
+            restore = lambda: import_backup(file_path, get_base_path())
+            if database.working_copy is not None:
+                await asyncio.to_thread(database.working_copy.replace_portable, restore)
             else:
-                # Legacy DB file import
-                shutil.copy2(file_path, db_file)
-                # Note: Legacy import doesn't touch images, preserving them (or leaving them orphaned)
-            
-            # Re-initialize DB (create engine/metadata if needed, though file exists)
-            # Actually engine is global, but disposed. It will reconnect on next use.
+                await asyncio.to_thread(restore)
+            # Bring older backups up to the current schema
+            await init_db()
             
             QMessageBox.information(self, "Successo", "Backup importato con successo.")
             self.db_changed.emit()
@@ -204,6 +493,50 @@ class SettingsTab(QWidget):
             QMessageBox.critical(self, "Errore", f"Impossibile importare il backup: {e}")
 
     @asyncSlot()
+    @track_action()
+    async def import_csv(self):
+        entities = {"Utenti": "users", "Materiali": "materials", "Lotti": "batches"}
+        label, ok = QInputDialog.getItem(
+            self, "Importa da CSV", "Contenuto del file:", list(entities), 0, False
+        )
+        if not ok:
+            return
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Importa da CSV", "", "File CSV (*.csv *.txt);;Tutti i file (*)"
+        )
+        if not file_path:
+            return
+
+        try:
+            # Validate the whole file first, then ask before writing
+            check = await import_csv(file_path, entities[label], dry_run=True)
+            if check.imported == 0:
+                QMessageBox.warning(self, "Importazione CSV", f"Nessuna riga valida.\n\n{check.summary()}")
+                return
+            reply = QMessageBox.question(
+                self, "Conferma Importazione",
+                f"{check.summary()}\n\nImportare le {check.imported} righe valide?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+            report = await import_csv(file_path, entities[label])
+            QMessageBox.information(self, "Importazione CSV", report.summary())
+            self.db_changed.emit()
+        except Exception as e:
+            QMessageBox.critical(self, "Errore", f"Impossibile importare il file: {e}")
+
+    @asyncSlot()
+    @track_action()
+    async def open_archive(self):
+        try:
+            if await archive_dialog.open_archive(self):
+                self.db_changed.emit()
+        except Exception as e:
+            QMessageBox.critical(self, "Errore", f"Impossibile aprire l'archivio: {e}")
+
+    @asyncSlot()
+    @track_action()
     async def reset_db(self):
         box = QMessageBox(self)
         box.setWindowTitle("Conferma Reset")
@@ -221,19 +554,20 @@ class SettingsTab(QWidget):
         
         try:
             # Dispose engine to release locks
-            await engine.dispose()
+            await database.engine.dispose()
 
-            db_file = os.path.join(get_base_path(), "warehouse.db")
+            db_file = database.db_path
             # Auto-export backup before reset
             if os.path.exists(db_file):
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_filename = os.path.join(get_base_path(), f"warehouse_backup_RESET_{timestamp}.db")
-                shutil.copy2(db_file, backup_filename)
+                backups_dir = os.path.join(get_base_path(), BACKUPS_DIRNAME)
+                backup_filename = await asyncio.to_thread(create_snapshot, db_file, backups_dir, "reset")
             else:
                 backup_filename = "Nessun backup creato (DB non trovato)"
+            # The history archive belongs to the old data
+            tiering.set_aside_archive(os.path.join(get_base_path(), BACKUPS_DIRNAME))
             
             # Re-create engine or just use existing one to drop/create
-            async with engine.begin() as conn:
+            async with database.engine.begin() as conn:
                 await conn.run_sync(SQLModel.metadata.drop_all)
                 await conn.run_sync(SQLModel.metadata.create_all)
             
@@ -5,6 +5,7 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt
 from qasync import asyncSlot
+from warehouse.instrumentation import track_action
 import asyncio
 
 from warehouse.controllers import (
@@ -14,7 +15,7 @@ from warehouse.controllers import (
     get_user_withdrawals,
     create_withdrawal,
     get_user_dependencies,
-    delete_user,
+    archive_user,
     return_withdrawal_item
 )
 from warehouse.controllers_material import get_materials
@@ -65,9 +66,9 @@ class UserDetailDialog(QDialog):
         self.edit_button.clicked.connect(self.toggle_edit_mode)
         bottom_layout.addWidget(self.edit_button)
 
-        self.delete_button = QPushButton("Elimina Utente")
+        self.delete_button = QPushButton("Archivia Utente")
         self.delete_button.setStyleSheet(AppColors.danger_button_style())
-        self.delete_button.clicked.connect(self.delete_user_action)
+        self.delete_button.clicked.connect(self.archive_user_action)
         bottom_layout.addWidget(self.delete_button)
         
         bottom_layout.addStretch()
@@ -231,30 +232,31 @@ class UserDetailDialog(QDialog):
             self.delete_button.setEnabled(False)
 
     @asyncSlot()
-    async def delete_user_action(self):
+    @track_action()
+    async def archive_user_action(self):
         try:
             withdrawal_count = await get_user_dependencies(self.user.id)
             
-            msg = f"Sei sicuro di voler eliminare l'utente {self.user.first_name} {self.user.last_name}?"
+            msg = f"Archiviare l'utente {self.user.first_name} {self.user.last_name}?"
+            msg += "\n\nNon comparirà più negli elenchi e non potrà effettuare prelievi."
             if withdrawal_count > 0:
-                msg += f"\n\nATTENZIONE: Eliminando questo utente verranno eliminati anche {withdrawal_count} prelievi associati!"
-            else:
-                msg += "\n\nNessun prelievo associato verrà eliminato."
+                msg += f"\nI suoi {withdrawal_count} prelievi restano nella cronologia."
+            msg += "\n\nPotrà essere ripristinato da Impostazioni > Archivio."
                 
             box = QMessageBox(self)
-            box.setWindowTitle("Conferma Eliminazione")
+            box.setWindowTitle("Conferma Archiviazione")
             box.setText(msg)
             box.setIcon(QMessageBox.Icon.Question)
             
-            btn_yes = box.addButton("Sì, elimina", QMessageBox.ButtonRole.YesRole)
+            btn_yes = box.addButton("Sì, archivia", QMessageBox.ButtonRole.YesRole)
             btn_no = box.addButton("No, annulla", QMessageBox.ButtonRole.NoRole)
             box.setDefaultButton(btn_no)
             
             box.exec()
             
             if box.clickedButton() == btn_yes:
-                await delete_user(self.user.id)
-                QMessageBox.information(self, "Eliminato", "Utente eliminato con successo.")
+                await archive_user(self.user.id)
+                QMessageBox.information(self, "Archiviato", "Utente archiviato con successo.")
                 
                 parent = self.parent()
                 if hasattr(parent, "refresh_users"):
@@ -263,7 +265,7 @@ class UserDetailDialog(QDialog):
                 self.accept() # Close dialog with Accepted result
                 
         except Exception as e:
-            QMessageBox.critical(self, "Errore", f"Impossibile eliminare l'utente: {e}")
+            QMessageBox.critical(self, "Errore", f"Impossibile archiviare l'utente: {e}")
 
     def setup_withdrawals_list_tab(self):
         self.withdrawals_list = QListWidget()
@@ -327,6 +329,7 @@ class UserDetailDialog(QDialog):
             self.new_withdrawal_amount_input.setFocus()
 
     @asyncSlot()
+    @track_action()
     async def load_withdrawals(self, *args):
         try:
             # returns list of (Withdrawal, Material)
@@ -349,6 +352,7 @@ class UserDetailDialog(QDialog):
             QMessageBox.warning(self, "Errore Caricamento Dati", f"Impossibile caricare i prelievi: {e}")
 
     @asyncSlot()
+    @track_action()
     async def handle_return_request(self, withdrawal_id: int):
         dialog = ReturnDialog(self)
         if dialog.exec():
@@ -366,6 +370,7 @@ class UserDetailDialog(QDialog):
                 QMessageBox.critical(self, "Errore", f"Errore durante la restituzione: {e}")
 
     @asyncSlot()
+    @track_action()
     async def load_materials_for_withdrawal(self, *args):
         try:
             materials: list = []
@@ -399,6 +404,7 @@ class UserDetailDialog(QDialog):
             )
 
     @asyncSlot()
+    @track_action()
     async def add_user_withdrawal(self):
         self.add_withdrawal_button.setEnabled(False)
         try:
@@ -441,6 +447,7 @@ class UserDetailDialog(QDialog):
             self.add_withdrawal_button.setEnabled(True)
 
     @asyncSlot()
+    @track_action()
     async def save_changes(self, *args):
         self.buttons.setEnabled(False)
 
@@ -562,6 +569,7 @@ class UsersTab(QWidget):
         self.layout.addLayout(btn_layout)
 
     @asyncSlot()
+    @track_action()
     async def refresh_users(self, *args):
         try:
             self.users = await get_all_users()
@@ -604,6 +612,7 @@ class UsersTab(QWidget):
         self.update_list(filtered)
 
     @asyncSlot()
+    @track_action()
     async def open_add_user_dialog(self):
         dialog = UserFormDialog(self)
         
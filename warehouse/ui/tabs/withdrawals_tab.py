@@ -6,12 +6,14 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtGui import QColor, QPalette, QPixmap
 from PyQt6.QtCore import Qt, pyqtSignal
 from qasync import asyncSlot
+from warehouse.instrumentation import track_action
 import asyncio
 import os
 from warehouse.controllers import get_all_withdrawals, return_withdrawal_item
 from warehouse.models import MaterialType, Withdrawal, User, Material
 from warehouse.utils import get_base_path
 from warehouse.ui.colors import AppColors
+from warehouse.ui.export_dialog import run_export
 
 class WithdrawalItemWidget(QWidget):
     return_requested = pyqtSignal(int)
@@ -185,6 +187,11 @@ class WithdrawalsTab(QWidget):
         self.refresh_btn.clicked.connect(self.refresh_withdrawals)
         header_layout.addWidget(self.refresh_btn)
         
+        self.export_btn = QPushButton("Esporta...")
+        self.export_btn.setToolTip("Esporta la cronologia in CSV o JSONL")
+        self.export_btn.clicked.connect(self.export_withdrawals)
+        header_layout.addWidget(self.export_btn)
+        
         self.layout.addLayout(header_layout)
 
         # List Widget
@@ -196,6 +203,12 @@ class WithdrawalsTab(QWidget):
         self.refresh_withdrawals()
 
     @asyncSlot()
+    @track_action()
+    async def export_withdrawals(self):
+        await run_export(self, "withdrawals")
+
+    @asyncSlot()
+    @track_action()
     async def refresh_withdrawals(self, *args):
         try:
             data = await get_all_withdrawals()
@@ -235,6 +248,7 @@ class WithdrawalsTab(QWidget):
         """Wrapper sincrono per avviare il task asincrono manualmente, aggirando problemi di firma di qasync."""
         asyncio.create_task(self.handle_return(withdrawal_id))
 
+    @track_action()
     async def handle_return(self, withdrawal_id):
         print(f"DEBUG: handle_return called with id: {withdrawal_id}")
         dialog = ReturnDialog(self)
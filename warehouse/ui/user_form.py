@@ -3,6 +3,7 @@ from PyQt6.QtWidgets import (
     QMessageBox, QTextEdit
 )
 from qasync import asyncSlot
+from warehouse.instrumentation import track_action
 from warehouse.controllers import create_user
 
 class UserFormDialog(QDialog):
@@ -51,6 +52,7 @@ class UserFormDialog(QDialog):
         self.setLayout(self.layout)
 
     @asyncSlot()
+    @track_action()
     async def accept_data(self, *args):
         # Disable buttons to prevent double submission
         self.buttons.setEnabled(False)
@@ -30,3 +30,10 @@ def get_resource_path(relative_path):
         base_path = os.getcwd()
     
     return os.path.join(base_path, relative_path)
+
+def get_logs_dir():
+    """
+    Folder for diagnostic logs, next to the database so that they travel
+    with the portable installation.
+    """
+    return os.path.join(get_base_path(), "logs")
@@ -0,0 +1,189 @@
+"""
+Stall watchdog for the qasync event loop.
+
+Every query and every widget runs on the single loop thread, so anything
+slow freezes the window. A heartbeat task measures how late the loop wakes
+up (loop lag) into a histogram. A sampling thread grabs the loop thread's
+Python stack while a heartbeat is overdue, so each freeze is logged with
+the code that was running, including synchronous Qt slots that asyncio
+never sees. In debug mode qasync also reports every callback slower than
+the threshold.
+"""
+import asyncio
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+# Upper bounds (ms) of the lag histogram buckets; the last bucket is open ended
+LAG_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000)
+
+MAX_STACK_LINES = 30
+MAX_LOG_BYTES = 1024 * 1024
+
+
+@dataclass
+class Stall:
+    started_at: datetime
+    duration_ms: float
+    stack: list[str]
+    samples: int
+
+    def format(self) -> str:
+        header = f"{self.started_at.strftime('%Y-%m-%d %H:%M:%S')} blocco del loop di {self.duration_ms:.0f} ms"
+        if not self.stack:
+            return header + " (nessun campione)"
+        return f"{header} ({self.samples} campioni)\n" + "".join(self.stack[-MAX_STACK_LINES:])
+
+
+class _ForwardHandler(logging.Handler):
+    def __init__(self, watchdog):
+        super().__init__(logging.WARNING)
+        self.watchdog = watchdog
+
+    def emit(self, record):
+        self.watchdog.write_log(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {record.getMessage()}")
+
+
+class LoopWatchdog:
+    def __init__(self, threshold_ms: float = 250, interval: float = 0.1, log_file: str | None = None, max_stalls: int = 50):
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.log_file = log_file
+        self.histogram = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.beats = 0
+        self.max_lag_ms = 0.0
+        self.stalls: deque[Stall] = deque(maxlen=max_stalls)
+        self.debug = False
+
+        self._last_beat = time.monotonic()
+        self._samples = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loop_thread = None
+        self._thread = None
+        self._task = None
+
+    def start(self):
+        """Starts heartbeat and sampler; call from the loop thread."""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.ensure_future(self._heartbeat())
+        self._thread = threading.Thread(target=self._sample, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def enable_debug(self, loop=None):
+        """asyncio debug mode with slow-callback reports. Adds overhead: opt in only."""
+        loop = loop or asyncio.get_event_loop()
+        loop.slow_callback_duration = self.threshold_ms / 1000
+        loop.set_debug(True)
+        handler = _ForwardHandler(self)
+        for name in ("asyncio", "qasync"):
+            logger = logging.getLogger(name)
+            logger.addHandler(handler)
+            if logger.level == logging.NOTSET or logger.level > logging.WARNING:
+                logger.setLevel(logging.WARNING)
+        self.debug = True
+
+    # --- Heartbeat on the loop ---
+
+    async def _heartbeat(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            self.record_lag(max(0.0, (now - before - self.interval) * 1000))
+
+    def record_lag(self, lag_ms: float):
+        self.beats += 1
+        self.histogram[bisect.bisect_left(LAG_BUCKETS_MS, lag_ms)] += 1
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+        with self._lock:
+            samples, self._samples = self._samples, []
+        if lag_ms < self.threshold_ms:
+            return
+
+        stack = []
+        if samples:
+            # The stack seen most often is where the time went
+            stack = list(Counter(tuple(s) for s in samples).most_common(1)[0][0])
+        stall = Stall(
+            started_at=datetime.now() - timedelta(milliseconds=lag_ms + self.interval * 1000),
+            duration_ms=lag_ms,
+            stack=stack,
+            samples=len(samples),
+        )
+        self.stalls.append(stall)
+        print(f"Interfaccia bloccata per {lag_ms:.0f} ms")
+        self.write_log(stall.format())
+
+    # --- Sampling thread ---
+
+    def _sample(self):
+        period = self.threshold_ms / 1000 / 2
+        overdue = self.interval + self.threshold_ms / 1000
+        while not self._stop.wait(period):
+            if time.monotonic() - self._last_beat < overdue:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = traceback.format_stack(frame)
+            del frame
+            with self._lock:
+                self._samples.append(stack)
+
+    # --- Reporting ---
+
+    def histogram_rows(self) -> list[tuple[str, int]]:
+        labels = [f"< {b} ms" for b in LAG_BUCKETS_MS] + [f">= {LAG_BUCKETS_MS[-1]} ms"]
+        return list(zip(labels, self.histogram))
+
+    def write_log(self, text: str):
+        if not self.log_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > MAX_LOG_BYTES:
+                os.replace(self.log_file, self.log_file + ".1")
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(text.rstrip("\n") + "\n\n")
+        except OSError as e:
+            print(f"Scrittura log blocchi fallita: {e}")
+
+
+# Set by start_watchdog(), read by the diagnostics UI
+loop_watchdog: LoopWatchdog | None = None
+
+
+def start_watchdog(threshold_ms: float = 250, log_file: str | None = None, debug: bool = False) -> LoopWatchdog:
+    global loop_watchdog
+    loop_watchdog = LoopWatchdog(threshold_ms=threshold_ms, log_file=log_file)
+    if debug:
+        loop_watchdog.enable_debug()
+    loop_watchdog.start()
+    return loop_watchdog
@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from warehouse.database import write_activity
+
+LOCK_SUFFIX = ".lock"
+
+# Win32 constants for _pid_alive()
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+ERROR_ACCESS_DENIED = 5
+STILL_ACTIVE = 259
+
+
+class WorkingCopyInUse(RuntimeError):
+    """The stick DB is held by another running instance, here or on another PC."""
+
+
+def get_local_cache_dir() -> str:
+    """Per-user cache folder on the local disk of the current PC."""
+    if sys.platform == "win32" and os.environ.get("LOCALAPPDATA"):
+        return os.path.join(os.environ["LOCALAPPDATA"], "WarehouseGUI", "working_copy")
+    return os.path.join(os.path.expanduser("~"), ".cache", "warehouse-gui", "working_copy")
+
+
+def _copy_database(source: str, target: str):
+    """
+    Consistent copy through the SQLite online backup API.
+    The copy is written under a temporary name and renamed over the target,
+    so the target is always either the old or the new complete file.
+    """
+    partial = target + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    src = sqlite3.connect(source, timeout=30)
+    dst = sqlite3.connect(partial)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(partial, target)
+
+
+def _pid_alive(pid) -> bool:
+    """Whether a process with this PID is running on the current PC."""
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    if sys.platform == "win32":
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _file_signature(path: str) -> list | None:
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    # FAT sticks keep mtimes to 2 s: add SQLite's file change counter, bumped by every commit
+    with open(path, "rb") as f:
+        f.seek(24)
+        change_counter = int.from_bytes(f.read(4), "big")
+    return [st.st_size, st.st_mtime_ns, change_counter]
+
+
+class WorkingCopy:
+    """
+    Keeps the portable DB on the USB stick and serves every query from a copy
+    on the local disk.
+
+    open() copies the stick DB locally and writes a lock marker next to it,
+    sync() writes the local copy back, close() does a final sync and removes
+    marker and local copy. If the application dies in between, the marker is
+    still there on the next start on the same PC and the newer local copy is
+    written back before anything else, unless the stick DB was modified
+    elsewhere since our last sync.
+
+    The marker records host and PID of its owner: open() raises
+    WorkingCopyInUse while that process is still alive or when the marker
+    comes from another PC. The caller must not fall back to the stick DB
+    then, since the owner's next sync would overwrite it; sync() also refuses
+    to write when the stick DB changed since the last sync.
+    """
+
+    def __init__(self, portable_db: str, cache_dir: str | None = None, sync_interval: float = 120):
+        self.portable_db = os.path.abspath(portable_db)
+        key = hashlib.sha1(self.portable_db.encode("utf-8")).hexdigest()[:12]
+        self.local_dir = os.path.join(cache_dir or get_local_cache_dir(), key)
+        self.local_db = os.path.join(self.local_dir, os.path.basename(self.portable_db))
+        self.lock_file = self.portable_db + LOCK_SUFFIX
+        self.sync_interval = sync_interval
+
+        self.last_sync = None
+        self.recovered = False
+        self.conflict = False
+        self._portable_signature = None
+        self._synced_writes = write_activity.count
+        self._sync_lock = threading.Lock()
+        self._task = None
+
+    # --- Lock marker ---
+
+    def _read_marker(self) -> dict | None:
+        try:
+            with open(self.lock_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_marker(self):
+        marker = {
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "local_db": self.local_db,
+            "opened_at": datetime.now().isoformat(timespec="seconds"),
+            "last_sync": self.last_sync,
+            # What the stick DB looked like right after our last write to it
+            "portable_signature": _file_signature(self.portable_db),
+        }
+        partial = self.lock_file + ".partial"
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump(marker, f)
+        os.replace(partial, self.lock_file)
+
+    def _check_marker(self, marker: dict):
+        """Raises when the marker belongs to a copy that may still be in use."""
+        host, pid = marker.get("host"), marker.get("pid")
+        if host != socket.gethostname():
+            raise WorkingCopyInUse(
+                f"il database è aperto in copia locale su '{host}'. "
+                f"Se quel PC non usa più l'applicazione, eliminare {self.lock_file}."
+            )
+        if _pid_alive(pid):
+            raise WorkingCopyInUse(f"il database è già in uso da un'altra istanza dell'applicazione (PID {pid}).")
+
+    def _recover(self, marker: dict):
+        """Writes back the local copy a crashed instance on this PC left behind, when it is safe to."""
+        local_db = marker.get("local_db")
+        if not local_db or not os.path.exists(local_db):
+            return
+        if marker.get("portable_signature") != _file_signature(self.portable_db):
+            print("Il database sulla chiavetta è stato modificato altrove: la copia locale non viene ripristinata.")
+            return
+
+        conn = sqlite3.connect(local_db)
+        try:
+            healthy = conn.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+        except sqlite3.DatabaseError:
+            healthy = False
+        finally:
+            conn.close()
+        if not healthy:
+            print("Copia di lavoro locale danneggiata: viene usato il database della chiavetta.")
+            return
+
+        _copy_database(local_db, self.portable_db)
+        self.recovered = True
+        print("Ripristinate le modifiche non sincronizzate dalla copia di lavoro locale.")
+
+    # --- Lifecycle ---
+
+    def open(self) -> str:
+        """
+        Prepares the local copy and returns its path.
+        Raises WorkingCopyInUse, touching nothing, when another instance holds the marker.
+        """
+        marker = self._read_marker()
+        if marker:
+            self._check_marker(marker)
+        os.makedirs(self.local_dir, exist_ok=True)
+        if marker:
+            self._recover(marker)
+
+        if os.path.exists(self.portable_db):
+            _copy_database(self.portable_db, self.local_db)
+        elif os.path.exists(self.local_db):
+            # New installation: start empty rather than from a stale copy
+            os.remove(self.local_db)
+
+        self._portable_signature = _file_signature(self.portable_db)
+        self._write_marker()
+        return self.local_db
+
+    def replace_portable(self, replace_fn):
+        """
+        Runs replace_fn() (e.g. a backup restore onto the stick) with syncing
+        suspended, then reloads the local copy from the new stick DB.
+        """
+        with self._sync_lock:
+            replace_fn()
+            _copy_database(self.portable_db, self.local_db)
+            self._synced_writes = write_activity.count
+            self._portable_signature = _file_signature(self.portable_db)
+            self.conflict = False
+            self._write_marker()
+
+    def sync(self) -> bool:
+        """
+        Copies the local DB back to the stick. Safe to call from a worker thread.
+        Returns False, leaving the stick untouched, when the stick DB was
+        modified by someone else since the last sync.
+        """
+        with self._sync_lock:
+            writes = write_activity.count
+            if not os.path.exists(self.local_db):
+                return True
+            if _file_signature(self.portable_db) != self._portable_signature:
+                if not self.conflict:
+                    self.conflict = True
+                    print("Il database sulla chiavetta è stato modificato da un altro programma: "
+                          "sincronizzazione sospesa per non sovrascriverlo.")
+                return False
+            _copy_database(self.local_db, self.portable_db)
+            self.last_sync = time.time()
+            self._synced_writes = writes
+            self._portable_signature = _file_signature(self.portable_db)
+            self._write_marker()
+            return True
+
+    def pending_writes(self) -> int:
+        return write_activity.count - self._synced_writes
+
+    def close(self):
+        """
+        Final sync, then releases marker and local copy. Call after disposing the engine.
+        When the sync is refused, the local copy is kept under another name.
+        """
+        if not self.sync():
+            root, ext = os.path.splitext(self.local_db)
+            kept = f"{root}_non_sincronizzato_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
+            _copy_database(self.local_db, kept)
+            print(f"Modifiche non sincronizzate conservate in: {kept}")
+        os.remove(self.lock_file)
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            if os.path.exists(self.local_db + suffix):
+                os.remove(self.local_db + suffix)
+
+    # --- Periodic sync on the asyncio loop ---
+
+    def start(self):
+        if self._task is None and self.sync_interval > 0:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def sync_now(self) -> bool:
+        return await asyncio.to_thread(self.sync)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            if self.pending_writes() > 0:
+                try:
+                    await self.sync_now()
+                except Exception as e:
+                    print(f"Sincronizzazione con la chiavetta fallita: {e}")